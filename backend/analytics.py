@@ -0,0 +1,290 @@
+"""
+Motor columnar opcional para los KPIs y gráficos (DuckDB sobre Parquet)
+
+Con ANALYTICS_ENGINE=duckdb, el importador escribe al terminar una
+instantánea Parquet de las tablas físicas, las dimensiones y los
+agregados (export_snapshot) y las rutas de KPIs y gráficos consultan esa
+instantánea con DuckDB en lugar de SQLite (get_analytics_db). DuckDB lee
+solo las columnas que usa cada consulta, lo que importa en tablas anchas
+como traza_req_oc (47 columnas).
+
+Las rutas no cambian: en DuckDB se crean vistas con los mismos nombres de
+SQLite (tablas físicas, dimensiones, agregados y las vistas con el nombre
+original, ver schema.create_view_sql), así que las mismas consultas
+corren en ambos motores. La instantánea se publica completa en un
+directorio nuevo y luego se reemplaza el manifiesto; la API detecta el
+cambio y vuelve a crear las vistas.
+
+Si duckdb no está instalado o aún no hay instantánea, get_analytics_db()
+entrega una conexión de SQLite (get_read_db) y la API responde igual.
+"""
+import json
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+
+try:
+    import duckdb
+except ImportError:  # Dependencia opcional: sin ella se usa siempre SQLite
+    duckdb = None
+
+from .config import ANALYTICS_DIR, ANALYTICS_ENGINE
+from .database import get_db, get_read_db
+from .schema import DIMENSIONS, ROLLUPS, TABLES, create_view_sql, dimension_table_name, rollup_table_name
+
+MANIFEST = "manifest.json"
+
+# Filas por bloque al copiar una tabla de SQLite a DuckDB
+EXPORT_CHUNK_ROWS = 50000
+
+# Instantáneas conservadas: la publicada y la anterior (la API puede estar
+# terminando una consulta sobre ella)
+KEEP_SNAPSHOTS = 2
+
+_engine = None
+_engine_lock = threading.Lock()
+_warned = False
+
+
+def enabled():
+    """El motor configurado es DuckDB y el paquete está instalado"""
+    return ANALYTICS_ENGINE == "duckdb" and duckdb is not None
+
+
+def snapshot_tables():
+    """Tablas de SQLite que se copian a la instantánea (todas las que leen las rutas de KPIs y gráficos)"""
+    tables = [dimension_table_name(name) for name in DIMENSIONS]
+    tables += [table.storage for table in TABLES.values()]
+    tables += [rollup_table_name(name) for name in ROLLUPS]
+    return tables
+
+
+def _sql_path(path):
+    """Ruta como literal de texto de SQL"""
+    return "'" + str(path).replace("'", "''") + "'"
+
+
+def _duckdb_type(declared):
+    """Tipo de DuckDB para un tipo declarado en SQLite (según su afinidad)"""
+    declared = (declared or "").upper()
+    if "INT" in declared:
+        return "BIGINT"
+    if any(name in declared for name in ("REAL", "FLOA", "DOUB", "NUM")):
+        return "DOUBLE"
+    return "VARCHAR"
+
+
+def _frame(rows, columns, types):
+    """Bloque de filas de SQLite como DataFrame con los tipos de la tabla de DuckDB.
+
+    SQLite permite valores de cualquier tipo en una columna; aquí cada uno
+    se lleva al tipo declarado (lo que no se puede convertir queda NULL).
+    """
+    df = pd.DataFrame.from_records(rows, columns=columns)
+    for column, sql_type in zip(columns, types):
+        if sql_type == "VARCHAR":
+            if pd.api.types.infer_dtype(df[column], skipna=True) not in ("string", "empty"):
+                df[column] = df[column].astype("string")
+        else:
+            df[column] = pd.to_numeric(df[column], errors="coerce")
+    return df
+
+
+def export_table(sqlite_conn, duck, table, path):
+    """Copiar una tabla de SQLite a un archivo Parquet. Retorna las filas copiadas"""
+    info = sqlite_conn.execute(f"PRAGMA table_info({table})").fetchall()
+    columns = [row[1] for row in info]
+    types = [_duckdb_type(row[2]) for row in info]
+    duck.execute(f"CREATE OR REPLACE TABLE export ({', '.join(f'{c} {t}' for c, t in zip(columns, types))})")
+
+    cursor = sqlite_conn.cursor()
+    cursor.row_factory = None
+    cursor.execute(f"SELECT {', '.join(columns)} FROM {table}")
+    total = 0
+    while True:
+        rows = cursor.fetchmany(EXPORT_CHUNK_ROWS)
+        if not rows:
+            break
+        duck.register("chunk", _frame(rows, columns, types))
+        duck.execute("INSERT INTO export SELECT * FROM chunk")
+        duck.unregister("chunk")
+        total += len(rows)
+
+    duck.execute(f"COPY export TO {_sql_path(path)} (FORMAT PARQUET)")
+    duck.execute("DROP TABLE export")
+    return total
+
+
+def export_snapshot():
+    """Escribir y publicar una instantánea Parquet de la BD (sin efecto si el motor no es DuckDB).
+
+    Se llama al terminar cada importación (CLI, API y vigilante).
+    """
+    if ANALYTICS_ENGINE != "duckdb":
+        return None
+    if duckdb is None:
+        print("⚠️ ANALYTICS_ENGINE=duckdb pero el paquete duckdb no está instalado: se omite la instantánea")
+        return None
+
+    start = time.perf_counter()
+    name = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+    directory = ANALYTICS_DIR / name
+    directory.mkdir(parents=True, exist_ok=True)
+    files = {}
+    duck = duckdb.connect()
+    try:
+        with get_db() as conn:
+            # Una sola transacción de lectura: todas las tablas del mismo momento
+            conn.execute("BEGIN")
+            existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            for table in snapshot_tables():
+                if table in existing:
+                    export_table(conn, duck, table, directory / f"{table}.parquet")
+                    files[table] = f"{table}.parquet"
+            conn.rollback()
+    except Exception:
+        shutil.rmtree(directory, ignore_errors=True)
+        raise
+    finally:
+        duck.close()
+
+    manifest = {"directorio": name, "tablas": files, "creado": datetime.now().isoformat(timespec="seconds")}
+    partial = ANALYTICS_DIR / f"{MANIFEST}.tmp"
+    partial.write_text(json.dumps(manifest, indent=2, ensure_ascii=False))
+    os.replace(partial, ANALYTICS_DIR / MANIFEST)
+
+    snapshots = sorted(path for path in ANALYTICS_DIR.iterdir() if path.is_dir())
+    for old in snapshots[:-KEEP_SNAPSHOTS]:
+        shutil.rmtree(old, ignore_errors=True)
+
+    print(f"🦆 Instantánea analítica: {len(files)} tablas en {time.perf_counter() - start:.1f}s ({directory})")
+    return directory
+
+
+def _read_manifest():
+    """(mtime, manifiesto) publicado, o None si no hay instantánea"""
+    path = ANALYTICS_DIR / MANIFEST
+    try:
+        mtime = path.stat().st_mtime_ns
+        return mtime, json.loads(path.read_text())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def snapshot_id():
+    """Identificador de la instantánea publicada (None si no se usa DuckDB o aún no hay)"""
+    if not enabled():
+        return None
+    try:
+        return (ANALYTICS_DIR / MANIFEST).stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def _open_engine(manifest):
+    """Conexión DuckDB en memoria con las vistas de la instantánea"""
+    directory = ANALYTICS_DIR / manifest["directorio"]
+    duck = duckdb.connect()
+    for table, filename in manifest["tablas"].items():
+        duck.execute(f"CREATE VIEW {table} AS SELECT * FROM read_parquet({_sql_path(directory / filename)})")
+    # Vistas con el nombre original sobre las tablas físicas (mismas consultas que en SQLite)
+    for table in TABLES.values():
+        if table.storage != table.name and table.storage in manifest["tablas"]:
+            duck.execute(create_view_sql(table))
+    return duck
+
+
+def _current_engine():
+    """Conexión DuckDB de la instantánea vigente (se recrea si se publicó otra), o None"""
+    global _engine, _warned
+    current = _read_manifest()
+    if current is None:
+        if not _warned:
+            print("⚠️ ANALYTICS_ENGINE=duckdb sin instantánea: se consulta SQLite hasta la próxima importación")
+            _warned = True
+        return None
+    with _engine_lock:
+        # La conexión anterior no se cierra: se libera cuando terminan sus cursores
+        if _engine is None or _engine[0] != current[0]:
+            _engine = (current[0], _open_engine(current[1]))
+        return _engine[1]
+
+
+@contextmanager
+def get_analytics_db():
+    """Conexión para las consultas de KPIs y gráficos.
+
+    Con el motor DuckDB es un cursor propio de la conexión de la instantánea
+    (los cursores de DuckDB se pueden usar en paralelo desde varios hilos);
+    si no, una conexión del pool de lectura de SQLite. Ambas aceptan
+    cursor(), execute(sql, params), fetchone() y fetchall().
+    """
+    engine = _current_engine() if enabled() else None
+    if engine is None:
+        with get_read_db() as conn:
+            yield conn
+        return
+    cursor = engine.cursor()
+    try:
+        yield cursor
+    finally:
+        cursor.close()
+
+
+def is_duckdb(conn):
+    """La conexión de get_analytics_db() es de DuckDB (y no del pool de SQLite)"""
+    return duckdb is not None and isinstance(conn, duckdb.DuckDBPyConnection)
+
+
+def grouping_sets(conn, src, columns, aggregates):
+    """Totales y un GROUP BY por columna en una sola pasada por las filas (GROUPING SETS de DuckDB).
+
+    src: rollups.Source sobre la tabla física
+    columns: {nombre: (columna de agrupación, expresión del valor)}
+    aggregates: expresiones agregadas, p. ej. ["SUM(neto)", "COUNT(*)"]
+    Retorna {"": (agregados totales), nombre: [(valor, *agregados), ...]}
+    """
+    keys = [key for key, _ in columns.values()]
+    labels = [label for _, label in columns.values()]
+    sets = ", ".join(["()"] + [f"({key})" for key in keys])
+    measures = [f"{aggregate} AS medida_{i}" for i, aggregate in enumerate(aggregates)]
+    # Los valores de las columnas con diccionario se leen en la consulta
+    # externa, solo para las filas agrupadas
+    sql = (f"SELECT grupo, {', '.join(labels)}, {', '.join(f'medida_{i}' for i in range(len(aggregates)))} "
+           f"FROM (SELECT GROUPING({', '.join(keys)}) AS grupo, {', '.join(keys)}, {', '.join(measures)} "
+           f"FROM {src.table} {src.where} GROUP BY GROUPING SETS ({sets}))")
+
+    # GROUPING() tiene un bit por columna (la primera es el más alto), en 1
+    # si la columna no está en el conjunto de la fila
+    full = (1 << len(keys)) - 1
+    sets_by_mask = {full: None}
+    sets_by_mask.update({full ^ (1 << (len(keys) - 1 - i)): i for i in range(len(keys))})
+    names = list(columns)
+    result = {"": (None,) * len(aggregates), **{name: [] for name in names}}
+    for row in conn.execute(sql, src.params).fetchall():
+        index = sets_by_mask[row[0]]
+        values = tuple(row[1 + len(keys):])
+        if index is None:
+            result[""] = values
+        else:
+            result[names[index]].append((row[1 + index],) + values)
+    return result
+
+
+def sort_rows(rows, *order):
+    """Ordenar filas en Python igual que el ORDER BY de los endpoints.
+
+    order: (índice, descendente) por clave, de la más a la menos
+    importante. Los NULL van primero en orden ascendente y al final en
+    descendente (NULLS FIRST / NULLS LAST explícitos en las consultas, que
+    es también lo que hace SQLite por defecto).
+    """
+    rows = list(rows)
+    for index, descending in reversed(order):
+        rows.sort(key=lambda row: (0,) if row[index] is None else (1, row[index]), reverse=descending)
+    return rows
@@ -1,13 +1,22 @@
 """
 API FastAPI para Logística HESEGO
 """
-from fastapi import FastAPI
+import hmac
+import uuid
+import zipfile
+from typing import Optional
+
+from anyio import to_thread
+from fastapi import Depends, FastAPI, Header, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse
 
-from .database import get_db, init_db
-from .config import BASE_DIR
+from .database import get_read_db, get_read_pool, init_db, PoolTimeout
+from .config import BASE_DIR, EXCEL_FILES, API_THREADS, UPLOAD_MAX_MB, UPLOAD_TOKEN
+from .schema import TABLES
+from . import conditional, jobs, import_runs, read_snapshot, response_cache
 
 # Importar routers
 from .routes import costos, operatividad, compras
@@ -23,6 +32,10 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# ETag / Last-Modified y 304 en los GET de los tableros (ver conditional.py).
+# Se registra antes que CORS para que las respuestas 304 también lleven sus encabezados
+app.middleware("http")(conditional.conditional_get)
+
 # CORS para permitir requests desde el frontend
 app.add_middleware(
     CORSMiddleware,
@@ -48,6 +61,23 @@ app.include_router(compras.router)
 async def startup():
     """Inicializar BD al arrancar"""
     init_db()
+    # Lecturas desde una copia en memoria (o del disco si no cabe en el presupuesto)
+    await run_in_threadpool(read_snapshot.start)
+    # Límite de hilos para los handlers síncronos (consultas a la BD)
+    to_thread.current_default_thread_limiter().total_tokens = API_THREADS
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Cerrar las conexiones del pool de lectura"""
+    read_snapshot.stop()
+    get_read_pool().close_all()
+
+
+@app.exception_handler(PoolTimeout)
+async def pool_timeout_handler(request: Request, exc: PoolTimeout):
+    """Pool de conexiones agotado: la API está saturada, reintentar más tarde"""
+    return JSONResponse(status_code=503, content={"detail": str(exc)})
 
 
 # ============== ENDPOINTS PARA ARCHIVOS HTML ==============
@@ -80,15 +110,14 @@ async def compras_page():
 # ============== ENDPOINTS DE ADMINISTRACIÓN ==============
 
 @app.get("/api/admin/stats")
-async def get_admin_stats():
+def get_admin_stats():
     """Estadísticas generales de la base de datos"""
-    with get_db() as conn:
+    with get_read_db() as conn:
         cursor = conn.cursor()
         stats = {}
         
         # Contar registros de cada tabla
-        tables = ["costos_mensuales", "operatividad_vehiculos", "traza_req_oc", "oc_descuentos", "base_oc_generadas"]
-        for table in tables:
+        for table in TABLES:
             try:
                 cursor.execute(f"SELECT COUNT(*) FROM {table}")
                 stats[table] = cursor.fetchone()[0]
@@ -98,6 +127,94 @@ async def get_admin_stats():
         return stats
 
 
+@app.get("/api/admin/pool")
+async def get_pool_metrics():
+    """Uso del pool de conexiones de lectura (tamaño, en uso, esperas) y origen de las lecturas"""
+    return {"success": True, "pool": get_read_pool().metrics(), "instantanea": read_snapshot.status()}
+
+
+@app.get("/api/admin/cache")
+async def get_cache_metrics():
+    """Aciertos, fallos y memoria de la caché de respuestas"""
+    return {"success": True, "cache": response_cache.stats()}
+
+
+@app.get("/api/admin/import-runs")
+def get_import_runs(limite: int = 20, tabla: Optional[str] = None):
+    """Métricas de las últimas corridas de importación (tiempos por etapa, rechazos, memoria)"""
+    return {"success": True, "runs": import_runs.recent_runs(limite, tabla)}
+
+
+def require_upload_token(authorization: Optional[str] = Header(None)):
+    """Dependencia de la carga de libros: exige "Authorization: Bearer <UPLOAD_TOKEN>".
+
+    Se evalúa antes de leer el cuerpo, así que una petición sin token no
+    llega a escribir nada en disco.
+    """
+    if not UPLOAD_TOKEN:
+        raise HTTPException(status_code=403, detail="Carga de libros deshabilitada (UPLOAD_TOKEN sin configurar)")
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.strip().encode(), UPLOAD_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Token de carga inválido",
+                            headers={"WWW-Authenticate": "Bearer"})
+
+
+@app.post("/api/admin/upload/{libro}", status_code=202, dependencies=[Depends(require_upload_token)])
+async def upload_workbook(libro: str, request: Request, delta: bool = False, streaming: bool = False):
+    """Subir un libro de Excel y encolar su importación.
+
+    El cuerpo de la petición es el archivo .xlsx tal cual
+    (p. ej. curl -H "Authorization: Bearer $UPLOAD_TOKEN" --data-binary @libro.xlsx),
+    de hasta UPLOAD_MAX_MB. Se escribe a disco a medida que llega, junto al
+    libro configurado; el trabajo de importación lo pone en lugar del libro
+    con el bloqueo de importación tomado (el vigilante ve el cambio ya
+    importado y no lo repite). El estado se consulta en /api/admin/jobs/{id}.
+    """
+    if libro not in EXCEL_FILES:
+        raise HTTPException(status_code=404, detail=f"Libro desconocido: {libro}")
+
+    limit = UPLOAD_MAX_MB * 1024 * 1024
+    too_large = HTTPException(status_code=413, detail=f"El libro supera el máximo de {UPLOAD_MAX_MB} MB")
+    if int(request.headers.get("content-length") or 0) > limit:
+        raise too_large
+
+    path = EXCEL_FILES[libro]["path"]
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_name(f"{path.name}.{uuid.uuid4().hex}.upload")
+    try:
+        size = 0
+        with open(partial, "wb") as f:
+            async for chunk in request.stream():
+                size += len(chunk)
+                if size > limit:
+                    raise too_large
+                await run_in_threadpool(f.write, chunk)
+        if not zipfile.is_zipfile(partial):
+            raise HTTPException(status_code=400, detail="El archivo no es un libro .xlsx válido")
+    except BaseException:
+        partial.unlink(missing_ok=True)
+        raise
+
+    job = jobs.submit_import(libro, request.headers.get("x-filename", path.name), upload=partial,
+                             delta=delta, streaming=streaming)
+    return {"success": True, "job": job}
+
+
+@app.get("/api/admin/jobs")
+async def get_import_jobs():
+    """Trabajos de importación recientes"""
+    return {"success": True, "jobs": jobs.list_jobs()}
+
+
+@app.get("/api/admin/jobs/{job_id}")
+async def get_import_job(job_id: str):
+    """Estado y progreso de un trabajo de importación"""
+    job = jobs.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    return {"success": True, "job": job}
+
+
 @app.get("/api/health")
 async def health_check():
     """Verificar que la API está funcionando"""
@@ -0,0 +1,3 @@
+"""
+Benchmarks del importador (ver import_bench.py)
+"""
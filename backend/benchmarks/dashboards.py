@@ -0,0 +1,138 @@
+"""
+Benchmark de los endpoints /dashboard de costos y operatividad
+
+Compara, para cada tablero, una llamada a /dashboard con la suma de las
+llamadas que hace falta para obtener lo mismo por separado (/kpis,
+/filtros y los cuatro /grafico/*), contra la BD configurada (DB_PATH).
+Con el paquete opcional duckdb también mide el motor DuckDB (antes
+escribe una instantánea Parquet nueva, ver analytics.py). /dashboard
+hace una sola consulta sobre las tablas de agregados y, sin ellas, con
+DuckDB una pasada con GROUPING SETS; en SQLite sin agregados (o con
+--filtro) usa las consultas de cada endpoint. Cada resultado indica si
+hubo una sola pasada. Guarda en JSON la mediana de varias repeticiones.
+
+Uso:
+    python -m backend.benchmarks.dashboards
+    DB_PATH=/ruta/logistica.db python -m backend.benchmarks.dashboards --sin-agregados --fechas
+    python -m backend.benchmarks.dashboards --filtro
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+from backend import analytics, response_cache, rollups
+from backend.analytics import get_analytics_db
+from backend.database import init_db
+from backend.routes import costos, operatividad
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+RANGO = {"fecha_inicio": "2024-01-01", "fecha_fin": "2024-06-30"}
+
+# Parámetros de los filtros IN de cada tablero (--filtro usa el primero, con el primer valor de /filtros)
+IN_FILTERS = {"costos": ("catalogos", "ciudades", "terceros"), "operatividad": ("sedes", "estados", "placas")}
+
+# Tablero -> (módulo, endpoint /dashboard, endpoints que reemplaza)
+DASHBOARDS = {
+    "costos": (costos, costos.get_dashboard, [
+        costos.get_kpis, costos.get_filtros, costos.get_mensual,
+        costos.get_por_catalogo, costos.get_por_ciudad, costos.get_por_tercero]),
+    "operatividad": (operatividad, operatividad.get_dashboard, [
+        operatividad.get_kpis, operatividad.get_filtros, operatividad.get_diaria,
+        operatividad.get_por_sede, operatividad.get_por_estado, operatividad.get_top_dias_taller]),
+}
+
+
+def median_ms(call, repetitions):
+    """Mediana en ms de `repetitions` llamadas (después de una de calentamiento)"""
+    call()
+    times = []
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        call()
+        times.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(times), 2)
+
+
+def one_pass(name, module, filtros):
+    """/dashboard resuelve los KPIs y gráficos en una sola pasada (no con las consultas de cada endpoint)"""
+    values = (filtros.get("fecha_inicio"), filtros.get("fecha_fin"), *(filtros.get(p) for p in IN_FILTERS[name]))
+    with get_analytics_db() as conn:
+        return module.dashboard_one_pass(conn, values, 10) is not None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Comparar /dashboard con la suma de los endpoints que reemplaza")
+    parser.add_argument("--repeticiones", type=int, default=10, help="Llamadas medidas por endpoint (default 10)")
+    parser.add_argument("--sin-agregados", action="store_true",
+                        help="Consultar siempre las tablas físicas (sin las tablas de agregados)")
+    parser.add_argument("--fechas", action="store_true", help=f"Filtrar por el rango {RANGO['fecha_inicio']} "
+                                                             f"- {RANGO['fecha_fin']}")
+    parser.add_argument("--filtro", action="store_true",
+                        help="Filtrar además por el primer valor de una dimensión (filtro IN)")
+    parser.add_argument("--output", type=Path,
+                        help="Archivo JSON de resultados (default results/dashboards-<fecha>.json)")
+    args = parser.parse_args(argv)
+
+    if args.sin_agregados:
+        rollups.USE_ROLLUPS = False
+    # Se miden las consultas, no la caché de respuestas
+    response_cache.RESPONSE_CACHE_MB = 0
+    base = RANGO if args.fechas else {}
+
+    init_db()
+    engines = ["sqlite"]
+    if analytics.duckdb is not None:
+        analytics.ANALYTICS_ENGINE = "duckdb"
+        analytics.export_snapshot()
+        engines.append("duckdb")
+    else:
+        print("⚠️ Sin el paquete duckdb: solo se mide SQLite")
+
+    results = []
+    for engine in engines:
+        analytics.ANALYTICS_ENGINE = engine
+        for name, (module, dashboard, endpoints) in DASHBOARDS.items():
+            filtros = dict(base)
+            if args.filtro:
+                parameter = IN_FILTERS[name][0]
+                filtros[parameter] = module.get_filtros()[parameter][0]
+            separate = {endpoint.__name__: median_ms(lambda e=endpoint: e(**({} if e.__name__ == "get_filtros"
+                                                                              else filtros)), args.repeticiones)
+                        for endpoint in endpoints}
+            result = {
+                "tablero": name,
+                "motor": engine,
+                "una_pasada": one_pass(name, module, filtros),
+                "dashboard_ms": median_ms(lambda: dashboard(**filtros), args.repeticiones),
+                "endpoints_ms": round(sum(separate.values()), 2),
+                "por_endpoint_ms": separate
+            }
+            result["aceleracion"] = round(result["endpoints_ms"] / result["dashboard_ms"], 2)
+            results.append(result)
+            print(f"⏱️ {name:<13} {engine:<7} /dashboard {result['dashboard_ms']:>8.2f} ms | "
+                  f"endpoints {result['endpoints_ms']:>8.2f} ms | x{result['aceleracion']}"
+                  f"{'' if result['una_pasada'] else ' (consultas de cada endpoint)'}")
+
+    output = args.output or RESULTS_DIR / f"dashboards-{datetime.now():%Y%m%d-%H%M%S}.json"
+    report = {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "agregados": not args.sin_agregados,
+        "fechas": args.fechas,
+        "filtro": args.filtro,
+        "repeticiones": args.repeticiones,
+        "resultados": results
+    }
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2, ensure_ascii=False))
+    print(f"📁 Resultados: {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Benchmark de motores de consulta: SQLite frente a DuckDB (analytics.py)
+
+Llama a cada endpoint /kpis, /grafico y /charts de los tableros con cada
+motor contra la BD configurada (DB_PATH) y guarda en JSON la mediana y
+el mínimo de varias repeticiones por endpoint. Antes escribe una
+instantánea Parquet nueva de la BD (en ANALYTICS_DIR), así ambos motores
+leen los mismos datos. Con --sin-agregados las consultas van a las
+tablas físicas (ver rollups.py), el caso que más pesa con historia larga.
+
+Requiere el paquete opcional duckdb.
+
+Uso:
+    python -m backend.benchmarks.engines
+    DB_PATH=/ruta/logistica.db python -m backend.benchmarks.engines --repeticiones 20 --sin-agregados
+"""
+import argparse
+import inspect
+import json
+import statistics
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+from backend import analytics, response_cache, rollups
+from backend.database import init_db
+from backend.routes import compras, costos, operatividad
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+ENGINES = ["sqlite", "duckdb"]
+RANGO = {"fecha_inicio": "2024-01-01", "fecha_fin": "2024-06-30"}
+
+
+def endpoints():
+    """(ruta, función) de los endpoints de KPIs y gráficos de los tres tableros"""
+    found = []
+    for module in (costos, operatividad, compras):
+        for route in module.router.routes:
+            if any(part in route.path for part in ("/kpis", "/grafico/", "/charts/")):
+                found.append((route.path, route.endpoint))
+    return found
+
+
+def call_args(endpoint, fechas=False):
+    """Argumentos por defecto de un endpoint (los de Query(...) se resuelven a su valor)"""
+    args = {}
+    for name, param in inspect.signature(endpoint).parameters.items():
+        if name == "filters":
+            args[name] = compras.FilterRequest()
+        elif fechas and name in RANGO:
+            args[name] = RANGO[name]
+        else:
+            args[name] = getattr(param.default, "default", param.default)
+    return args
+
+
+def measure(endpoint, args, repetitions):
+    """Tiempos en ms de `repetitions` llamadas (después de una de calentamiento)"""
+    endpoint(**args)
+    times = []
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        endpoint(**args)
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Comparar SQLite y DuckDB en los endpoints de KPIs y gráficos")
+    parser.add_argument("--repeticiones", type=int, default=10, help="Llamadas medidas por endpoint (default 10)")
+    parser.add_argument("--sin-agregados", action="store_true",
+                        help="Consultar siempre las tablas físicas (sin las tablas de agregados)")
+    parser.add_argument("--fechas", action="store_true", help=f"Filtrar por el rango {RANGO['fecha_inicio']} "
+                                                             f"- {RANGO['fecha_fin']} donde el endpoint lo acepta")
+    parser.add_argument("--output", type=Path,
+                        help="Archivo JSON de resultados (default results/engines-<fecha>.json)")
+    args = parser.parse_args(argv)
+
+    if analytics.duckdb is None:
+        parser.error("el paquete duckdb no está instalado (pip install duckdb)")
+    if args.sin_agregados:
+        rollups.USE_ROLLUPS = False
+    # Se mide el motor, no la caché de respuestas
+    response_cache.RESPONSE_CACHE_MB = 0
+
+    init_db()
+    # Instantánea de la BD actual para DuckDB
+    analytics.ANALYTICS_ENGINE = "duckdb"
+    analytics.export_snapshot()
+
+    results = []
+    for path, endpoint in endpoints():
+        call = call_args(endpoint, args.fechas)
+        result = {"endpoint": path}
+        for engine in ENGINES:
+            analytics.ANALYTICS_ENGINE = engine
+            times = measure(endpoint, call, args.repeticiones)
+            result[engine] = {"mediana_ms": round(statistics.median(times), 2), "min_ms": round(min(times), 2)}
+        result["aceleracion"] = round(result["sqlite"]["mediana_ms"] / result["duckdb"]["mediana_ms"], 2)
+        results.append(result)
+        print(f"⏱️ {path:<48} sqlite {result['sqlite']['mediana_ms']:>8.2f} ms | "
+              f"duckdb {result['duckdb']['mediana_ms']:>8.2f} ms | x{result['aceleracion']}")
+
+    total = {engine: round(sum(r[engine]["mediana_ms"] for r in results), 2) for engine in ENGINES}
+    print(f"📊 Total (suma de medianas): sqlite {total['sqlite']} ms | duckdb {total['duckdb']} ms")
+
+    output = args.output or RESULTS_DIR / f"engines-{datetime.now():%Y%m%d-%H%M%S}.json"
+    report = {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "agregados": not args.sin_agregados,
+        "fechas": args.fechas,
+        "repeticiones": args.repeticiones,
+        "duckdb": analytics.duckdb.__version__,
+        "total_ms": total,
+        "resultados": results
+    }
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2, ensure_ascii=False))
+    print(f"📁 Resultados: {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""
+Benchmark de importación con libros sintéticos
+
+Genera (una sola vez) libros sintéticos de cada tamaño, importa cada libro
+de EXCEL_FILES en un proceso aparte con su propia BD y guarda en JSON, por
+caso: filas por segundo, memoria pico y tiempo por etapa (lectura,
+conversión, inserción, índices, agregados).
+
+Uso:
+    python -m backend.benchmarks.import_bench
+    python -m backend.benchmarks.import_bench --rows 10000 --modo streaming
+    python -m backend.benchmarks.import_bench --compare backend/benchmarks/results/import-anterior.json
+"""
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+from backend.config import BASE_DIR, EXCEL_FILES
+
+BENCH_DIR = Path(__file__).resolve().parent
+WORKBOOKS_DIR = BENCH_DIR / "workbooks"
+RESULTS_DIR = BENCH_DIR / "results"
+
+DEFAULT_ROWS = [10_000, 100_000, 1_000_000]
+MODES = ["clasico", "streaming"]
+STAGES = ["lectura", "conversion", "insercion", "indices", "agregados"]
+
+
+def run_case(key, mode, output):
+    """Importar un libro (en el proceso hijo) y escribir sus métricas en output.
+
+    DATA_DIR, DB_PATH y SHEET_CACHE_DIR llegan por variables de entorno,
+    así que la configuración ya apunta a los datos sintéticos.
+    """
+    import resource
+    from backend import import_data
+    from backend.database import init_db
+    from backend.progress import progress_listener
+
+    tables = {}
+
+    def on_progress(event, table, registros=0, tiempos=None, rechazados=None, **_):
+        if event == "completada":
+            tables[table] = {"registros": registros, "tiempos": {s: round(t, 3) for s, t in tiempos.items()},
+                             "rechazados": rechazados or {}}
+
+    init_db()
+    start = time.perf_counter()
+    with progress_listener(on_progress):
+        total = import_data.import_workbook(key, use_cache=False, streaming=(mode == "streaming"))
+    seconds = time.perf_counter() - start
+
+    result = {
+        "registros": total,
+        "segundos": round(seconds, 3),
+        "filas_por_segundo": round(total / seconds) if seconds else None,
+        # ru_maxrss está en KB en Linux
+        "memoria_pico_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "etapas": {stage: round(sum(t["tiempos"].get(stage, 0) for t in tables.values()), 3) for stage in STAGES},
+        "hojas": tables
+    }
+    Path(output).write_text(json.dumps(result))
+
+
+def spawn_case(key, mode, data_dir, workdir):
+    """Ejecutar un caso en un proceso nuevo (memoria pico aislada) y leer su resultado"""
+    output = workdir / f"{key}-{mode}.json"
+    env = dict(os.environ,
+               DATA_DIR=str(data_dir),
+               DB_PATH=str(workdir / f"{key}-{mode}.db"),
+               SHEET_CACHE_DIR=str(workdir / "cache"))
+    completed = subprocess.run(
+        [sys.executable, "-m", "backend.benchmarks.import_bench", "--case", key, mode, str(output)],
+        cwd=BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1] if completed.stderr else "error")
+    return json.loads(output.read_text())
+
+
+def git_commit():
+    """Commit actual, para identificar la versión medida"""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(results, previous_path):
+    """Mostrar la variación de filas/s frente a una corrida anterior"""
+    previous = json.loads(Path(previous_path).read_text())
+    before = {(r["filas"], r["libro"], r["modo"]): r for r in previous["resultados"]}
+    print(f"📊 Comparación con {previous_path} ({previous.get('commit')})")
+    for result in results:
+        old = before.get((result["filas"], result["libro"], result["modo"]))
+        if not old or not old.get("filas_por_segundo") or not result.get("filas_por_segundo"):
+            continue
+        change = (result["filas_por_segundo"] / old["filas_por_segundo"] - 1) * 100
+        print(f"   {result['libro']} {result['modo']} {result['filas']:,} filas: "
+              f"{old['filas_por_segundo']:,} -> {result['filas_por_segundo']:,} filas/s ({change:+.1f}%)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de importación con libros sintéticos")
+    parser.add_argument("--rows", type=int, nargs="+", default=DEFAULT_ROWS,
+                        help="Filas por hoja de cada tamaño a medir (default 10000 100000 1000000)")
+    parser.add_argument("--modo", choices=MODES, nargs="+", default=["clasico"],
+                        help="Modos de importación a medir (default clasico)")
+    parser.add_argument("--libro", choices=list(EXCEL_FILES), nargs="+",
+                        help="Libros a medir (default todos)")
+    parser.add_argument("--output", type=Path,
+                        help="Archivo JSON de resultados (default results/import-<fecha>.json)")
+    parser.add_argument("--compare", type=Path, help="JSON de una corrida anterior para comparar")
+    parser.add_argument("--case", nargs=3, metavar=("LIBRO", "MODO", "SALIDA"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.case:
+        run_case(*args.case)
+        return
+
+    from backend.benchmarks.synthetic import generate_data_dir
+
+    keys = args.libro or list(EXCEL_FILES)
+    output = args.output or RESULTS_DIR / f"import-{datetime.now():%Y%m%d-%H%M%S}.json"
+    results = []
+
+    for rows in args.rows:
+        data_dir = WORKBOOKS_DIR / f"filas-{rows}"
+        generate_data_dir(data_dir, rows, keys)
+        for key in keys:
+            for mode in args.modo:
+                with tempfile.TemporaryDirectory(prefix="bench-") as workdir:
+                    print(f"⏱️ {key} | {mode} | {rows:,} filas por hoja...")
+                    result = {"filas": rows, "libro": key, "modo": mode}
+                    try:
+                        result.update(spawn_case(key, mode, data_dir, Path(workdir)))
+                    except Exception as e:
+                        result["error"] = str(e)
+                        print(f"   ❌ {e}")
+                    else:
+                        stages = " | ".join(f"{stage} {result['etapas'][stage]:.2f}s" for stage in STAGES)
+                        print(f"   ✅ {result['filas_por_segundo']:,} filas/s | "
+                              f"{result['memoria_pico_mb']} MB | {stages}")
+                    results.append(result)
+
+    report = {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "cpus": os.cpu_count(),
+        "resultados": results
+    }
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2, ensure_ascii=False))
+    print(f"📁 Resultados: {output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Prueba de carga de la API de dashboards
+
+Lanza peticiones concurrentes contra una API en ejecución (mezcla de
+endpoints de KPIs y gráficos de los tres tableros) y reporta, por nivel de
+concurrencia: peticiones por segundo, errores y latencias p50/p95/p99.
+En paralelo, una sonda consulta un endpoint liviano (/api/health) para
+medir cuánto esperan las peticiones rápidas detrás de las consultas pesadas.
+
+Uso:
+    python -m backend.benchmarks.load_test --url http://localhost:8000
+    python -m backend.benchmarks.load_test --concurrencia 1 8 32 --segundos 20 --output carga.json
+"""
+import argparse
+import json
+import statistics
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+# (método, ruta): lo que carga un usuario al abrir los tableros
+DEFAULT_ENDPOINTS = [
+    ("GET", "/api/costos/kpis"),
+    ("GET", "/api/costos/grafico/mensual"),
+    ("GET", "/api/costos/grafico/catalogo"),
+    ("GET", "/api/costos/grafico/tercero"),
+    ("GET", "/api/operatividad/kpis"),
+    ("GET", "/api/operatividad/grafico/diario"),
+    ("GET", "/api/operatividad/grafico/sede"),
+    ("GET", "/api/operatividad/grafico/taller"),
+    ("POST", "/api/compras/kpis"),
+    ("POST", "/api/compras/charts/trend-oc"),
+    ("POST", "/api/compras/charts/top-suppliers"),
+    ("POST", "/api/compras/charts/days-by-stage"),
+]
+
+
+def request(base_url, method, path, timeout):
+    """Hacer una petición y retornar su latencia en ms (excepción si falla)"""
+    data = b"{}" if method == "POST" else None
+    req = urllib.request.Request(base_url + path, data=data, method=method,
+                                 headers={"Content-Type": "application/json"})
+    start = time.perf_counter()
+    with urllib.request.urlopen(req, timeout=timeout) as response:
+        response.read()
+    return (time.perf_counter() - start) * 1000
+
+
+def percentile(values, pct):
+    """Percentil (0-100) de una lista no vacía"""
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def run_level(base_url, endpoints, concurrency, seconds, timeout, probe=None):
+    """Mantener `concurrency` clientes durante `seconds` segundos"""
+    latencies = []
+    probe_latencies = []
+    by_endpoint = {path: [] for _, path in endpoints}
+    errors = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def client(offset):
+        i = offset
+        while time.perf_counter() < deadline:
+            method, path = endpoints[i % len(endpoints)]
+            i += 1
+            try:
+                elapsed = request(base_url, method, path, timeout)
+            except Exception as e:
+                with lock:
+                    errors.append(f"{path}: {e}")
+                continue
+            with lock:
+                latencies.append(elapsed)
+                by_endpoint[path].append(elapsed)
+
+    def probe_client():
+        while time.perf_counter() < deadline:
+            try:
+                probe_latencies.append(request(base_url, "GET", probe, timeout))
+            except Exception:
+                pass
+            time.sleep(0.1)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency + 1) as pool:
+        for n in range(concurrency):
+            pool.submit(client, n)
+        if probe:
+            pool.submit(probe_client)
+    duration = time.perf_counter() - start
+
+    result = {
+        "concurrencia": concurrency,
+        "peticiones": len(latencies),
+        "errores": len(errors),
+        "peticiones_por_segundo": round(len(latencies) / duration, 1),
+    }
+    if latencies:
+        result.update({
+            "p50_ms": round(percentile(latencies, 50), 1),
+            "p95_ms": round(percentile(latencies, 95), 1),
+            "p99_ms": round(percentile(latencies, 99), 1),
+            "endpoints_p50_ms": {path: round(statistics.median(values), 1)
+                                 for path, values in by_endpoint.items() if values},
+        })
+    if probe_latencies:
+        result["sonda_p50_ms"] = round(percentile(probe_latencies, 50), 1)
+        result["sonda_p95_ms"] = round(percentile(probe_latencies, 95), 1)
+    if errors:
+        result["ejemplo_error"] = errors[0]
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prueba de carga de la API de dashboards")
+    parser.add_argument("--url", default="http://localhost:8000", help="URL base de la API")
+    parser.add_argument("--concurrencia", type=int, nargs="+", default=[1, 4, 16, 32],
+                        help="Clientes simultáneos a medir (default 1 4 16 32)")
+    parser.add_argument("--segundos", type=float, default=10, help="Duración de cada nivel (default 10)")
+    parser.add_argument("--timeout", type=float, default=30, help="Timeout por petición en segundos")
+    parser.add_argument("--sonda", default="/api/health",
+                        help="Endpoint liviano cuya latencia se mide bajo carga (vacío para omitir)")
+    parser.add_argument("--output", help="Guardar los resultados en este archivo JSON")
+    args = parser.parse_args(argv)
+
+    results = []
+    for concurrency in args.concurrencia:
+        result = run_level(args.url, DEFAULT_ENDPOINTS, concurrency, args.segundos, args.timeout, args.sonda)
+        results.append(result)
+        print(f"👥 {concurrency:>3} clientes: {result['peticiones_por_segundo']:>7} req/s | "
+              f"p50 {result.get('p50_ms', '-')} ms | p95 {result.get('p95_ms', '-')} ms | "
+              f"p99 {result.get('p99_ms', '-')} ms | errores {result['errores']} | "
+              f"sonda p50 {result.get('sonda_p50_ms', '-')} ms p95 {result.get('sonda_p95_ms', '-')} ms")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"url": args.url, "resultados": results}, f, indent=2, ensure_ascii=False)
+        print(f"📁 Resultados: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Revisión de los planes de consulta de la API (EXPLAIN QUERY PLAN)
+
+Llama a cada endpoint de los tableros contra la BD configurada (DB_PATH),
+captura las consultas que ejecuta y verifica con EXPLAIN QUERY PLAN que
+usen los índices compuestos y de cobertura declarados en schema.py. Las
+consultas se fuerzan a las tablas físicas (sin agregados, ver
+rollups.py). Antes aplica init_db() (y con ello las migraciones
+pendientes). Termina con código 1 si algún endpoint no usa los índices
+esperados.
+
+Uso:
+    python -m backend.benchmarks.query_plans
+    DB_PATH=/ruta/logistica.db python -m backend.benchmarks.query_plans --verbose
+"""
+import argparse
+import re
+import sys
+from pathlib import Path
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+from backend import response_cache, rollups
+from backend.database import INDEX_ALT_SUFFIX, get_db, get_read_pool, init_db, schema_version
+from backend.routes import compras, costos, operatividad
+
+RANGO = {"fecha_inicio": "2024-01-01", "fecha_fin": "2024-06-30"}
+
+# (ruta, endpoint, parámetros, índices que deben aparecer en sus planes).
+# Los filtros usan valores de los libros sintéticos (synthetic.py): un valor
+# que no está en el diccionario deja el filtro vacío y cambia el plan.
+CHECKS = [
+    ("/api/costos/datos?fechas", costos.get_datos, dict(RANGO, limit=1000), ["idx_costos_fecha_cobertura"]),
+    ("/api/costos/filtros", costos.get_filtros, {},
+     ["idx_costos_catalogo_cobertura", "idx_costos_ciudad_cobertura", "idx_costos_tercero_cobertura"]),
+    ("/api/costos/kpis", costos.get_kpis, {},
+     ["idx_costos_tercero_cobertura", "idx_costos_catalogo_cobertura", "idx_costos_mes_cobertura"]),
+    ("/api/costos/kpis?fechas", costos.get_kpis, RANGO, ["idx_costos_fecha_cobertura"]),
+    ("/api/costos/grafico/mensual", costos.get_mensual, {}, ["idx_costos_mes_cobertura"]),
+    ("/api/costos/grafico/mensual?fechas", costos.get_mensual, RANGO, ["idx_costos_fecha_cobertura"]),
+    ("/api/costos/grafico/catalogo", costos.get_por_catalogo, {}, ["idx_costos_catalogo_cobertura"]),
+    ("/api/costos/grafico/ciudad?catalogos", costos.get_por_ciudad, {"catalogos": "CATALOGO 10,CATALOGO 11"},
+     ["idx_costos_catalogo_cobertura"]),
+    ("/api/costos/grafico/tercero?fechas", costos.get_por_tercero, RANGO, ["idx_costos_tercero_cobertura"]),
+
+    ("/api/operatividad/datos?fechas", operatividad.get_datos, dict(RANGO, limit=1000),
+     ["idx_operatividad_fecha_cobertura"]),
+    ("/api/operatividad/filtros", operatividad.get_filtros, {},
+     ["idx_operatividad_sede_cobertura", "idx_operatividad_estado_fecha", "idx_operatividad_placa_cobertura"]),
+    ("/api/operatividad/kpis", operatividad.get_kpis, {}, ["idx_operatividad_fecha_cobertura"]),
+    ("/api/operatividad/kpis?sedes", operatividad.get_kpis, {"sedes": "SEDE 10,SEDE 11"},
+     ["idx_operatividad_sede_cobertura"]),
+    ("/api/operatividad/grafico/diario", operatividad.get_diaria, {}, ["idx_operatividad_fecha_cobertura"]),
+    ("/api/operatividad/grafico/sede?fechas", operatividad.get_por_sede, RANGO, ["idx_operatividad_sede_cobertura"]),
+    ("/api/operatividad/grafico/estado?fechas", operatividad.get_por_estado, RANGO,
+     ["idx_operatividad_estado_fecha"]),
+    ("/api/operatividad/grafico/taller", operatividad.get_top_dias_taller, {},
+     ["idx_operatividad_placa_cobertura"]),
+
+    ("/api/compras/traza/kpis?fechas", compras.get_traza_kpis, RANGO, ["idx_traza_req_fecha_cobertura"]),
+    ("/api/compras/traza/filtros", compras.get_traza_filtros, {},
+     ["idx_traza_req_estado_autorizador", "idx_traza_oc_estado_autorizacion"]),
+    ("/api/compras/base/kpis?fechas", compras.get_base_kpis, RANGO, ["idx_base_oc_fecha_cobertura"]),
+    ("/api/compras/grafico/por-mes", compras.get_compras_por_mes, {}, ["idx_base_oc_mes_cobertura"]),
+    ("/api/compras/grafico/por-mes?fechas", compras.get_compras_por_mes, RANGO, ["idx_base_oc_fecha_cobertura"]),
+    ("/api/compras/grafico/por-estado?fechas", compras.get_compras_por_estado, RANGO, ["idx_base_oc_estado_fecha"]),
+    ("/api/compras/charts/pending-approve-rq", compras.chart_pending_rq, {"filters": compras.FilterRequest()},
+     ["idx_traza_req_estado_autorizador"]),
+    ("/api/compras/charts/pending-approve-oc", compras.chart_pending_oc, {"filters": compras.FilterRequest()},
+     ["idx_traza_oc_estado_autorizacion"]),
+    ("/api/compras/charts/trend-oc", compras.chart_trend_oc, {"filters": compras.FilterRequest()},
+     ["idx_traza_oc_mes"]),
+    ("/api/compras/charts/oc-vs-items-by-process", compras.chart_oc_vs_items, {"filters": compras.FilterRequest()},
+     ["idx_oc_desc_proceso_cobertura"]),
+    ("/api/compras/charts/discounts-by-process", compras.chart_discounts_by_process,
+     {"filters": compras.FilterRequest()}, ["idx_oc_desc_proceso_cobertura"]),
+    ("/api/compras/charts/top-suppliers", compras.chart_top_suppliers, {"filters": compras.FilterRequest()},
+     ["idx_oc_desc_tercero_cobertura"]),
+]
+
+INDEX_PATTERN = re.compile(r"USING (?:COVERING )?INDEX (\w+)")
+
+
+def base_index_name(name):
+    """Nombre del índice sin el sufijo de la recarga con staging"""
+    return name[:-len(INDEX_ALT_SUFFIX)] if name.endswith(INDEX_ALT_SUFFIX) else name
+
+
+def captured_statements(endpoint, params):
+    """Ejecutar un endpoint y retornar las consultas SELECT que hizo.
+
+    En un solo hilo el pool LIFO entrega siempre la misma conexión, así que
+    basta con registrar el callback de traza en ella.
+    """
+    pool = get_read_pool()
+    conn = pool.acquire()
+    statements = []
+    conn.set_trace_callback(statements.append)
+    pool.release(conn)
+    try:
+        endpoint(**params)
+    finally:
+        conn.set_trace_callback(None)
+    return [sql for sql in statements if sql.lstrip().upper().startswith("SELECT")]
+
+
+def query_plan(conn, sql):
+    """Líneas de EXPLAIN QUERY PLAN de una consulta (con los parámetros ya expandidos)"""
+    return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()]
+
+
+def check_endpoint(conn, endpoint, params, expected):
+    """Planes de las consultas de un endpoint y los índices esperados que faltan"""
+    plans = [(sql, query_plan(conn, sql)) for sql in captured_statements(endpoint, params)]
+    used = {base_index_name(name) for _, plan in plans for line in plan for name in INDEX_PATTERN.findall(line)}
+    return plans, [name for name in expected if name not in used]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Verificar los índices que usan las consultas de la API")
+    parser.add_argument("--verbose", action="store_true", help="Mostrar consultas y planes de todos los endpoints")
+    args = parser.parse_args(argv)
+
+    # Se revisan las consultas sobre las tablas físicas (las que se hacen
+    # cuando los filtros no permiten usar los agregados)
+    rollups.USE_ROLLUPS = False
+    # Sin caché de respuestas: cada endpoint debe ejecutar sus consultas
+    response_cache.RESPONSE_CACHE_MB = 0
+    init_db()
+    failures = 0
+    with get_db() as conn:
+        print(f"🧬 Versión de esquema: {schema_version(conn)}")
+        for route, endpoint, params, expected in CHECKS:
+            plans, missing = check_endpoint(conn, endpoint, params, expected)
+            if missing:
+                failures += 1
+                print(f"❌ {route}: no usa {', '.join(missing)}")
+            else:
+                print(f"✅ {route}: {', '.join(expected)}")
+            if missing or args.verbose:
+                for sql, plan in plans:
+                    print(f"   {' '.join(sql.split())[:160]}")
+                    for line in plan:
+                        print(f"      {line}")
+
+    print(f"📊 {len(CHECKS) - failures}/{len(CHECKS)} endpoints usan los índices esperados")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+"""
+Libros de Excel sintéticos con la estructura de los reales
+
+Cada libro de EXCEL_FILES se genera con sus hojas y los encabezados
+declarados en schema.py, en la misma ruta relativa dentro de otro
+directorio de datos. Los valores imitan los problemas de los libros
+reales: textos mal codificados, montos con "$" y comas, y la fecha
+inválida "31/12/1899" en las tablas que la declaran como nula.
+"""
+import random
+from datetime import datetime, timedelta
+
+from openpyxl import Workbook
+
+from backend.config import DATA_DIR, EXCEL_FILES
+from backend.import_data import workbook_sheets
+from backend.schema import TABLES
+
+# Textos con caracteres mal codificados (UTF-8 leído como Latin-1)
+MOJIBAKE = ["CamiÃ³n", "BogotÃ¡", "MedellÃ­n", "CompaÃ±Ã­a", "MantenciÃ³n", "DaÃ±o", "Ã‰xito", "NÂº 12"]
+
+# Valores distintos por columna de texto (cardinalidad parecida a la real)
+TEXT_VALUES = 60
+
+# Proporción de celdas con textos especiales
+MOJIBAKE_RATE = 0.1
+NULL_DATE_RATE = 0.02
+EMPTY_RATE = 0.03
+
+START_DATE = datetime(2023, 1, 1)
+
+
+def _text_pool(column, rng):
+    """Valores posibles de una columna de texto"""
+    pool = [f"{column.name.upper()} {i}" for i in range(TEXT_VALUES)]
+    for i in range(int(TEXT_VALUES * MOJIBAKE_RATE)):
+        pool[i] = f"{rng.choice(MOJIBAKE)} {i}"
+    return pool
+
+
+def _value_factory(table, column, rng):
+    """Función fila -> valor de la celda para una columna"""
+    if column.converter == "fecha":
+        null_dates = [value for value in table.null_values if value.count("/") == 2]
+
+        def value(row):
+            if null_dates and rng.random() < NULL_DATE_RATE:
+                return null_dates[0]
+            return START_DATE + timedelta(days=rng.randrange(730), minutes=rng.randrange(600))
+        return value
+
+    if column.converter == "monto":
+        def value(row):
+            amount = rng.uniform(1, 5_000_000)
+            return f"$ {amount:,.2f}" if rng.random() < 0.7 else round(amount, 2)
+        return value
+
+    if column.name in table.natural_key and column.sql_type == "INTEGER":
+        # Claves numéricas casi únicas para que la importación delta empareje filas
+        return lambda row: 100_000 + row
+
+    if column.sql_type == "INTEGER":
+        return lambda row: rng.randrange(1, 1000)
+
+    if column.sql_type == "REAL":
+        return lambda row: round(rng.uniform(0, 10_000), 2)
+
+    pool = _text_pool(column, rng)
+
+    def value(row):
+        if rng.random() < EMPTY_RATE:
+            return None
+        return pool[rng.randrange(len(pool))]
+    return value
+
+
+def write_workbook(path, sheets, rows, seed=0):
+    """Escribir un libro con `rows` filas en cada hoja {tabla: nombre de hoja}"""
+    rng = random.Random(seed)
+    workbook = Workbook(write_only=True)
+    for table_name, sheet_name in sheets.items():
+        table = TABLES[table_name]
+        sheet = workbook.create_sheet(sheet_name)
+        sheet.append([column.source for column in table.columns])
+        factories = [_value_factory(table, column, rng) for column in table.columns]
+        for row in range(rows):
+            sheet.append([factory(row) for factory in factories])
+    path.parent.mkdir(parents=True, exist_ok=True)
+    workbook.save(path)
+
+
+def generate_data_dir(target_dir, rows, keys=None, seed=0):
+    """Generar los libros en target_dir con la misma estructura que DATA_DIR.
+
+    Los libros ya generados no se vuelven a escribir. Retorna {libro: ruta}.
+    """
+    paths = {}
+    for key in keys or EXCEL_FILES:
+        path = target_dir / EXCEL_FILES[key]["path"].relative_to(DATA_DIR)
+        if not path.exists():
+            print(f"🧪 Generando {path.name} ({rows:,} filas por hoja)...")
+            partial = path.with_name(path.name + ".tmp")
+            write_workbook(partial, workbook_sheets(key), rows, seed)
+            partial.replace(path)
+        paths[key] = path
+    return paths
@@ -0,0 +1,90 @@
+"""
+Peticiones condicionales (ETag / Last-Modified) en los GET de los tableros
+
+Las respuestas de /api/costos, /api/operatividad y /api/compras solo
+cambian cuando corre el importador. Cada GET que responde 200 lleva:
+
+- ETag fuerte: hash de la versión de datos (último id de import_runs que
+  ve la API e instantánea analítica, ver response_cache.data_version), la
+  ruta y los parámetros normalizados (mismas reglas que la caché de
+  respuestas, así que "?sedes=B,A" y "?sedes=A,B" comparten ETag).
+- Last-Modified: created_at de la última fila de import_runs.
+- Cache-Control: no-cache, para que el navegador guarde la respuesta pero
+  la revalide en cada visita.
+
+Si la petición trae If-None-Match con el ETag vigente (o, sin
+If-None-Match, un If-Modified-Since igual o posterior a la última
+importación) se responde 304 sin ejecutar el endpoint: la recarga de
+/datos con 100k filas cuesta un viaje sin cuerpo.
+
+Los POST de /api/compras/charts no se incluyen: los navegadores no hacen
+peticiones condicionales con POST.
+
+Ambos validadores salen de la versión servida (read_snapshot.served_stamp):
+con la copia en memoria, validar una petición no consulta la BD.
+"""
+import hashlib
+from datetime import timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from fastapi import Request, Response
+
+from . import analytics, read_snapshot, response_cache
+
+# Prefijos de las rutas de datos y agregados de los tableros
+PREFIXES = ("/api/costos/", "/api/operatividad/", "/api/compras/")
+
+
+def etag(request, version):
+    """ETag fuerte de una petición GET para una versión de datos"""
+    params = sorted(
+        (name, str(value))
+        for name, value in ((name, response_cache.normalize(name, raw))
+                            for name, raw in request.query_params.multi_items())
+        if value is not None
+    )
+    digest = hashlib.sha1(repr((version, request.url.path, params)).encode()).hexdigest()[:24]
+    return f'"{digest}"'
+
+
+def etag_matches(header, tag):
+    """If-None-Match contiene el ETag (comparación débil, RFC 9110 13.1.2)"""
+    candidates = [value.strip() for value in header.split(",")]
+    return "*" in candidates or tag in (value[2:] if value.startswith("W/") else value for value in candidates)
+
+
+def not_modified_since(header, modified):
+    """If-Modified-Since es igual o posterior a la última importación"""
+    if header is None or modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return modified <= since
+
+
+async def conditional_get(request: Request, call_next):
+    """Middleware HTTP: validadores en los GET de los tableros y 304 si el cliente ya tiene la respuesta"""
+    if request.method != "GET" or not request.url.path.startswith(PREFIXES):
+        return await call_next(request)
+
+    import_id, modified = read_snapshot.served_stamp()
+    headers = {"etag": etag(request, (import_id, analytics.snapshot_id())), "cache-control": "no-cache"}
+    if modified is not None:
+        headers["last-modified"] = format_datetime(modified, usegmt=True)
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        fresh = etag_matches(if_none_match, headers["etag"])
+    else:
+        fresh = not_modified_since(request.headers.get("if-modified-since"), modified)
+    if fresh:
+        return Response(status_code=304, headers=headers)
+
+    response = await call_next(request)
+    if response.status_code == 200:
+        response.headers.update(headers)
+    return response
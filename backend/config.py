@@ -3,8 +3,8 @@ from pathlib import Path
 
 # Rutas base
 BASE_DIR = Path(__file__).resolve().parent.parent
-DATA_DIR = BASE_DIR / "data"
-DB_PATH = BASE_DIR / "backend" / "logistica.db"
+DATA_DIR = Path(os.getenv("DATA_DIR", str(BASE_DIR / "data")))
+DB_PATH = Path(os.getenv("DB_PATH", str(BASE_DIR / "backend" / "logistica.db")))
 
 # Configuración de archivos Excel
 EXCEL_FILES = {
@@ -26,6 +26,58 @@ EXCEL_FILES = {
     }
 }
 
+# Importación por bloques (modo streaming): filas leídas por bloque
+STREAM_CHUNK_SIZE = int(os.getenv("STREAM_CHUNK_SIZE", "5000"))
+
+# Procesos para leer y convertir hojas en paralelo (1 = secuencial)
+IMPORT_WORKERS = int(os.getenv("IMPORT_WORKERS", "1"))
+
+# Caché de hojas convertidas (se omite la lectura del Excel si el libro no cambió)
+SHEET_CACHE_DIR = Path(os.getenv("SHEET_CACHE_DIR", str(BASE_DIR / "backend" / "cache")))
+
+# Vigilante de libros (backend/watcher.py): intervalo de revisión y segundos
+# sin cambios antes de importar (el archivo terminó de copiarse)
+WATCH_POLL_SECONDS = float(os.getenv("WATCH_POLL_SECONDS", "5"))
+WATCH_SETTLE_SECONDS = float(os.getenv("WATCH_SETTLE_SECONDS", "30"))
+
+# Token de la carga de libros (POST /api/admin/upload/{libro}, cabecera
+# "Authorization: Bearer <token>"); vacío deshabilita el endpoint
+UPLOAD_TOKEN = os.getenv("UPLOAD_TOKEN", "")
+# Tamaño máximo de un libro subido, en MB (el mismo límite que nginx.conf)
+UPLOAD_MAX_MB = int(os.getenv("UPLOAD_MAX_MB", "200"))
+
+# Pool de conexiones de lectura de la API: conexiones máximas y segundos de
+# espera por una libre; caché de páginas (KB) y mmap (bytes) por conexión
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_CACHE_SIZE_KB = int(os.getenv("DB_CACHE_SIZE_KB", "65536"))
+DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", str(256 * 1024 * 1024)))
+
+# Copia en memoria de la BD para las lecturas de la API (read_snapshot.py):
+# tamaño máximo en MB (0 = leer siempre del disco; memdb admite hasta 1024) y
+# segundos entre revisiones de import_runs para recargarla tras una importación
+DB_MEMORY_BUDGET_MB = int(os.getenv("DB_MEMORY_BUDGET_MB", "512"))
+DB_SNAPSHOT_POLL_SECONDS = float(os.getenv("DB_SNAPSHOT_POLL_SECONDS", "10"))
+
+# Hilos que atienden los endpoints de consulta. Los handlers de las rutas son
+# funciones normales (def): FastAPI los ejecuta en este pool de hilos y el
+# event loop queda libre mientras SQLite calcula
+API_THREADS = int(os.getenv("API_THREADS", "16"))
+
+# Responder gráficos y KPIs desde las tablas de agregados (rollups) cuando los
+# filtros lo permiten; 0 para consultar siempre las tablas originales
+USE_ROLLUPS = os.getenv("USE_ROLLUPS", "1") != "0"
+
+# Motor de las consultas de KPIs y gráficos: "sqlite" (la BD) o "duckdb" (motor
+# columnar embebido sobre una instantánea Parquet que escribe el importador en
+# ANALYTICS_DIR; requiere el paquete opcional duckdb, ver analytics.py)
+ANALYTICS_ENGINE = os.getenv("ANALYTICS_ENGINE", "sqlite").lower()
+ANALYTICS_DIR = Path(os.getenv("ANALYTICS_DIR", str(BASE_DIR / "backend" / "analytics")))
+
+# Caché de respuestas de KPIs, gráficos y filtros (response_cache.py): memoria
+# máxima en MB; 0 la desactiva
+RESPONSE_CACHE_MB = int(os.getenv("RESPONSE_CACHE_MB", "64"))
+
 # Configuración del servidor
 API_HOST = "0.0.0.0"
 API_PORT = 8000
@@ -1,11 +1,55 @@
+import queue
+import re
 import sqlite3
+import threading
+import time
 from contextlib import contextmanager
-from .config import DB_PATH
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin cerrojo entre procesos (ver import_lock)
+    fcntl = None
+
+from .config import DB_PATH, DB_POOL_SIZE, DB_POOL_TIMEOUT, DB_CACHE_SIZE_KB, DB_MMAP_SIZE
+from .schema import (TABLES, INDEXES, ROLLUPS, DIMENSIONS, create_table_sql, create_view_sql, date_part_values,
+                     dimension_table_name, dimension_table_sql, rollup_table_name, rollup_table_sql,
+                     rollup_insert_sql)
+
+# Sufijos usados en la recarga con tabla staging. Los nombres de índice son
+# globales en SQLite, así que los índices de la tabla staging alternan entre
+# "nombre" y "nombre__b" en cada recarga.
+STAGING_SUFFIX = "_staging"
+INDEX_ALT_SUFFIX = "__b"
+
+# PRAGMAs de las conexiones abiertas durante una carga masiva (ver bulk_load).
+# La BD sigue en WAL: salir de WAL exige acceso exclusivo y fallaría con la API
+# leyendo; con synchronous=OFF el WAL tampoco hace fsync.
+BULK_LOAD_PRAGMAS = {
+    "synchronous": "OFF",
+    "cache_size": "-200000",  # ~200 MB
+    "temp_store": "MEMORY",
+}
+_bulk_load_active = False
+
+# Archivo del cerrojo de importación, junto a la BD (ver import_lock)
+IMPORT_LOCK_PATH = DB_PATH.with_name(DB_PATH.name + ".import.lock")
+
+# PRAGMAs de las conexiones de lectura de la API (ver ReadPool)
+READ_PRAGMAS = {
+    "query_only": "ON",
+    "cache_size": f"-{DB_CACHE_SIZE_KB}",
+    "mmap_size": str(DB_MMAP_SIZE),
+    "temp_store": "MEMORY",
+}
+
 
 def get_connection():
     """Obtener conexión a la base de datos"""
     conn = sqlite3.connect(str(DB_PATH), check_same_thread=False)
     conn.row_factory = sqlite3.Row
+    if _bulk_load_active:
+        for pragma, value in BULK_LOAD_PRAGMAS.items():
+            conn.execute(f'PRAGMA {pragma} = {value}')
     return conn
 
 @contextmanager
@@ -17,213 +61,611 @@ def get_db():
     finally:
         conn.close()
 
+
+class PoolTimeout(Exception):
+    """No se liberó ninguna conexión del pool dentro del tiempo de espera"""
+
+
+class PooledConnection(sqlite3.Connection):
+    """Conexión del pool de lectura, marcada con la generación del pool que la abrió"""
+    generation = 0
+
+
+class ReadPool:
+    """Pool acotado de conexiones de solo lectura para la API.
+
+    Las conexiones se reutilizan entre peticiones, así que conservan el
+    esquema ya leído y su caché de páginas. Se entregan en orden LIFO (la
+    más recién usada tiene la caché más caliente) y se crean a demanda
+    hasta `size`; si todas están en uso se espera hasta `timeout` segundos.
+
+    switch() cambia la BD de las conexiones nuevas (p. ej. a la copia en
+    memoria de read_snapshot.py): las conexiones a la BD anterior se
+    cierran al devolverse, así que cada consulta ve una sola de las dos.
+    """
+
+    def __init__(self, size=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT):
+        self.size = size
+        self.timeout = timeout
+        self._database = (str(DB_PATH), False)  # (nombre o URI, es URI)
+        self._generation = 0
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._stats = {
+            "abiertas": 0,
+            "en_uso": 0,
+            "solicitudes": 0,
+            "esperas": 0,
+            "espera_total_ms": 0.0,
+            "espera_max_ms": 0.0,
+            "timeouts": 0,
+        }
+
+    def _connect(self):
+        with self._lock:
+            (database, uri), generation = self._database, self._generation
+        conn = sqlite3.connect(database, uri=uri, check_same_thread=False, factory=PooledConnection)
+        conn.generation = generation
+        conn.row_factory = sqlite3.Row
+        for pragma, value in READ_PRAGMAS.items():
+            conn.execute(f'PRAGMA {pragma} = {value}')
+        return conn
+
+    def acquire(self):
+        """Tomar una conexión (esperando si el pool está lleno)"""
+        start = time.perf_counter()
+        if not self._slots.acquire(blocking=False):
+            if not self._slots.acquire(timeout=self.timeout):
+                with self._lock:
+                    self._stats["timeouts"] += 1
+                raise PoolTimeout(f"Sin conexiones libres tras {self.timeout}s ({self.size} en uso)")
+            waited_ms = (time.perf_counter() - start) * 1000
+            with self._lock:
+                self._stats["esperas"] += 1
+                self._stats["espera_total_ms"] += waited_ms
+                self._stats["espera_max_ms"] = max(self._stats["espera_max_ms"], waited_ms)
+
+        conn = self._take_idle()
+        if conn is None:
+            try:
+                conn = self._connect()
+            except Exception:
+                self._slots.release()
+                raise
+            with self._lock:
+                self._stats["abiertas"] += 1
+        with self._lock:
+            self._stats["solicitudes"] += 1
+            self._stats["en_uso"] += 1
+        return conn
+
+    def _take_idle(self):
+        """Conexión libre de la generación actual (las de una BD anterior se cierran), o None"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                return None
+            if conn.generation == self._generation:
+                return conn
+            self._close(conn)
+
+    def _close(self, conn):
+        conn.close()
+        with self._lock:
+            self._stats["abiertas"] -= 1
+
+    def release(self, conn, discard=False):
+        """Devolver una conexión; con discard=True se cierra en lugar de reutilizarla"""
+        if discard or conn.generation != self._generation:
+            self._close(conn)
+        else:
+            self._idle.put(conn)
+        with self._lock:
+            self._stats["en_uso"] -= 1
+        self._slots.release()
+
+    def switch(self, database, uri=False):
+        """Abrir las próximas conexiones sobre otra BD (archivo o URI) y cerrar las libres"""
+        with self._lock:
+            self._database = (str(database), uri)
+            self._generation += 1
+        # Las libres de la BD anterior se cierran ya; las que están en uso, al devolverse
+        keep = []
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if conn.generation == self._generation:
+                keep.append(conn)
+            else:
+                self._close(conn)
+        for conn in reversed(keep):
+            self._idle.put(conn)
+
+    def close_all(self):
+        """Cerrar las conexiones libres (al apagar la API)"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._close(conn)
+
+    def metrics(self):
+        """Tamaño, uso y tiempos de espera del pool"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats["tamano"] = self.size
+        stats["libres"] = self._idle.qsize()
+        stats["espera_promedio_ms"] = round(stats["espera_total_ms"] / stats["esperas"], 2) if stats["esperas"] else 0.0
+        stats["espera_total_ms"] = round(stats["espera_total_ms"], 2)
+        stats["espera_max_ms"] = round(stats["espera_max_ms"], 2)
+        return stats
+
+
+_read_pool = None
+_read_pool_lock = threading.Lock()
+
+
+def get_read_pool():
+    """Pool de lectura de la API (se crea en el primer uso)"""
+    global _read_pool
+    with _read_pool_lock:
+        if _read_pool is None:
+            _read_pool = ReadPool()
+        return _read_pool
+
+
+@contextmanager
+def get_read_db():
+    """Context manager para una conexión de solo lectura del pool.
+
+    Para las consultas de la API; el importador y demás escrituras usan get_db().
+    """
+    pool = get_read_pool()
+    conn = pool.acquire()
+    try:
+        yield conn
+    except sqlite3.Error:
+        # La conexión puede haber quedado en un estado inesperado: no se reutiliza
+        pool.release(conn, discard=True)
+        raise
+    except BaseException:
+        pool.release(conn)
+        raise
+    else:
+        pool.release(conn)
+
+
 def init_db():
     """Inicializar tablas de la base de datos"""
     with get_db() as conn:
         cursor = conn.cursor()
         
-        # Tabla para Costos Mensuales
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS costos_mensuales (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                fecha TEXT,
-                catalogo TEXT,
-                neto REAL,
-                ciudad TEXT,
-                proyecto TEXT,
-                tercero TEXT,
-                descripcion TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Tabla para Operatividad Vehículos
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS operatividad_vehiculos (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                fecha_ejecucion TEXT,
-                placa TEXT,
-                tipo_vehiculo TEXT,
-                sede TEXT,
-                estado_vehiculo TEXT,
-                brigada TEXT,
-                conductor TEXT,
-                contrato TEXT,
-                gps TEXT,
-                justificacion_no_salida TEXT,
-                tipo_dano TEXT,
-                dano_inoperatividad TEXT,
-                motivo_inoperatividad TEXT,
-                observacion_inoperatividad TEXT,
-                tipo_mantenimiento TEXT,
-                km_mantenimiento REAL,
-                vehiculos_programados REAL,
-                vehiculos_operativos REAL,
-                dias_en_taller REAL,
-                propietario TEXT,
-                indicador REAL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # ========== TABLAS PARA COMPRAS ==========
+        # WAL: las lecturas de la API no bloquean las escrituras del importador
+        # (y viceversa). Queda guardado en el archivo de la BD.
+        cursor.execute('PRAGMA journal_mode = WAL')
         
-        # Tabla para TRAZA REQ OC (Trazabilidad Requisición a OC)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS traza_req_oc (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                req_fecha_entrega TEXT,
-                req_fecha TEXT,
-                req_usuario TEXT,
-                req_fecha_autorizada TEXT,
-                req_usuario_autorizador TEXT,
-                req_emp INTEGER,
-                req_suc INTEGER,
-                req_descripcion_tipo_doc TEXT,
-                req_tipo TEXT,
-                req_numero INTEGER,
-                req_estado TEXT,
-                item_codigo INTEGER,
-                item_descripcion TEXT,
-                cotizacion_tipo TEXT,
-                cotizacion_numero INTEGER,
-                oc_fecha TEXT,
-                oc_usuario TEXT,
-                oc_fecha_autorizacion TEXT,
-                oc_usuario_autorizacion TEXT,
-                oc_tipo TEXT,
-                oc_numero INTEGER,
-                oc_estado TEXT,
-                oc_tercero_id TEXT,
-                oc_tercero_suc INTEGER,
-                oc_tercero_nombre TEXT,
-                entrega_servicio_fecha TEXT,
-                entrega_servicio_usuario TEXT,
-                entrega_servicio_tipo TEXT,
-                entrega_servicio_numero REAL,
-                entrega_almacen_fecha TEXT,
-                entrega_almacen_usuario TEXT,
-                entrega_almacen_tipo TEXT,
-                entrega_almacen_numero REAL,
-                factura_compra_fecha TEXT,
-                factura_compra_tipo TEXT,
-                factura_compra_numero REAL,
-                devolucion_compra_fecha TEXT,
-                devolucion_compra_tipo TEXT,
-                devolucion_compra_numero REAL,
-                dias_aprobar_rq INTEGER,
-                dias_generar_oc INTEGER,
-                dias_aprobacion_oc INTEGER,
-                dias_recepcion_servicio REAL,
-                dias_entrada_almacen REAL,
-                mes REAL,
-                suma_rq INTEGER,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
+        # Tablas de los libros importados (definidas en schema.py): dimensiones,
+        # tablas físicas y vistas con el nombre original. En una BD anterior a
+        # los diccionarios el nombre original sigue siendo una tabla y la vista
+        # no se crea; la migración 3 la convierte.
+        for dictionary in DIMENSIONS:
+            cursor.execute(dimension_table_sql(dictionary))
+        for table in TABLES.values():
+            cursor.execute(create_table_sql(table))
+            if table.storage != table.name:
+                cursor.execute(create_view_sql(table))
         
-        # Tabla para OC DESCUENTOS
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS oc_descuentos (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                fecha TEXT,
-                fecha_entrega TEXT,
-                dias_entrega INTEGER,
-                documento_emp TEXT,
-                documento_suc INTEGER,
-                documento_tipo TEXT,
-                documento_num INTEGER,
-                item_codigo INTEGER,
-                item_descripcion TEXT,
-                item_bodega REAL,
-                item_cantidad REAL,
-                talla TEXT,
-                item_unidad TEXT,
-                item_proyecto INTEGER,
-                item_solicitante TEXT,
-                item_fecha_requ TEXT,
-                tercero_id TEXT,
-                tercero_nombre TEXT,
-                costo_unitario REAL,
-                total_item REAL,
-                tasa_dcto REAL,
-                total_dcto REAL,
-                subtotal REAL,
-                tasa_iva REAL,
-                total_iva REAL,
-                total REAL,
-                estado TEXT,
-                moneda TEXT,
-                observaciones TEXT,
-                proceso TEXT,
-                concatenado TEXT,
-                porcentaje_descuento REAL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
+        # Huella de contenido por fila (importación delta) en BDs creadas antes
+        # (el nombre original es una vista desde la migración 3; la tabla física ya la tiene)
+        for table in TABLES:
+            cursor.execute("SELECT type FROM sqlite_master WHERE name = ?", (table,))
+            if cursor.fetchone()[0] == 'table':
+                add_column(cursor, table, "row_hash", "INTEGER")
         
-        # Tabla para BASE OC GENERADAS
+        # Métricas de cada corrida de importación (ver import_runs.py)
         cursor.execute('''
-            CREATE TABLE IF NOT EXISTS base_oc_generadas (
+            CREATE TABLE IF NOT EXISTS import_runs (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
-                fecha TEXT,
-                fecha_entrega TEXT,
-                dias_entrega INTEGER,
-                documento_emp INTEGER,
-                documento_suc INTEGER,
-                documento_tipo TEXT,
-                documento_num INTEGER,
-                item_codigo INTEGER,
-                item_descripcion TEXT,
-                item_bodega REAL,
-                item_cantidad REAL,
-                talla TEXT,
-                item_unidad TEXT,
-                item_proyecto INTEGER,
-                item_solicitante TEXT,
-                item_fecha_requ TEXT,
-                tercero_id TEXT,
-                tercero_nombre TEXT,
-                costo_unitario REAL,
-                total_item REAL,
-                tasa_dcto REAL,
-                total_dcto REAL,
-                subtotal REAL,
-                tasa_iva REAL,
-                total_iva REAL,
-                total REAL,
+                run_id TEXT,
+                origen TEXT,
+                modo TEXT,
+                delta INTEGER,
+                inicio TEXT,
+                libro TEXT,
+                tabla TEXT,
                 estado TEXT,
-                moneda TEXT,
-                observaciones TEXT,
+                registros INTEGER,
+                actualizados INTEGER,
+                eliminados INTEGER,
+                duracion REAL,
+                firma TEXT,
+                cache REAL,
+                lectura REAL,
+                conversion REAL,
+                insercion REAL,
+                indices REAL,
+                agregados REAL,
+                rechazados TEXT,
+                invalidos TEXT,
+                memoria_pico_mb REAL,
+                error TEXT,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         ''')
         
-        # Índices para mejorar rendimiento
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_costos_fecha ON costos_mensuales(fecha)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_costos_catalogo ON costos_mensuales(catalogo)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_costos_ciudad ON costos_mensuales(ciudad)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_operatividad_fecha ON operatividad_vehiculos(fecha_ejecucion)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_operatividad_sede ON operatividad_vehiculos(sede)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_operatividad_estado ON operatividad_vehiculos(estado_vehiculo)')
+        conn.commit()
         
-        # Índices para compras
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_traza_oc_fecha ON traza_req_oc(oc_fecha)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_traza_req_estado ON traza_req_oc(req_estado)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_traza_oc_estado ON traza_req_oc(oc_estado)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_oc_desc_fecha ON oc_descuentos(fecha)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_oc_desc_proceso ON oc_descuentos(proceso)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_oc_desc_tercero ON oc_descuentos(tercero_nombre)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_base_oc_fecha ON base_oc_generadas(fecha)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_base_oc_estado ON base_oc_generadas(estado)')
+        # Cambios sobre BDs ya creadas (índices reemplazados, etc.)
+        apply_migrations(conn)
         
+        # Índices para mejorar rendimiento (después de las migraciones: pueden
+        # usar columnas que una migración agrega)
+        for name, table, columns in INDEXES:
+            create_index(cursor, name, table, columns)
+        create_index(cursor, "idx_import_runs_run", "import_runs", "run_id")
+        create_index(cursor, "idx_import_runs_tabla", "import_runs", "tabla")
         conn.commit()
         print("✅ Base de datos inicializada correctamente")
 
+
+def add_column(cursor, table: str, column: str, sql_type: str):
+    """Agregar una columna si la tabla aún no la tiene"""
+    columns = [row[1] for row in cursor.execute(f"PRAGMA table_info({table})").fetchall()]
+    if column not in columns:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {sql_type}")
+
+
+def _drop_indexes(cursor, names):
+    """Eliminar índices con su nombre o su nombre alterno"""
+    for name in names:
+        cursor.execute(f'DROP INDEX IF EXISTS {name}')
+        cursor.execute(f'DROP INDEX IF EXISTS {alternate_index_name(name)}')
+
+
+def _migration_covering_indexes(cursor):
+    """Índices de una columna reemplazados por compuestos/de cobertura"""
+    _drop_indexes(cursor, [
+        "idx_costos_fecha", "idx_costos_catalogo", "idx_costos_ciudad",
+        "idx_operatividad_fecha", "idx_operatividad_sede", "idx_operatividad_estado",
+        "idx_traza_req_estado", "idx_traza_oc_estado",
+        "idx_oc_desc_proceso", "idx_oc_desc_tercero",
+        "idx_base_oc_fecha", "idx_base_oc_estado",
+    ])
+    for name, table, columns in INDEXES:
+        create_index(cursor, name, table, columns)
+    # Estadísticas para que el planificador elija los índices nuevos
+    for table in TABLES.values():
+        cursor.execute(f'ANALYZE {table.storage}')
+
+
+def _migration_rollups(cursor):
+    """Tablas de agregados por día/mes (ver rollups.py) y su etapa en import_runs"""
+    for rollup in ROLLUPS.values():
+        name = rollup_table_name(rollup.table)
+        cursor.execute(rollup_table_sql(rollup))
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_{name} ON {name}(grano, dimension, periodo)')
+        build_rollups(cursor, rollup.table)
+        cursor.execute(f'ANALYZE {name}')
+    add_column(cursor, "import_runs", "agregados", "REAL")
+
+
+def _migration_dictionaries(cursor):
+    """Tablas con columnas de diccionario: copiar la tabla original a la física y reemplazarla por la vista"""
+    for table in TABLES.values():
+        if table.storage == table.name:
+            continue
+        cursor.execute("SELECT type FROM sqlite_master WHERE name = ?", (table.name,))
+        if cursor.fetchone()[0] != 'table':
+            continue
+        values = []
+        for column in table.columns:
+            if column.dictionary:
+                dimension = dimension_table_name(column.dictionary)
+                cursor.execute(f'INSERT OR IGNORE INTO {dimension} (valor) '
+                               f'SELECT DISTINCT {column.name} FROM {table.name} WHERE {column.name} IS NOT NULL')
+                values.append(f"(SELECT id FROM {dimension} WHERE valor = {column.name})")
+            else:
+                values.append(column.name)
+        storage_columns = ", ".join(column.storage for column in table.columns)
+        cursor.execute(f'DELETE FROM {table.storage}')
+        cursor.execute(f'INSERT INTO {table.storage} (id, {storage_columns}, row_hash, created_at) '
+                       f'SELECT id, {", ".join(values)}, row_hash, created_at FROM {table.name}')
+        cursor.execute(f'DROP TABLE {table.name}')
+        cursor.execute(create_view_sql(table))
+    # Los índices de la tabla original se eliminaron con ella
+    for name, table, columns in INDEXES:
+        create_index(cursor, name, table, columns)
+    for table in TABLES.values():
+        build_rollups(cursor, table.name)
+        cursor.execute(f'ANALYZE {table.storage}')
+
+
+def _migration_date_parts(cursor):
+    """Mes y semana guardados: agregar las columnas y calcularlas para las filas existentes.
+
+    Las tablas sin diccionario (traza_req_oc) todavía tienen el nombre
+    original: pasan a <tabla>_datos (con sus índices) y se crea su vista.
+    """
+    for table in TABLES.values():
+        if not table.date_parts:
+            continue
+        cursor.execute("SELECT type FROM sqlite_master WHERE name = ?", (table.name,))
+        if cursor.fetchone()[0] == 'table':
+            # init_db() ya creó una tabla física vacía
+            cursor.execute(f'DROP TABLE {table.storage}')
+            cursor.execute(f'ALTER TABLE {table.name} RENAME TO {table.storage}')
+            cursor.execute(create_view_sql(table))
+        parts = date_part_values(table, {column: column for column in table.date_parts})
+        for column, _ in parts:
+            add_column(cursor, table.storage, column, "TEXT")
+        # También en BDs que la migración 3 acaba de copiar (las columnas ya existían vacías)
+        assignments = ", ".join(f"{column} = {expression}" for column, expression in parts)
+        cursor.execute(f'UPDATE {table.storage} SET {assignments}')
+    # Índices de cobertura que ahora incluyen el mes; el de oc_fecha se reemplaza por el del mes
+    _drop_indexes(cursor, ["idx_costos_fecha_cobertura", "idx_base_oc_fecha_cobertura", "idx_traza_oc_fecha"])
+    for name, table, columns in INDEXES:
+        create_index(cursor, name, table, columns)
+    for table in TABLES.values():
+        build_rollups(cursor, table.name)
+        cursor.execute(f'ANALYZE {table.storage}')
+
+
+def _migration_invalid_rows(cursor):
+    """Detalle de las filas rechazadas por corrida (las fechas ya guardadas se
+    normalizan en la siguiente importación: cambian su huella y la caché)"""
+    add_column(cursor, "import_runs", "invalidos", "TEXT")
+
+
+def _migration_views_without_row_hash(cursor):
+    """Vistas sin las columnas internas (row_hash): la API devuelve solo las del Excel"""
+    for table in TABLES.values():
+        cursor.execute("SELECT type FROM sqlite_master WHERE name = ?", (table.name,))
+        if cursor.fetchone()[0] == 'view':
+            cursor.execute(f'DROP VIEW {table.name}')
+            cursor.execute(create_view_sql(table))
+
+
+def _migration_delta_counts(cursor):
+    """Filas actualizadas y eliminadas por las importaciones delta (registros
+    pasa a contar solo las insertadas)"""
+    add_column(cursor, "import_runs", "actualizados", "INTEGER")
+    add_column(cursor, "import_runs", "eliminados", "INTEGER")
+
+
+def _migration_workbook_signature(cursor):
+    """Firma del libro importado (el vigilante omite los libros ya importados)"""
+    add_column(cursor, "import_runs", "firma", "TEXT")
+
+
+# Migraciones del esquema, en orden: (versión, descripción, función(cursor)).
+# La versión aplicada se guarda en PRAGMA user_version del archivo de la BD;
+# init_db() ejecuta solo las posteriores. Una BD nueva también las recorre
+# (sobre tablas vacías son inmediatas).
+MIGRATIONS = [
+    (1, "índices compuestos y de cobertura", _migration_covering_indexes),
+    (2, "tablas de agregados por día y mes", _migration_rollups),
+    (3, "textos repetidos en tablas de diccionario", _migration_dictionaries),
+    (4, "mes y semana guardados en columnas indexadas", _migration_date_parts),
+    (5, "filas rechazadas en el registro de importaciones", _migration_invalid_rows),
+    (6, "vistas sin la huella de fila", _migration_views_without_row_hash),
+    (7, "conteos de la importación delta en el registro de importaciones", _migration_delta_counts),
+    (8, "firma del libro en el registro de importaciones", _migration_workbook_signature),
+]
+
+
+def schema_version(conn) -> int:
+    """Versión de esquema de la BD (última migración aplicada)"""
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def apply_migrations(conn):
+    """Aplicar las migraciones pendientes en una sola transacción.
+
+    BEGIN IMMEDIATE toma el bloqueo de escritura antes de leer la versión,
+    así que si la API y el importador arrancan a la vez solo uno migra.
+    Retorna las versiones aplicadas.
+    """
+    cursor = conn.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        version = schema_version(conn)
+        applied = []
+        for number, description, migration in MIGRATIONS:
+            if number <= version:
+                continue
+            start = time.perf_counter()
+            migration(cursor)
+            cursor.execute(f'PRAGMA user_version = {number}')
+            applied.append(number)
+            print(f"🧬 Migración {number} aplicada: {description} ({time.perf_counter() - start:.2f}s)")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return applied
+
 def clear_table(table_name: str):
     """Limpiar una tabla antes de reimportar"""
     with get_db() as conn:
         cursor = conn.cursor()
-        cursor.execute(f'DELETE FROM {table_name}')
+        cursor.execute(f'DELETE FROM {TABLES[table_name].storage}')
         conn.commit()
         print(f"🗑️ Tabla {table_name} limpiada")
+
+
+def alternate_index_name(name: str) -> str:
+    """Nombre alterno de un índice (ver INDEX_ALT_SUFFIX)"""
+    if name.endswith(INDEX_ALT_SUFFIX):
+        return name[:-len(INDEX_ALT_SUFFIX)]
+    return name + INDEX_ALT_SUFFIX
+
+
+def create_index(cursor, name: str, table: str, columns: str):
+    """Crear un índice si no existe con su nombre ni con su nombre alterno"""
+    cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name IN (?, ?)",
+        (name, alternate_index_name(name))
+    )
+    if cursor.fetchone() is None:
+        cursor.execute(f'CREATE INDEX {name} ON {table}({columns})')
+
+
+def create_staging_table(conn, table_name: str) -> str:
+    """Crear una tabla staging vacía con la estructura física del registro (sin índices)"""
+    staging = TABLES[table_name].storage + STAGING_SUFFIX
+    cursor = conn.cursor()
+    cursor.execute(f'DROP TABLE IF EXISTS {staging}')
+    cursor.execute(create_table_sql(TABLES[table_name], staging))
+    conn.commit()
+    return staging
+
+
+def swap_staging_table(conn, table_name: str, timings=None):
+    """Reemplazar la tabla por su staging ya cargada.
+
+    Los índices se crean sobre la staging después de la carga masiva; el
+    cambio de tabla (DROP + RENAME) y el recálculo de sus agregados son una
+    sola transacción, así que las consultas ven los datos y agregados
+    anteriores o los nuevos, nunca una tabla a medias ni agregados de otra
+    versión. Se reemplaza la tabla física; la vista con el nombre original
+    la sigue referenciando por nombre. Si se pasa `timings`, se registra en
+    él la etapa "agregados".
+    """
+    storage = TABLES[table_name].storage
+    staging = storage + STAGING_SUFFIX
+    cursor = conn.cursor()
+
+    cursor.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL",
+        (storage,)
+    )
+    for name, sql in cursor.fetchall():
+        definition = sql[sql.index(" ON "):]
+        definition = re.sub(rf'^ ON\s+"?{storage}"?', f' ON {staging}', definition)
+        cursor.execute(f'CREATE INDEX {alternate_index_name(name)}{definition}')
+    conn.commit()
+
+    # Evita que RENAME valide vistas que referencian la tabla eliminada
+    cursor.execute('PRAGMA legacy_alter_table = ON')
+    try:
+        cursor.execute('BEGIN IMMEDIATE')
+        cursor.execute(f'DROP TABLE {storage}')
+        cursor.execute(f'ALTER TABLE {staging} RENAME TO {storage}')
+        start = time.perf_counter()
+        build_rollups(cursor, table_name)
+        if timings is not None and table_name in ROLLUPS:
+            timings["agregados"] = time.perf_counter() - start
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.execute('PRAGMA legacy_alter_table = OFF')
+    print(f"🔁 Tabla {table_name} reemplazada")
+
+
+@contextmanager
+def bulk_load(tables, drop_indexes=False):
+    """Modo de carga masiva para el importador.
+
+    Mientras está activo, las conexiones nuevas usan BULK_LOAD_PRAGMAS (sin
+    fsync). Con drop_indexes=True se eliminan los índices secundarios de
+    las tablas antes de la carga y se reconstruyen al final.
+    Al salir se ejecuta ANALYZE y las conexiones vuelven a la configuración
+    segura. Una caída durante la carga puede dañar la BD; como sus datos se
+    derivan de los Excel, basta con volver a importar.
+    """
+    global _bulk_load_active
+    storages = [TABLES[table].storage for table in tables]
+    dropped = []
+    if drop_indexes:
+        with get_db() as conn:
+            cursor = conn.cursor()
+            for table in storages:
+                cursor.execute(
+                    "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL",
+                    (table,)
+                )
+                for name, sql in cursor.fetchall():
+                    cursor.execute(f'DROP INDEX {name}')
+                    dropped.append(sql)
+            conn.commit()
+        print(f"🧹 Carga masiva: {len(dropped)} índices eliminados temporalmente")
+
+    _bulk_load_active = True
+    try:
+        yield
+    finally:
+        _bulk_load_active = False
+        with get_db() as conn:
+            cursor = conn.cursor()
+            for sql in dropped:
+                cursor.execute(sql)
+            for table in storages:
+                cursor.execute(f'ANALYZE {table}')
+            conn.commit()
+        print(f"📈 Carga masiva finalizada: {len(dropped)} índices reconstruidos, estadísticas actualizadas")
+
+
+@contextmanager
+def import_lock():
+    """Cerrojo exclusivo entre procesos durante toda una importación.
+
+    El CLI, los trabajos de carga de la API y el vigilante escriben en la
+    misma BD con los mismos nombres de staging (<tabla>_staging, índices
+    __b), y una importación delta lee las huellas existentes antes de
+    aplicar los cambios. Con el cerrojo (flock sobre IMPORT_LOCK_PATH) las
+    importaciones se ejecutan de a una; quien llega segundo espera a que
+    termine la primera. No es reentrante: se toma una sola vez, en el nivel
+    más externo de cada importación.
+    """
+    if fcntl is None:
+        yield
+        return
+    with open(IMPORT_LOCK_PATH, "a") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            print("⏳ Otra importación en curso; esperando a que termine...")
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def build_rollups(cursor, table_name: str):
+    """Recalcular los agregados de una tabla (dentro de la transacción en curso)"""
+    rollup = ROLLUPS.get(table_name)
+    if rollup is None:
+        return
+    cursor.execute(f'DELETE FROM {rollup_table_name(table_name)}')
+    for sql in rollup_insert_sql(rollup):
+        cursor.execute(sql)
+
+
+def encode_columns(conn, table_name: str, columns: dict) -> dict:
+    """Columnas convertidas -> columnas físicas: las de diccionario pasan a claves enteras.
+
+    Los valores nuevos se agregan a su dimensión dentro de la transacción
+    en curso (la confirma quien llama).
+    """
+    encoded = dict(columns)
+    cursor = conn.cursor()
+    for column in TABLES[table_name].columns:
+        if not column.dictionary or column.name not in columns:
+            continue
+        dimension = dimension_table_name(column.dictionary)
+        # Igual que en una columna TEXT, los números se guardan como texto
+        values = [value if value is None or isinstance(value, str) else str(value)
+                  for value in encoded.pop(column.name)]
+        cursor.executemany(f'INSERT OR IGNORE INTO {dimension} (valor) VALUES (?)',
+                           [(value,) for value in set(values) if value is not None])
+        keys = dict(cursor.execute(f'SELECT valor, id FROM {dimension}').fetchall())
+        encoded[column.storage] = [None if value is None else keys[value] for value in values]
+    return encoded
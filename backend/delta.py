@@ -0,0 +1,159 @@
+"""
+Importación incremental (delta)
+
+Cada fila importada guarda una huella de su contenido (row_hash). En una
+importación delta se comparan las huellas nuevas con las de la tabla:
+- misma huella: la fila no cambió y no se toca
+- huella nueva con la misma clave natural que una fila existente: UPDATE
+- huella nueva sin pareja: INSERT
+- filas existentes que no aparecen en los datos nuevos: DELETE
+"""
+import time
+
+import pandas as pd
+
+from .database import build_rollups, encode_columns
+from .schema import ROLLUPS, TABLES, insert_columns, insert_sql, storage_column, update_sql
+
+# Clave natural de cada tabla (permite detectar filas modificadas)
+NATURAL_KEYS = {name: table.natural_key for name, table in TABLES.items()}
+
+
+# Tipos de columna que se comparan como número (5 y 5.0 generan la misma huella)
+NUMERIC_KINDS = {"integer", "floating", "mixed-integer-float", "boolean", "empty"}
+
+
+def _canonical(value):
+    """Normalizar valores para que 5 y 5.0 generen la misma huella"""
+    if type(value) is float and value.is_integer():
+        return int(value)
+    return value
+
+
+def _hashable_column(values):
+    """Columna convertida (lista) como serie que hash_pandas_object compara por contenido"""
+    series = pd.Series(values, dtype=object)
+    kind = pd.api.types.infer_dtype(series, skipna=True)
+    if kind in NUMERIC_KINDS:
+        return series.astype(float)
+    if kind != "string":
+        series = series.map(_canonical)
+    # Nulos con un marcador propio para no confundirlos con el texto "None"
+    return series.where(series.notna(), "\x00")
+
+
+def row_hashes(columns):
+    """Huella de contenido por fila (entero de 64 bits con signo), vectorizada con pandas"""
+    if not columns or not len(next(iter(columns.values()))):
+        return []
+    frame = pd.DataFrame({name: _hashable_column(values) for name, values in columns.items()})
+    return pd.util.hash_pandas_object(frame, index=False).to_numpy().view("int64").tolist()
+
+
+class DeltaImport:
+    """Aplicar a una tabla solo las diferencias con los datos nuevos.
+
+    Uso: feed() con cada bloque de columnas convertidas (incluyendo row_hash)
+    y finish() al terminar la hoja. Los bloques se guardan en una tabla
+    temporal de SQLite y la comparación con la tabla en vivo se hace en SQL
+    al final, así que la memoria no depende del tamaño de la hoja (también
+    con --streaming --delta). Los cambios se aplican en una sola transacción,
+    junto con el recálculo de los agregados. Las filas se comparan con sus
+    columnas físicas (claves de diccionario en lugar de textos); la huella se
+    calcula antes, sobre los valores.
+    """
+
+    # Tablas temporales de la comparación (propias de la conexión)
+    TEMP_TABLES = ("delta_entrada", "delta_iguales", "delta_sobrantes", "delta_pares")
+
+    def __init__(self, conn, table):
+        self.conn = conn
+        self.table = table
+        self.storage = TABLES[table].storage
+        self.natural_key = [storage_column(TABLES[table], column) for column in NATURAL_KEYS[table]]
+        self.counts = {"insertados": 0, "actualizados": 0, "eliminados": 0, "sin_cambios": 0}
+        self.db_cols = insert_columns(TABLES[table])
+
+        # Filas nuevas, con los mismos tipos que la tabla física (misma afinidad al comparar)
+        types = dict(conn.execute("SELECT name, type FROM pragma_table_info(?)", (self.storage,)).fetchall())
+        definitions = ", ".join(f"{col} {types.get(col, '')}".strip() for col in self.db_cols)
+        self._drop_temp_tables()
+        conn.execute(f"CREATE TEMP TABLE delta_entrada (seq INTEGER PRIMARY KEY, {definitions})")
+        self.insert_incoming = (f"INSERT INTO delta_entrada ({', '.join(self.db_cols)}) "
+                                f"VALUES ({', '.join('?' for _ in self.db_cols)})")
+
+    def _drop_temp_tables(self):
+        """Eliminar las tablas temporales de una comparación anterior en la conexión"""
+        for name in self.TEMP_TABLES:
+            self.conn.execute(f"DROP TABLE IF EXISTS temp.{name}")
+
+    def feed(self, columns):
+        """Guardar un bloque de filas nuevas en la tabla temporal"""
+        columns = encode_columns(self.conn, self.table, columns)
+        self.conn.executemany(self.insert_incoming, zip(*(columns[col] for col in self.db_cols)))
+
+    def finish(self, timings=None):
+        """Aplicar inserciones, actualizaciones y eliminaciones; retorna los conteos.
+
+        Si hubo cambios, los agregados de la tabla se recalculan en la misma
+        transacción (las consultas no ven filas nuevas con agregados viejos);
+        con `timings` se registra en él la etapa "agregados".
+        """
+        keys = ", ".join(self.natural_key)
+        cursor = self.conn.cursor()
+
+        # Filas sin cambios: misma huella (las repetidas se emparejan una a una)
+        cursor.execute(
+            "CREATE TEMP TABLE delta_iguales AS SELECT e.seq, x.id FROM "
+            "(SELECT seq, row_hash, ROW_NUMBER() OVER (PARTITION BY row_hash ORDER BY seq) AS n "
+            " FROM delta_entrada) AS e "
+            "JOIN (SELECT id, row_hash, ROW_NUMBER() OVER (PARTITION BY row_hash ORDER BY id) AS n "
+            f"     FROM {self.storage}) AS x "
+            "ON x.row_hash = e.row_hash AND x.n = e.n"
+        )
+        # Filas sin pareja de ambos lados (origen 0: nuevas, 1: existentes), agrupadas por
+        # clave natural; en ORDER BY y PARTITION BY los NULL de la clave son iguales entre sí
+        cursor.execute(
+            "CREATE TEMP TABLE delta_sobrantes AS "
+            f"SELECT origen, ref, DENSE_RANK() OVER (ORDER BY {keys}) AS grupo, "
+            f"ROW_NUMBER() OVER (PARTITION BY {keys}, origen ORDER BY ref) AS n FROM ("
+            f" SELECT 0 AS origen, seq AS ref, {keys} FROM delta_entrada "
+            "  WHERE seq NOT IN (SELECT seq FROM delta_iguales)"
+            " UNION ALL "
+            f" SELECT 1, id, {keys} FROM {self.storage} WHERE id NOT IN (SELECT id FROM delta_iguales))"
+        )
+        # Fila nueva y existente con la misma clave natural: UPDATE
+        cursor.execute(
+            "CREATE TEMP TABLE delta_pares AS SELECT e.ref AS seq, x.ref AS id "
+            "FROM delta_sobrantes AS e JOIN delta_sobrantes AS x "
+            "ON x.origen = 1 AND x.grupo = e.grupo AND x.n = e.n WHERE e.origen = 0"
+        )
+
+        # Las filas se leen de las tablas temporales a medida que se escriben
+        values = ", ".join(f"e.{col}" for col in self.db_cols)
+        writer = self.conn.cursor()
+        writer.executemany(insert_sql(TABLES[self.table]), map(tuple, cursor.execute(
+            f"SELECT {values} FROM delta_entrada AS e "
+            "WHERE e.seq IN (SELECT ref FROM delta_sobrantes WHERE origen = 0) "
+            "AND e.seq NOT IN (SELECT seq FROM delta_pares) ORDER BY e.seq"
+        )))
+        self.counts["insertados"] = max(writer.rowcount, 0)
+        writer.executemany(update_sql(TABLES[self.table]), map(tuple, cursor.execute(
+            f"SELECT {values}, p.id FROM delta_pares AS p JOIN delta_entrada AS e ON e.seq = p.seq ORDER BY p.id"
+        )))
+        self.counts["actualizados"] = max(writer.rowcount, 0)
+        writer.execute(
+            f"DELETE FROM {self.storage} WHERE id IN (SELECT ref FROM delta_sobrantes WHERE origen = 1) "
+            "AND id NOT IN (SELECT id FROM delta_pares)"
+        )
+        self.counts["eliminados"] = max(writer.rowcount, 0)
+        self.counts["sin_cambios"] = cursor.execute("SELECT COUNT(*) FROM delta_iguales").fetchone()[0]
+
+        if self.counts["insertados"] or self.counts["actualizados"] or self.counts["eliminados"]:
+            start = time.perf_counter()
+            build_rollups(writer, self.table)
+            if timings is not None and self.table in ROLLUPS:
+                timings["agregados"] = time.perf_counter() - start
+        self.conn.commit()
+        self._drop_temp_tables()
+        return self.counts
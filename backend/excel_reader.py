@@ -0,0 +1,55 @@
+"""
+Lectura por bloques de libros de Excel (modo streaming)
+
+Usa openpyxl en modo solo lectura para recorrer las filas sin cargar la
+hoja completa en memoria. Solo se conservan las columnas mapeadas.
+"""
+from contextlib import contextmanager
+
+import pandas as pd
+from openpyxl import load_workbook
+
+
+@contextmanager
+def open_workbook(path):
+    """Abrir un libro en modo solo lectura (una sola vez para todas sus hojas)"""
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        yield workbook
+    finally:
+        workbook.close()
+
+
+def iter_sheet_chunks(workbook, sheet_name, column_mapping, chunk_size):
+    """Recorrer una hoja y entregar DataFrames de hasta chunk_size filas.
+
+    La primera fila se toma como encabezado; solo se leen las columnas
+    presentes en column_mapping (si un encabezado se repite, se usa el
+    primero, igual que pd.read_excel). Las filas completamente vacías se
+    omiten. El índice de cada DataFrame es el número de fila en el Excel.
+    """
+    rows = workbook[sheet_name].iter_rows(values_only=True)
+    header = next(rows, None)
+    if header is None:
+        return
+
+    positions = {}
+    for idx, name in enumerate(header):
+        if name in column_mapping and name not in positions:
+            positions[name] = idx
+    names = list(positions)
+    indexes = list(positions.values())
+
+    chunk, numbers = [], []
+    for number, row in enumerate(rows, start=2):
+        values = [row[i] if i < len(row) else None for i in indexes]
+        if all(v is None for v in values):
+            continue
+        chunk.append(values)
+        numbers.append(number)
+        if len(chunk) >= chunk_size:
+            yield pd.DataFrame(chunk, columns=names, index=numbers, dtype=object)
+            chunk, numbers = [], []
+
+    if chunk:
+        yield pd.DataFrame(chunk, columns=names, index=numbers, dtype=object)
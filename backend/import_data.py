@@ -1,211 +1,562 @@
 """
 Script para importar datos de Excel a la base de datos SQLite
 """
+import argparse
+import json
 import pandas as pd
+import re
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import nullcontext
+from datetime import date, datetime, timedelta
+from itertools import islice
 from pathlib import Path
 
 # Agregar el directorio padre al path
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
-from backend.config import EXCEL_FILES, DB_PATH
-from backend.database import init_db, clear_table, get_db
+from backend.config import EXCEL_FILES, DB_PATH, STREAM_CHUNK_SIZE, IMPORT_WORKERS
+from backend.database import (init_db, get_db, create_staging_table, swap_staging_table, bulk_load,
+                              encode_columns, import_lock)
+from backend.excel_reader import open_workbook, iter_sheet_chunks
+from backend.delta import DeltaImport, row_hashes
+from backend import analytics, sheet_cache, import_runs
+from backend.progress import notify
+from backend.schema import TABLES, column_mapping, insert_columns as schema_columns, insert_sql
 
-def fix_encoding(text):
-    """Corregir caracteres mal codificados"""
-    if not isinstance(text, str):
-        return text
-    
-    replacements = [
-        ("Ã¡", "á"), ("Ã©", "é"), ("Ã­", "í"), ("Ã³", "ó"), ("Ãº", "ú"),
-        ("Ã±", "ñ"), ("Ã¼", "ü"), ("Ã\x81", "Á"), ("Ã‰", "É"),
-        ("Ã\x91", "Ñ"), ("Ãš", "Ú"), ("Ãœ", "Ü"),
-        ("Âª", "ª"), ("Âº", "º"), ("Â°", "°")
-    ]
-    
-    result = text
-    for bad, good in replacements:
-        result = result.replace(bad, good)
-    return result
+# Caracteres mal codificados (UTF-8 leído como Latin-1) y su corrección
+ENCODING_FIXES = {
+    "Ã¡": "á", "Ã©": "é", "Ã­": "í", "Ã³": "ó", "Ãº": "ú",
+    "Ã±": "ñ", "Ã¼": "ü", "Ã\x81": "Á", "Ã‰": "É",
+    "Ã\x91": "Ñ", "Ãš": "Ú", "Ãœ": "Ü",
+    "Âª": "ª", "Âº": "º", "Â°": "°"
+}
+ENCODING_PATTERN = re.compile("|".join(re.escape(bad) for bad in ENCODING_FIXES))
+
+# Tipos numéricos que no necesitan conversión de fechas/horas
+NUMERIC_KINDS = {"integer", "floating", "mixed-integer-float", "decimal", "boolean"}
+
+# Formatos aceptados en las celdas de fecha escritas como texto (sin la hora),
+# en orden: ISO primero, después día/mes/año como se escriben en Colombia
+DATE_FORMATS = ["%Y-%m-%d", "%Y/%m/%d", "%d/%m/%Y", "%d-%m-%Y", "%d.%m.%Y"]
+
+# Números de serie de Excel: días desde el 30/12/1899 (hasta el 31/12/9999)
+EXCEL_EPOCH = datetime(1899, 12, 30)
+EXCEL_MAX_SERIAL = 2958465
+
+# Opciones de pd.read_excel en el modo clásico (también forman parte de la
+# clave de la caché de hojas)
+READ_EXCEL_OPTIONS = {"header": 0}
+
+# Filas con valores rechazados que se detallan por tabla en el reporte de
+# validación (los conteos por columna siempre son completos)
+MAX_INVALID_ROWS = 100
+
+# ========== CONVERSIÓN DE COLUMNAS EXCEL -> BD ==========
+# Las columnas de cada hoja se declaran en schema.py; aquí se compila, por
+# columna, la secuencia de pasos que la convierte. Cada paso trabaja sobre la
+# columna completa (vectorizado), sin decisiones celda por celda.
+
+def repair_encoding(text):
+    """Paso de textos: corregir caracteres mal codificados"""
+    broken = text.str.contains("Ã|Â", regex=True)
+    if broken.any():
+        text[broken] = text[broken].str.replace(
+            ENCODING_PATTERN, lambda m: ENCODING_FIXES[m.group(0)], regex=True
+        )
+    return text
+
+
+def parse_money(text):
+    """Paso de textos: montos con formato ("$ 1,234.5") a número"""
+    cleaned = text.str.replace(r"[,$ ]", "", regex=True).str.strip()
+    return pd.to_numeric(cleaned, errors="coerce").astype(float)
+
+
+def parse_date(text):
+    """Paso de textos de fecha: DATE_FORMATS (con o sin hora) a YYYY-MM-DD; lo ilegible queda NULL"""
+    parsed = pd.Series(None, index=text.index, dtype=object)
+    present = text.dropna()
+    if present.empty:
+        return parsed
+    day = present.str.strip().str.split(r"[ T]", n=1, regex=True).str[0].reindex(text.index)
+    for date_format in DATE_FORMATS:
+        pending = parsed.isna() & day.notna()
+        if not pending.any():
+            break
+        dates = pd.to_datetime(day[pending], format=date_format, errors="coerce")
+        dates = dates[dates.notna()]
+        parsed[dates.index] = dates.dt.strftime("%Y-%m-%d")
+    return parsed
+
+
+def _serial_or_date(value):
+    """Fecha (o fecha/hora) o número de serie de Excel a YYYY-MM-DD; otro valor -> None"""
+    if isinstance(value, (datetime, date)):
+        return value.strftime("%Y-%m-%d")
+    if isinstance(value, (int, float)) and not isinstance(value, bool) and 0 < value <= EXCEL_MAX_SERIAL:
+        return (EXCEL_EPOCH + timedelta(days=int(value))).strftime("%Y-%m-%d")
+    return None
+
+
+def format_date(series, values):
+    """Valores no textuales de columnas de fecha a YYYY-MM-DD (las horas sueltas quedan NULL)"""
+    if pd.api.types.is_datetime64_any_dtype(series.dtype):
+        return series.dt.strftime("%Y-%m-%d")
+    return values.map(_serial_or_date)
+
+
+def format_temporal(series, values):
+    """Valores no textuales de otras columnas: fechas/horas a texto"""
+    return values.map(lambda v: str(v) if hasattr(v, "isoformat") else v)
+
+
+def convert_series(series, text_steps, other_step, null_values=(), convert_numbers=False):
+    """Convertir una columna completa a valores listos para SQLite.
+
+    - Nulos (NaN/NaT) -> None
+    - Textos: null_values -> None; al resto se aplican text_steps en orden
+    - Valores no textuales (fechas, horas): other_step; los números solo
+      con convert_numbers (p. ej. números de serie en columnas de fecha)
+
+    Retorna (valores, rechazados): rechazados es la serie con los valores
+    originales que un paso no pudo convertir (p. ej. montos o fechas
+    ilegibles) y quedaron como NULL, indexada como `series`.
+    """
+    values = series.astype(object)
+    present = values.notna()
+    kind = pd.api.types.infer_dtype(values, skipna=True)
+    if kind == "empty":
+        return [None] * len(values), series[:0]
+
+    if kind == "string":
+        is_text = present
+    elif kind in NUMERIC_KINDS:
+        is_text = pd.Series(False, index=values.index)
+    else:
+        is_text = values.map(type).eq(str)
+
+    failed = pd.Series(False, index=values.index)
+    if is_text.any():
+        text = values[is_text].astype(str)
+        if null_values:
+            text = text.mask(text.isin(null_values))
+        expected_nulls = text.isna()
+        for step in text_steps:
+            text = step(text)
+        failed[is_text] = text.isna() & ~expected_nulls
+        values[is_text] = text.astype(object)
+
+    other = present & ~is_text
+    if (convert_numbers or kind not in NUMERIC_KINDS) and other.any():
+        converted = other_step(series[other], values[other])
+        failed[other] = converted.isna()
+        values[other] = converted
+
+    return values.where(values.notna(), None).tolist(), series[failed]
+
+
+def compile_column(column, null_values=()):
+    """Conversión de una columna del registro: función serie -> (lista, rechazados)"""
+    text_steps = [repair_encoding]
+    if column.converter == "monto":
+        text_steps.append(parse_money)
+    if column.converter == "fecha":
+        text_steps.append(parse_date)
+    other_step = format_date if column.converter == "fecha" else format_temporal
+    convert_numbers = column.converter == "fecha"
+
+    def convert(series):
+        return convert_series(series, text_steps, other_step, null_values, convert_numbers)
+    return convert
+
+
+# Conversiones compiladas por tabla: [(encabezado Excel, columna BD, conversión)]
+PIPELINES = {
+    name: [(column.source, column.name, compile_column(column, table.null_values)) for column in table.columns]
+    for name, table in TABLES.items()
+}
+
+
+def convert_columns(df, table, rejected=None, invalid=None):
+    """Convertir las columnas de Excel de una tabla en listas por columna de la BD.
+
+    Si se pasa `rejected`, se suman en él los valores rechazados por columna;
+    si se pasa `invalid`, se agregan a esa lista las filas rechazadas
+    ({"fila", "columna", "valor"}, hasta MAX_INVALID_ROWS). El índice de
+    `df` es el número de fila en el Excel.
+    """
+    columns = {}
+    for excel_col, db_col, convert in PIPELINES[table]:
+        if excel_col not in df.columns:
+            columns[db_col] = [None] * len(df)
+            continue
+        columns[db_col], failed = convert(df[excel_col])
+        if len(failed) and rejected is not None:
+            rejected[db_col] = rejected.get(db_col, 0) + len(failed)
+        if invalid is not None:
+            for row, value in failed[:max(0, MAX_INVALID_ROWS - len(invalid))].items():
+                invalid.append({"fila": int(row), "columna": db_col, "valor": str(value)})
+    return columns
+
+
+def workbook_sheets(key):
+    """Hojas configuradas de un libro de EXCEL_FILES como {tabla: hoja}"""
+    config = EXCEL_FILES[key]
+    if "sheets" in config:
+        return dict(config["sheets"])
+    return {key: config["sheet"]}
+
+
+def insert_columns(conn, table, columns, into=None, batch_size=1000):
+    """Insertar en la tabla (o en `into`, p. ej. su staging) a partir de listas por columna, por lotes.
+
+    Generador: entrega el acumulado de registros insertados tras cada lote.
+    Las columnas con diccionario se guardan como claves (ver encode_columns).
+    No confirma la transacción; eso queda a cargo de quien llama.
+    """
+    schema = TABLES[table]
+    columns = encode_columns(conn, table, columns)
+    query = insert_sql(schema, into)
+    rows = zip(*(columns[col] for col in schema_columns(schema)))
+    inserted = 0
+
+    cursor = conn.cursor()
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            break
+        cursor.executemany(query, batch)
+        inserted += len(batch)
+        yield inserted
+
+
+def print_delta(counts, indent="   "):
+    """Mostrar el resultado de una importación delta"""
+    print(f"{indent}🔄 Delta: {counts['insertados']} insertados, {counts['actualizados']} actualizados, "
+          f"{counts['eliminados']} eliminados, {counts['sin_cambios']} sin cambios")
+
+
+def print_rejected(rejected, indent="   ", invalid=None):
+    """Mostrar los valores que no se pudieron convertir (quedaron como NULL) y las primeras filas"""
+    if rejected:
+        detail = ", ".join(f"{column}: {count}" for column, count in rejected.items())
+        print(f"{indent}⚠️ Valores rechazados -> {detail}")
+    for entry in (invalid or [])[:5]:
+        print(f"{indent}   Fila {entry['fila']}, {entry['columna']}: {entry['valor']!r}")
+    if invalid and len(invalid) > 5:
+        print(f"{indent}   ... detalle en el reporte de la corrida (import_runs)")
+
+
+def prepare_columns(table, df, rejected=None, invalid=None):
+    """Convertir una hoja leída a listas por columna, con su huella por fila"""
+    columns = convert_columns(df, table, rejected, invalid)
+    columns["row_hash"] = row_hashes(columns)
+    return columns
+
+
+def write_columns(table, columns, delta=False, indent="   ", timings=None):
+    """Escribir columnas ya convertidas en la tabla.
+
+    La carga completa se hace sobre una tabla staging que luego reemplaza a
+    la tabla en vivo. Con delta=True solo se aplican las diferencias. Los
+    agregados de la tabla (ver rollups.py) se recalculan en la misma
+    transacción que el cambio de tabla o las diferencias.
+    Si se pasa `timings`, se registran en él las etapas "insercion",
+    "indices" y "agregados".
+    Retorna (filas insertadas, conteos del delta o None en carga completa).
+    """
+    timings = {} if timings is None else timings
+    total = len(columns["row_hash"])
+    inserted = 0
+    start = time.perf_counter()
+    with get_db() as conn:
+        if delta:
+            changes = DeltaImport(conn, table)
+            changes.feed(columns)
+            counts = changes.finish(timings)
+            print_delta(counts, indent)
+            notify("insertados", table, registros=counts["insertados"])
+            timings["insercion"] = time.perf_counter() - start - timings.get("agregados", 0)
+            return counts["insertados"], counts
+        else:
+            staging = create_staging_table(conn, table)
+            for inserted in insert_columns(conn, table, columns, into=staging):
+                print(f"{indent}Insertados {inserted}/{total}...")
+                notify("insertados", table, registros=inserted)
+            conn.commit()
+            timings["insercion"] = time.perf_counter() - start
+
+            # Índices sobre la staging y cambio de tabla
+            start = time.perf_counter()
+            swap_staging_table(conn, table, timings)
+            timings["indices"] = time.perf_counter() - start - timings.get("agregados", 0)
+    return inserted, None
+
+
+def format_timings(timings):
+    """Texto con los tiempos por etapa de una hoja"""
+    labels = {"cache": "Caché", "lectura": "Lectura", "conversion": "Conversión",
+              "insercion": "Inserción", "indices": "Índices", "agregados": "Agregados"}
+    return "⏱️ " + " | ".join(f"{label} {timings[stage]:.2f}s"
+                             for stage, label in labels.items() if stage in timings)
+
+
+def sheet_cache_key(table, path, sheet_name):
+    """Clave de la hoja en la caché (ver sheet_cache.cache_key)"""
+    return sheet_cache.cache_key(table, path, sheet_name, TABLES[table], READ_EXCEL_OPTIONS)
+
+
+def read_sheet_columns(table, path, sheet_name, use_cache=True, key=None):
+    """Leer y convertir una hoja, usando la caché si el libro no cambió.
+
+    Retorna (columnas, tiempos por etapa, rechazados por columna, filas
+    rechazadas). También se ejecuta en los procesos trabajadores del modo
+    paralelo, que reciben la clave de caché (`key`) ya calculada.
+    """
+    timings = {}
+    start = time.perf_counter()
+    if not use_cache:
+        key = None
+    elif key is None:
+        key = sheet_cache_key(table, path, sheet_name)
+    cached = sheet_cache.load(key) if key else None
+    if cached is not None:
+        timings["cache"] = time.perf_counter() - start
+        columns, rejected, invalid = cached
+        return columns, timings, rejected, invalid
+
+    start = time.perf_counter()
+    df = pd.read_excel(path, sheet_name=sheet_name, **READ_EXCEL_OPTIONS)
+    # Índice = fila del Excel (la 1 es el encabezado)
+    df.index += 2
+    timings["lectura"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    rejected, invalid = {}, []
+    columns = prepare_columns(table, df, rejected, invalid)
+    timings["conversion"] = time.perf_counter() - start
+
+    if key:
+        sheet_cache.save(key, columns, rejected, invalid)
+    return columns, timings, rejected, invalid
 
-def import_costos_mensuales():
+
+def import_table(table, path, sheet_name, delta=False, use_cache=True, indent="   "):
+    """Leer (o tomar de caché), convertir y escribir una hoja"""
+    columns, timings, rejected, invalid = read_sheet_columns(table, path, sheet_name, use_cache)
+    origin = " (caché)" if "cache" in timings else ""
+    print(f"{indent}Registros encontrados: {len(columns['row_hash'])}{origin}")
+    print_rejected(rejected, indent, invalid)
+    notify("leida", table, registros=len(columns["row_hash"]), tiempos=dict(timings))
+
+    inserted, changes = write_columns(table, columns, delta, indent, timings)
+
+    print(f"{indent}{format_timings(timings)}")
+    notify("completada", table, registros=inserted, tiempos=timings, rechazados=rejected, invalidos=invalid,
+           cambios=changes)
+    return inserted
+
+
+def import_parallel(workers, delta=False, use_cache=True, keys=None):
+    """Leer y convertir las hojas en procesos paralelos.
+
+    Excel se procesa en `workers` procesos; las columnas convertidas vuelven
+    al proceso principal, que es el único que escribe en la BD.
+    """
+    tasks = {
+        table: (EXCEL_FILES[key]["path"], sheet_name)
+        for key in (keys or EXCEL_FILES)
+        for table, sheet_name in workbook_sheets(key).items()
+    }
+    print(f"⚙️ Procesando {len(tasks)} hojas con {workers} procesos...")
+
+    total = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Las claves de caché se calculan aquí: cada libro se lee para su hash una sola vez
+        futures = {
+            pool.submit(read_sheet_columns, table, *task, use_cache,
+                        sheet_cache_key(table, *task) if use_cache else None): table
+            for table, task in tasks.items()
+        }
+        for future in as_completed(futures):
+            table = futures[future]
+            try:
+                columns, timings, rejected, invalid = future.result()
+            except Exception as e:
+                print(f"⚠️ Error en {table}: {e}")
+                notify("error", table, error=f"{type(e).__name__}: {e}")
+                continue
+
+            print(f"📋 {table}: {len(columns['row_hash'])} registros leídos")
+            print_rejected(rejected, invalid=invalid)
+            notify("leida", table, registros=len(columns["row_hash"]), tiempos=dict(timings))
+            inserted, changes = write_columns(table, columns, delta, timings=timings)
+
+            total += inserted
+            print(f"   ✅ {table}: {inserted} registros | {format_timings(timings)}")
+            notify("completada", table, registros=inserted, tiempos=timings, rechazados=rejected,
+                   invalidos=invalid, cambios=changes)
+    return total
+
+
+def import_workbook_streaming(key, chunk_size=STREAM_CHUNK_SIZE, delta=False):
+    """Importar todas las hojas de un libro leyendo por bloques de filas.
+
+    El libro se abre una sola vez en modo solo lectura y cada bloque se
+    convierte e inserta antes de leer el siguiente, por lo que la memoria
+    usada depende de chunk_size y no del tamaño del archivo.
+    """
+    path = EXCEL_FILES[key]["path"]
+    print(f"📂 Leyendo {path} por bloques de {chunk_size} filas...")
+
+    total_records = 0
+    with open_workbook(path) as workbook:
+        for table, sheet_name in workbook_sheets(key).items():
+            print(f"   📋 Hoja: {sheet_name}...")
+            read = 0
+            counts = None
+            timings = dict.fromkeys(["lectura", "conversion", "insercion"], 0.0)
+            rejected, invalid = {}, []
+            with get_db() as conn:
+                changes = DeltaImport(conn, table) if delta else None
+                staging = None if delta else create_staging_table(conn, table)
+                chunks = iter_sheet_chunks(workbook, sheet_name, column_mapping(TABLES[table]), chunk_size)
+                while True:
+                    start = time.perf_counter()
+                    chunk = next(chunks, None)
+                    timings["lectura"] += time.perf_counter() - start
+                    if chunk is None:
+                        break
+
+                    start = time.perf_counter()
+                    columns = prepare_columns(table, chunk, rejected, invalid)
+                    timings["conversion"] += time.perf_counter() - start
+
+                    start = time.perf_counter()
+                    if changes:
+                        changes.feed(columns)
+                    else:
+                        for _ in insert_columns(conn, table, columns, into=staging):
+                            pass
+                        conn.commit()
+                    timings["insercion"] += time.perf_counter() - start
+                    read += len(chunk)
+                    print(f"      {'Leídos' if changes else 'Insertados'} {read}...")
+                    notify("leida" if changes else "insertados", table, registros=read)
+
+                start = time.perf_counter()
+                if changes:
+                    counts = changes.finish(timings)
+                    print_delta(counts, "      ")
+                    notify("insertados", table, registros=counts["insertados"])
+                    timings["insercion"] += time.perf_counter() - start - timings.get("agregados", 0)
+                else:
+                    swap_staging_table(conn, table, timings)
+                    timings["indices"] = time.perf_counter() - start - timings.get("agregados", 0)
+
+            inserted = counts["insertados"] if counts else read
+            total_records += inserted
+            print_rejected(rejected, "      ", invalid)
+            print(f"   ✅ {sheet_name}: {inserted} registros | {format_timings(timings)}")
+            notify("completada", table, registros=inserted, tiempos=timings, rechazados=rejected,
+                   invalidos=invalid, cambios=counts)
+
+    return total_records
+
+
+def import_costos_mensuales(delta=False, use_cache=True):
     """Importar datos de Costos Mensuales"""
     config = EXCEL_FILES["costos_mensuales"]
     print(f"📂 Leyendo {config['path']}...")
     
     try:
-        df = pd.read_excel(config["path"], sheet_name=config["sheet"])
-        print(f"   Registros encontrados: {len(df)}")
+        # Convertir por columnas e insertar en BD
+        inserted = import_table("costos_mensuales", config["path"], config["sheet"], delta, use_cache)
         
-        # Limpiar tabla
-        clear_table("costos_mensuales")
-        
-        # Mapear columnas
-        column_mapping = {
-            "Fecha": "fecha",
-            "Catalogo": "catalogo",
-            "Neto": "neto",
-            "Ciudad|Descripción": "ciudad",
-            "Proyecto|Nombre": "proyecto",
-            "Tercero|Nombre": "tercero",
-            "Descripción": "descripcion"
-        }
-        
-        # Preparar datos
-        records = []
-        for _, row in df.iterrows():
-            record = {}
-            for excel_col, db_col in column_mapping.items():
-                value = row.get(excel_col)
-                if pd.isna(value):
-                    value = None
-                elif isinstance(value, str):
-                    value = fix_encoding(value)
-                elif db_col == "fecha" and value is not None:
-                    value = str(value)[:10]  # Formato YYYY-MM-DD
-                record[db_col] = value
-            records.append(record)
-        
-        # Insertar en BD
-        with get_db() as conn:
-            cursor = conn.cursor()
-            for record in records:
-                cursor.execute('''
-                    INSERT INTO costos_mensuales 
-                    (fecha, catalogo, neto, ciudad, proyecto, tercero, descripcion)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    record["fecha"],
-                    record["catalogo"],
-                    record["neto"],
-                    record["ciudad"],
-                    record["proyecto"],
-                    record["tercero"],
-                    record["descripcion"]
-                ))
-            conn.commit()
-        
-        print(f"✅ Costos Mensuales: {len(records)} registros importados")
-        return len(records)
+        print(f"✅ Costos Mensuales: {inserted} registros importados")
+        return inserted
         
     except Exception as e:
         print(f"❌ Error importando Costos Mensuales: {e}")
         raise
 
-def import_operatividad_vehiculos():
+def import_operatividad_vehiculos(delta=False, use_cache=True):
     """Importar datos de Operatividad Vehículos"""
     config = EXCEL_FILES["operatividad_vehiculos"]
     print(f"📂 Leyendo {config['path']}...")
     
     try:
-        df = pd.read_excel(config["path"], sheet_name=config["sheet"])
-        print(f"   Registros encontrados: {len(df)}")
-        
-        # Limpiar tabla
-        clear_table("operatividad_vehiculos")
-        
-        # Mapear columnas
-        column_mapping = {
-            "Fecha ejecucion": "fecha_ejecucion",
-            "placa": "placa",
-            "Tipo vehiculo": "tipo_vehiculo",
-            "Sede": "sede",
-            "Estado Vehiculo": "estado_vehiculo",
-            "Brigada": "brigada",
-            "Conductor": "conductor",
-            "Contrato": "contrato",
-            "GPS": "gps",
-            "justificacion no salida": "justificacion_no_salida",
-            "Tipo de Daño": "tipo_dano",
-            "Daño inoperatividad": "dano_inoperatividad",
-            "Motivo de inoperatividad": "motivo_inoperatividad",
-            "Observacion inoperatividad": "observacion_inoperatividad",
-            "Tipo Mantenimiento": "tipo_mantenimiento",
-            "Km mantenimiento": "km_mantenimiento",
-            "Vehiculos programados": "vehiculos_programados",
-            "Vehiculos operativos": "vehiculos_operativos",
-            "Dias en taller": "dias_en_taller",
-            "Propietario": "propietario",
-            "Indicador": "indicador"
-        }
-        
-        # Preparar datos
-        records = []
-        for _, row in df.iterrows():
-            record = {}
-            for excel_col, db_col in column_mapping.items():
-                value = row.get(excel_col)
-                if pd.isna(value):
-                    value = None
-                elif isinstance(value, str):
-                    value = fix_encoding(value)
-                elif db_col == "fecha_ejecucion" and value is not None:
-                    value = str(value)[:10]  # Formato YYYY-MM-DD
-                record[db_col] = value
-            records.append(record)
+        # Convertir por columnas e insertar en BD
+        inserted = import_table("operatividad_vehiculos", config["path"], config["sheet"], delta, use_cache)
         
-        # Insertar en BD por lotes para mejor rendimiento
-        with get_db() as conn:
-            cursor = conn.cursor()
-            batch_size = 1000
-            for i in range(0, len(records), batch_size):
-                batch = records[i:i+batch_size]
-                cursor.executemany('''
-                    INSERT INTO operatividad_vehiculos 
-                    (fecha_ejecucion, placa, tipo_vehiculo, sede, estado_vehiculo,
-                     brigada, conductor, contrato, gps, justificacion_no_salida,
-                     tipo_dano, dano_inoperatividad, motivo_inoperatividad,
-                     observacion_inoperatividad, tipo_mantenimiento, km_mantenimiento,
-                     vehiculos_programados, vehiculos_operativos, dias_en_taller,
-                     propietario, indicador)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', [
-                    (r["fecha_ejecucion"], r["placa"], r["tipo_vehiculo"], r["sede"],
-                     r["estado_vehiculo"], r["brigada"], r["conductor"], r["contrato"],
-                     r["gps"], r["justificacion_no_salida"], r["tipo_dano"],
-                     r["dano_inoperatividad"], r["motivo_inoperatividad"],
-                     r["observacion_inoperatividad"], r["tipo_mantenimiento"],
-                     r["km_mantenimiento"], r["vehiculos_programados"],
-                     r["vehiculos_operativos"], r["dias_en_taller"],
-                     r["propietario"], r["indicador"])
-                    for r in batch
-                ])
-                conn.commit()
-                print(f"   Insertados {min(i+batch_size, len(records))}/{len(records)}...")
-        
-        print(f"✅ Operatividad Vehículos: {len(records)} registros importados")
-        return len(records)
+        print(f"✅ Operatividad Vehículos: {inserted} registros importados")
+        return inserted
         
     except Exception as e:
         print(f"❌ Error importando Operatividad Vehículos: {e}")
         raise
 
-def main():
+def main(argv=None):
     """Función principal de importación"""
+    parser = argparse.ArgumentParser(description="Importar los libros de Excel a la base de datos")
+    parser.add_argument("--streaming", action="store_true",
+                        help="Leer los libros por bloques de filas (memoria acotada)")
+    parser.add_argument("--chunk-size", type=int, default=STREAM_CHUNK_SIZE,
+                        help=f"Filas por bloque en modo streaming (default {STREAM_CHUNK_SIZE})")
+    parser.add_argument("--delta", action="store_true",
+                        help="Aplicar solo las filas insertadas, modificadas o eliminadas en lugar de recargar todo")
+    parser.add_argument("--workers", type=int, default=IMPORT_WORKERS,
+                        help=f"Procesos para leer las hojas en paralelo (default {IMPORT_WORKERS})")
+    parser.add_argument("--no-cache", dest="use_cache", action="store_false",
+                        help="Leer siempre los Excel, sin usar la caché de hojas convertidas")
+    parser.add_argument("--bulk", action="store_true",
+                        help="Carga masiva: PRAGMAs sin fsync durante la carga, índices reconstruidos y ANALYZE al final")
+    parser.add_argument("--libro", choices=list(EXCEL_FILES),
+                        help="Importar solo este libro de EXCEL_FILES")
+    parser.add_argument("--reporte", type=Path,
+                        help="Guardar en este archivo el reporte JSON de la corrida (también queda en import_runs)")
+    args = parser.parse_args(argv)
+    if args.streaming and args.workers > 1:
+        parser.error("--streaming y --workers > 1 no se pueden combinar")
+
     print("=" * 60)
     print("🚀 IMPORTADOR DE DATOS - LOGÍSTICA HESEGO")
     print("=" * 60)
     
-    # Inicializar BD
-    init_db()
+    # Una importación a la vez sobre la BD (API y vigilante incluidos)
+    with import_lock():
+        # Inicializar BD
+        init_db()
     
-    # Importar datos
-    total = 0
+        # Importar datos
+        total = 0
     
-    try:
-        total += import_costos_mensuales()
-    except Exception as e:
-        print(f"⚠️ Error en Costos Mensuales: {e}")
+        keys = [args.libro] if args.libro else list(EXCEL_FILES)
     
-    try:
-        total += import_operatividad_vehiculos()
-    except Exception as e:
-        print(f"⚠️ Error en Operatividad Vehículos: {e}")
+        # En modo delta se escriben las tablas en vivo: sus índices se quitan
+        # durante la carga. La carga completa usa tablas staging sin índices.
+        tables = [table for key in keys for table in workbook_sheets(key)]
+        loading = bulk_load(tables, drop_indexes=args.delta) if args.bulk else nullcontext()
+        mode = "paralelo" if args.workers > 1 else "streaming" if args.streaming else "clasico"
+        with loading, import_runs.record_run("cli", mode, args.delta) as run:
+            if args.workers > 1:
+                total += import_parallel(args.workers, args.delta, args.use_cache, keys)
+            else:
+                for key in keys:
+                    try:
+                        total += import_workbook(key, args.delta, args.use_cache, args.streaming, args.chunk_size)
+                    except Exception as e:
+                        print(f"⚠️ Error en {key}: {e}")
+                        run.fail(key, e)
     
-    try:
-        total += import_compras()
-    except Exception as e:
-        print(f"⚠️ Error en Compras: {e}")
+        # Instantánea para el motor analítico (solo con ANALYTICS_ENGINE=duckdb)
+        analytics.export_snapshot()
+    
+    if args.reporte:
+        args.reporte.write_text(json.dumps(run.report(), indent=2, ensure_ascii=False))
+        print(f"📊 Reporte: {args.reporte}")
     
     print("=" * 60)
     print(f"✅ IMPORTACIÓN COMPLETADA - Total: {total:,} registros")
@@ -213,7 +564,7 @@ def main():
     print("=" * 60)
 
 
-def import_compras():
+def import_compras(delta=False, use_cache=True):
     """Importar datos de Compras (3 hojas)"""
     config = EXCEL_FILES["compras"]
     print(f"📂 Leyendo {config['path']}...")
@@ -223,266 +574,24 @@ def import_compras():
     try:
         # ========== TRAZA REQ OC ==========
         print("   📋 Hoja: TRAZA REQ OC...")
-        df = pd.read_excel(config["path"], sheet_name=config["sheets"]["traza_req_oc"])
-        print(f"      Registros encontrados: {len(df)}")
-        
-        clear_table("traza_req_oc")
-        
-        column_mapping = {
-            "Requisición|Fecha Entrega": "req_fecha_entrega",
-            "Requisición|Fecha": "req_fecha",
-            "Requisición|Usuario": "req_usuario",
-            "Requisición|Fecha Autorizada": "req_fecha_autorizada",
-            "Requisición|Usuario Autorizador": "req_usuario_autorizador",
-            "Requisición|Emp": "req_emp",
-            "Requisición|Suc": "req_suc",
-            "Requisición| Descripción Tipo Doc": "req_descripcion_tipo_doc",
-            "Requisición|Tipo": "req_tipo",
-            "Requisición|Numero": "req_numero",
-            "Requisición|Estado": "req_estado",
-            "Item|Codigo": "item_codigo",
-            "Item|Descripción": "item_descripcion",
-            "Cotización|Tipo": "cotizacion_tipo",
-            "Cotización|Numero": "cotizacion_numero",
-            "Orden Compra|Fecha": "oc_fecha",
-            "Orden Compra|Usuario ": "oc_usuario",
-            "Orden Compra|Fecha Autorizacion": "oc_fecha_autorizacion",
-            "Orden Compra|Usuario Autorizacion": "oc_usuario_autorizacion",
-            "Orden Compra|Tipo": "oc_tipo",
-            "Orden Compra|Numero": "oc_numero",
-            "Orden Compra|Estado": "oc_estado",
-            "Orden Compra|Tercero|Identificación": "oc_tercero_id",
-            "Orden Compra|Tercero|Suc": "oc_tercero_suc",
-            "Orden Compra|Tercero|Nombre": "oc_tercero_nombre",
-            "Entrega de Servicio|Fecha": "entrega_servicio_fecha",
-            "Entrega de Servicio|Usuario": "entrega_servicio_usuario",
-            "Entrega de Servicio|Tipo": "entrega_servicio_tipo",
-            "Entrega de Servicio|Numero": "entrega_servicio_numero",
-            "Entrega de Almacen|Fecha": "entrega_almacen_fecha",
-            "Entrega de Almacen|Usuario": "entrega_almacen_usuario",
-            "Entrega de Almacen|Tipo": "entrega_almacen_tipo",
-            "Entrega de Almacen|Numero": "entrega_almacen_numero",
-            "Factura de Compra|Fecha": "factura_compra_fecha",
-            "Factura de Compra|Tipo": "factura_compra_tipo",
-            "Factura de Compra|Numero": "factura_compra_numero",
-            "Devolucion de Compra|Fecha": "devolucion_compra_fecha",
-            "Devolucion de Compra|Tipo": "devolucion_compra_tipo",
-            "Devolucion de Compra|Numero": "devolucion_compra_numero",
-            "DÍAS APROBAR RQ": "dias_aprobar_rq",
-            "DÍAS GENERAR OC": "dias_generar_oc",
-            "DÍAS APROBACIÓN OC": "dias_aprobacion_oc",
-            "DÍAS RECEPCIÓN SERVICIO": "dias_recepcion_servicio",
-            "DÍAS ENTRADA ALMACEN": "dias_entrada_almacen",
-            "mes": "mes",
-            "SUMARQ": "suma_rq"
-        }
-        
-        records = []
-        for _, row in df.iterrows():
-            record = {}
-            for excel_col, db_col in column_mapping.items():
-                value = row.get(excel_col)
-                if pd.isna(value):
-                    value = None
-                elif isinstance(value, str):
-                    value = fix_encoding(value)
-                    # Fechas inválidas
-                    if value == "31/12/1899":
-                        value = None
-                elif "fecha" in db_col and value is not None:
-                    value = str(value)[:10]
-                record[db_col] = value
-            records.append(record)
+        inserted = import_table("traza_req_oc", config["path"], config["sheets"]["traza_req_oc"], delta, use_cache, indent="      ")
         
-        with get_db() as conn:
-            cursor = conn.cursor()
-            batch_size = 1000
-            for i in range(0, len(records), batch_size):
-                batch = records[i:i+batch_size]
-                cursor.executemany('''
-                    INSERT INTO traza_req_oc 
-                    (req_fecha_entrega, req_fecha, req_usuario, req_fecha_autorizada, req_usuario_autorizador,
-                     req_emp, req_suc, req_descripcion_tipo_doc, req_tipo, req_numero, req_estado,
-                     item_codigo, item_descripcion, cotizacion_tipo, cotizacion_numero,
-                     oc_fecha, oc_usuario, oc_fecha_autorizacion, oc_usuario_autorizacion,
-                     oc_tipo, oc_numero, oc_estado, oc_tercero_id, oc_tercero_suc, oc_tercero_nombre,
-                     entrega_servicio_fecha, entrega_servicio_usuario, entrega_servicio_tipo, entrega_servicio_numero,
-                     entrega_almacen_fecha, entrega_almacen_usuario, entrega_almacen_tipo, entrega_almacen_numero,
-                     factura_compra_fecha, factura_compra_tipo, factura_compra_numero,
-                     devolucion_compra_fecha, devolucion_compra_tipo, devolucion_compra_numero,
-                     dias_aprobar_rq, dias_generar_oc, dias_aprobacion_oc, dias_recepcion_servicio, dias_entrada_almacen,
-                     mes, suma_rq)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', [tuple(r.values()) for r in batch])
-                conn.commit()
-                print(f"      Insertados {min(i+batch_size, len(records))}/{len(records)}...")
-        
-        total_records += len(records)
-        print(f"   ✅ TRAZA REQ OC: {len(records)} registros")
+        total_records += inserted
+        print(f"   ✅ TRAZA REQ OC: {inserted} registros")
         
         # ========== OC DESCUENTOS ==========
         print("   📋 Hoja: OC DESCUENTOS...")
-        df = pd.read_excel(config["path"], sheet_name=config["sheets"]["oc_descuentos"])
-        print(f"      Registros encontrados: {len(df)}")
-        
-        clear_table("oc_descuentos")
-        
-        column_mapping = {
-            "Fecha|Fecha": "fecha",
-            "Fecha|Fecha Entrega": "fecha_entrega",
-            "Fecha|Dias Entrega": "dias_entrega",
-            "Documento|Emp": "documento_emp",
-            "Documento|Suc": "documento_suc",
-            "Documento|Tipo": "documento_tipo",
-            "Documento|Núm": "documento_num",
-            "Item|Código": "item_codigo",
-            "Item|Descripción": "item_descripcion",
-            "Item|Bodega": "item_bodega",
-            "Item|Cantidad": "item_cantidad",
-            "Talla": "talla",
-            "Item|Unidad": "item_unidad",
-            "Item|Proyecto": "item_proyecto",
-            "Item|Solicitante": "item_solicitante",
-            "Item|Fecha Requ.": "item_fecha_requ",
-            "Tercero|Identificación": "tercero_id",
-            "Tercero|Nombre": "tercero_nombre",
-            "Costo Unitario": "costo_unitario",
-            "Total Item": "total_item",
-            "Tasa Dcto": "tasa_dcto",
-            "Total Dcto": "total_dcto",
-            "Subtotal": "subtotal",
-            "Tasa IVA": "tasa_iva",
-            "Total IVA": "total_iva",
-            "Total": "total",
-            "Estado": "estado",
-            "Moneda": "moneda",
-            "Observaciones": "observaciones",
-            "Proceso": "proceso",
-            "Concatenado": "concatenado",
-            "%Descuento": "porcentaje_descuento"
-        }
+        inserted = import_table("oc_descuentos", config["path"], config["sheets"]["oc_descuentos"], delta, use_cache, indent="      ")
         
-        records = []
-        for _, row in df.iterrows():
-            record = {}
-            for excel_col, db_col in column_mapping.items():
-                value = row.get(excel_col)
-                if pd.isna(value):
-                    value = None
-                elif isinstance(value, str):
-                    value = fix_encoding(value)
-                    # Limpiar valores numéricos con formato
-                    if db_col in ["costo_unitario", "total_item", "total_iva", "total"]:
-                        value = value.replace(",", "").replace("$", "").replace(" ", "").strip()
-                        try:
-                            value = float(value) if value else None
-                        except:
-                            value = None
-                elif "fecha" in db_col and value is not None and not isinstance(value, str):
-                    value = str(value)[:10]
-                # Convertir cualquier tipo datetime/time a string
-                elif hasattr(value, 'isoformat'):
-                    value = str(value)
-                record[db_col] = value
-            records.append(record)
-        
-        with get_db() as conn:
-            cursor = conn.cursor()
-            batch_size = 1000
-            for i in range(0, len(records), batch_size):
-                batch = records[i:i+batch_size]
-                cursor.executemany('''
-                    INSERT INTO oc_descuentos 
-                    (fecha, fecha_entrega, dias_entrega, documento_emp, documento_suc, documento_tipo, documento_num,
-                     item_codigo, item_descripcion, item_bodega, item_cantidad, talla, item_unidad, item_proyecto,
-                     item_solicitante, item_fecha_requ, tercero_id, tercero_nombre, costo_unitario, total_item,
-                     tasa_dcto, total_dcto, subtotal, tasa_iva, total_iva, total, estado, moneda, observaciones,
-                     proceso, concatenado, porcentaje_descuento)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', [tuple(r.values()) for r in batch])
-                conn.commit()
-                print(f"      Insertados {min(i+batch_size, len(records))}/{len(records)}...")
-        
-        total_records += len(records)
-        print(f"   ✅ OC DESCUENTOS: {len(records)} registros")
+        total_records += inserted
+        print(f"   ✅ OC DESCUENTOS: {inserted} registros")
         
         # ========== BASE OC GENERADAS ==========
         print("   📋 Hoja: BASE OC GENERADAS...")
-        df = pd.read_excel(config["path"], sheet_name=config["sheets"]["base_oc_generadas"])
-        print(f"      Registros encontrados: {len(df)}")
+        inserted = import_table("base_oc_generadas", config["path"], config["sheets"]["base_oc_generadas"], delta, use_cache, indent="      ")
         
-        clear_table("base_oc_generadas")
-        
-        column_mapping = {
-            "Fecha|Fecha": "fecha",
-            "Fecha|Fecha Entrega": "fecha_entrega",
-            "Fecha|Dias Entrega": "dias_entrega",
-            "Documento|Emp": "documento_emp",
-            "Documento|Suc": "documento_suc",
-            "Documento|Tipo": "documento_tipo",
-            "Documento|Núm": "documento_num",
-            "Item|Código": "item_codigo",
-            "Item|Descripción": "item_descripcion",
-            "Item|Bodega": "item_bodega",
-            "Item|Cantidad": "item_cantidad",
-            "Talla": "talla",
-            "Item|Unidad": "item_unidad",
-            "Item|Proyecto": "item_proyecto",
-            "Item|Solicitante": "item_solicitante",
-            "Item|Fecha Requ.": "item_fecha_requ",
-            "Tercero|Identificación": "tercero_id",
-            "Tercero|Nombre": "tercero_nombre",
-            "Costo Unitario": "costo_unitario",
-            "Total Item": "total_item",
-            "Tasa Dcto": "tasa_dcto",
-            "Total Dcto": "total_dcto",
-            "Subtotal": "subtotal",
-            "Tasa IVA": "tasa_iva",
-            "Total IVA": "total_iva",
-            "Total": "total",
-            "Estado": "estado",
-            "Moneda": "moneda",
-            "Observaciones": "observaciones"
-        }
-        
-        records = []
-        for _, row in df.iterrows():
-            record = {}
-            for excel_col, db_col in column_mapping.items():
-                value = row.get(excel_col)
-                if pd.isna(value):
-                    value = None
-                elif isinstance(value, str):
-                    value = fix_encoding(value)
-                    if db_col in ["costo_unitario", "total_item", "total_iva", "total", "item_cantidad"]:
-                        value = value.replace(",", "").replace("$", "").replace(" ", "").strip()
-                        try:
-                            value = float(value) if value else None
-                        except:
-                            value = None
-                elif "fecha" in db_col and value is not None and not isinstance(value, str):
-                    value = str(value)[:10]
-                record[db_col] = value
-            records.append(record)
-        
-        with get_db() as conn:
-            cursor = conn.cursor()
-            batch_size = 1000
-            for i in range(0, len(records), batch_size):
-                batch = records[i:i+batch_size]
-                cursor.executemany('''
-                    INSERT INTO base_oc_generadas 
-                    (fecha, fecha_entrega, dias_entrega, documento_emp, documento_suc, documento_tipo, documento_num,
-                     item_codigo, item_descripcion, item_bodega, item_cantidad, talla, item_unidad, item_proyecto,
-                     item_solicitante, item_fecha_requ, tercero_id, tercero_nombre, costo_unitario, total_item,
-                     tasa_dcto, total_dcto, subtotal, tasa_iva, total_iva, total, estado, moneda, observaciones)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', [tuple(r.values()) for r in batch])
-                conn.commit()
-                print(f"      Insertados {min(i+batch_size, len(records))}/{len(records)}...")
-        
-        total_records += len(records)
-        print(f"   ✅ BASE OC GENERADAS: {len(records)} registros")
+        total_records += inserted
+        print(f"   ✅ BASE OC GENERADAS: {inserted} registros")
         
         print(f"✅ Compras Total: {total_records} registros importados")
         return total_records
@@ -494,5 +603,20 @@ def import_compras():
         raise
 
 
+# Importador de cada libro de EXCEL_FILES (modo clásico)
+WORKBOOK_IMPORTERS = {
+    "costos_mensuales": import_costos_mensuales,
+    "operatividad_vehiculos": import_operatividad_vehiculos,
+    "compras": import_compras
+}
+
+
+def import_workbook(key, delta=False, use_cache=True, streaming=False, chunk_size=STREAM_CHUNK_SIZE):
+    """Importar un solo libro de EXCEL_FILES (todas sus hojas)"""
+    if streaming:
+        return import_workbook_streaming(key, chunk_size, delta)
+    return WORKBOOK_IMPORTERS[key](delta, use_cache)
+
+
 if __name__ == "__main__":
     main()
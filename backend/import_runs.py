@@ -0,0 +1,228 @@
+"""
+Registro de corridas de importación (tabla import_runs)
+
+Cada corrida del importador (CLI, API o vigilante) guarda una fila por
+tabla con los registros insertados (y, en importación delta, los
+actualizados y eliminados), el tiempo de cada etapa, los valores
+rechazados por columna (y las primeras filas con su valor original), la
+memoria pico del proceso y el error si lo hubo. Las métricas se toman de
+los eventos de progreso del importador (ver progress.py).
+
+Cada fila guarda también la firma (mtime:tamaño) que tenía el libro al
+empezar la corrida: el vigilante no vuelve a importar un libro cuya firma
+ya se importó (por ejemplo uno subido por la API).
+"""
+import json
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows: sin medición de memoria
+    resource = None
+
+from .config import EXCEL_FILES
+from .database import get_db, get_read_db
+from .progress import progress_listener
+
+# Etapas con columna propia en import_runs
+STAGES = ("cache", "lectura", "conversion", "insercion", "indices", "agregados")
+
+# Libro de EXCEL_FILES al que pertenece cada tabla
+WORKBOOK_OF = {
+    table: key
+    for key, config in EXCEL_FILES.items()
+    for table in (config["sheets"] if "sheets" in config else [key])
+}
+
+
+def file_signature(path):
+    """(mtime, tamaño) del archivo, o None si no existe"""
+    try:
+        stat = Path(path).stat()
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def imported_signature(key):
+    """Firma del libro en su última importación correcta (o None)"""
+    with get_db() as conn:
+        row = conn.execute("SELECT firma FROM import_runs WHERE libro = ? AND estado = 'ok' "
+                           "ORDER BY id DESC LIMIT 1", (key,)).fetchone()
+    if row is None or not row[0]:
+        return None
+    mtime, size = row[0].split(":")
+    return int(mtime), int(size)
+
+
+def peak_memory_mb():
+    """Memoria pico del proceso hasta ahora, en MB (None si no se puede medir)"""
+    if resource is None:
+        return None
+    # ru_maxrss está en KB en Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+class ImportRun:
+    """Métricas por tabla de una corrida de importación"""
+
+    def __init__(self, origin, mode, delta=False):
+        self.run_id = uuid.uuid4().hex
+        self.origin = origin
+        self.mode = mode
+        self.delta = delta
+        self.started = datetime.now().isoformat(timespec="seconds")
+        self.tables = {}
+        # Firma de cada libro al empezar: la del archivo que se lee
+        self.signatures = {key: file_signature(config["path"]) for key, config in EXCEL_FILES.items()}
+
+    def _table(self, table):
+        return self.tables.setdefault(table, {
+            "libro": WORKBOOK_OF.get(table),
+            "estado": "en_curso",
+            "registros": 0,
+            "actualizados": None,
+            "eliminados": None,
+            "tiempos": {},
+            "rechazados": {},
+            "invalidos": [],
+            "memoria_pico_mb": None,
+            "error": None
+        })
+
+    def on_progress(self, event, table, registros=0, tiempos=None, rechazados=None, invalidos=None,
+                    error=None, cambios=None):
+        """Observador de progreso: acumula las métricas de cada tabla"""
+        entry = self._table(table)
+        if event == "completada":
+            entry["estado"] = "ok"
+            entry["registros"] = registros
+            if cambios:
+                entry["actualizados"] = cambios["actualizados"]
+                entry["eliminados"] = cambios["eliminados"]
+            entry["tiempos"] = {stage: round(seconds, 3) for stage, seconds in (tiempos or {}).items()}
+            entry["rechazados"] = dict(rechazados or {})
+            entry["invalidos"] = list(invalidos or [])
+            entry["memoria_pico_mb"] = peak_memory_mb()
+        elif event == "error":
+            entry["estado"] = "error"
+            entry["error"] = error
+
+    def fail(self, key, error):
+        """Marcar con error las tablas de un libro que no terminaron"""
+        for table, workbook in WORKBOOK_OF.items():
+            if workbook == key and self._table(table)["estado"] != "ok":
+                self.tables[table]["estado"] = "error"
+                self.tables[table]["error"] = f"{type(error).__name__}: {error}"
+                self.tables[table]["memoria_pico_mb"] = peak_memory_mb()
+
+    def report(self):
+        """Reporte de la corrida como dict serializable a JSON"""
+        return {
+            "run_id": self.run_id,
+            "origen": self.origin,
+            "modo": self.mode,
+            "delta": self.delta,
+            "inicio": self.started,
+            "tablas": {
+                table: dict(entry, duracion=round(sum(entry["tiempos"].values()), 3))
+                for table, entry in self.tables.items()
+            }
+        }
+
+    def save(self):
+        """Guardar una fila por tabla en import_runs"""
+        rows = []
+        for table, entry in self.report()["tablas"].items():
+            signature = self.signatures.get(entry["libro"])
+            rows.append((
+                self.run_id, self.origin, self.mode, int(self.delta), self.started,
+                entry["libro"], table, entry["estado"], entry["registros"], entry["actualizados"],
+                entry["eliminados"], entry["duracion"], f"{signature[0]}:{signature[1]}" if signature else None,
+                *(entry["tiempos"].get(stage) for stage in STAGES),
+                json.dumps(entry["rechazados"], ensure_ascii=False),
+                json.dumps(entry["invalidos"], ensure_ascii=False), entry["memoria_pico_mb"], entry["error"]
+            ))
+        if not rows:
+            return
+        with get_db() as conn:
+            conn.executemany(f'''
+                INSERT INTO import_runs (
+                    run_id, origen, modo, delta, inicio, libro, tabla, estado, registros, actualizados,
+                    eliminados, duracion, firma,
+                    {", ".join(STAGES)}, rechazados, invalidos, memoria_pico_mb, error
+                ) VALUES ({", ".join("?" for _ in range(len(rows[0])))})
+            ''', rows)
+            conn.commit()
+
+
+@contextmanager
+def record_run(origin, mode="clasico", delta=False, keys=()):
+    """Registrar en import_runs la corrida que se ejecute dentro del bloque.
+
+    Si el bloque falla, las tablas sin terminar (y las de los libros `keys`
+    que no llegaron a empezar) quedan con estado "error". Un fallo al
+    guardar las métricas no interrumpe la importación.
+    """
+    run = ImportRun(origin, mode, delta)
+    try:
+        with progress_listener(run.on_progress):
+            yield run
+    except Exception as e:
+        for key in keys:
+            run.fail(key, e)
+        for entry in run.tables.values():
+            if entry["estado"] == "en_curso":
+                entry["estado"] = "error"
+                entry["error"] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        try:
+            run.save()
+        except Exception as e:
+            print(f"⚠️ No se pudieron guardar las métricas de la importación: {e}")
+
+
+def recent_runs(limit=20, table=None):
+    """Últimas corridas registradas, de la más reciente a la más antigua"""
+    where, params = ("WHERE tabla = ?", [table]) if table else ("", [])
+    with get_read_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT * FROM import_runs
+            WHERE run_id IN (
+                SELECT run_id FROM import_runs {where}
+                GROUP BY run_id ORDER BY MAX(id) DESC LIMIT ?
+            )
+            ORDER BY id DESC
+        ''', params + [limit])
+        rows = cursor.fetchall()
+
+    runs = {}
+    for row in rows:
+        run = runs.setdefault(row["run_id"], {
+            "run_id": row["run_id"],
+            "origen": row["origen"],
+            "modo": row["modo"],
+            "delta": bool(row["delta"]),
+            "inicio": row["inicio"],
+            "tablas": []
+        })
+        run["tablas"].append({
+            "libro": row["libro"],
+            "tabla": row["tabla"],
+            "estado": row["estado"],
+            "registros": row["registros"],
+            "actualizados": row["actualizados"],
+            "eliminados": row["eliminados"],
+            "duracion": row["duracion"],
+            "tiempos": {stage: row[stage] for stage in STAGES if row[stage] is not None},
+            "rechazados": json.loads(row["rechazados"] or "{}"),
+            "invalidos": json.loads(row["invalidos"] or "[]"),
+            "memoria_pico_mb": row["memoria_pico_mb"],
+            "error": row["error"]
+        })
+    return list(runs.values())
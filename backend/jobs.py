@@ -0,0 +1,154 @@
+"""
+Trabajos de importación en segundo plano (lanzados desde la API)
+"""
+import os
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from . import analytics, import_data, import_runs, read_snapshot
+from .config import EXCEL_FILES
+from .database import import_lock, init_db
+from .progress import progress_listener
+
+# Trabajos que se conservan para consultar su estado
+MAX_JOBS = 50
+
+# Un solo hilo: las importaciones se ejecutan de a una (un único escritor en la BD;
+# entre procesos lo asegura database.import_lock)
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="import-job")
+_jobs = OrderedDict()
+_lock = threading.Lock()
+
+
+def _new_job(key, filename, options):
+    """Registro inicial de un trabajo en cola"""
+    return {
+        "id": uuid.uuid4().hex,
+        "libro": key,
+        "archivo": filename,
+        "opciones": options,
+        "estado": "en_cola",
+        "creado": time.time(),
+        "inicio": None,
+        "fin": None,
+        "total_registros": 0,
+        "hojas": {},
+        "run_id": None,
+        "error": None
+    }
+
+
+def _sheet(job, table):
+    """Progreso de una hoja dentro del trabajo"""
+    return job["hojas"].setdefault(table, {"leidos": 0, "insertados": 0, "tiempos": {}, "completada": False})
+
+
+def _on_progress(job, event, table, registros=0, tiempos=None, rechazados=None, invalidos=None,
+                 error=None, cambios=None):
+    """Actualizar el trabajo con un evento de progreso del importador"""
+    with _lock:
+        sheet = _sheet(job, table)
+        if rechazados:
+            sheet["rechazados"] = dict(rechazados)
+        if invalidos:
+            sheet["invalidos"] = list(invalidos)
+        if error:
+            sheet["error"] = error
+        if cambios:
+            sheet["cambios"] = dict(cambios)
+        if event == "leida":
+            sheet["leidos"] = registros
+        elif event == "insertados":
+            sheet["insertados"] = registros
+            sheet["leidos"] = max(sheet["leidos"], registros)
+        elif event == "completada":
+            sheet["insertados"] = registros
+            sheet["completada"] = True
+        if tiempos:
+            sheet["tiempos"].update({stage: round(seconds, 3) for stage, seconds in tiempos.items()})
+
+
+def _run(job, upload=None):
+    """Ejecutar la importación de un trabajo (en el hilo de trabajos).
+
+    `upload` es el libro subido por la API: reemplaza al configurado dentro
+    del bloqueo de importación, así que el vigilante solo puede ver el
+    cambio cuando ya está importado (y registrado con su firma).
+    """
+    with _lock:
+        job["estado"] = "ejecutando"
+        job["inicio"] = time.time()
+
+    def on_progress(event, table, **data):
+        _on_progress(job, event, table, **data)
+
+    try:
+        options = job["opciones"]
+        mode = "streaming" if options.get("streaming") else "clasico"
+        # El vigilante o el CLI pueden estar importando en otro proceso
+        with import_lock():
+            if upload is not None:
+                os.replace(upload, EXCEL_FILES[job["libro"]]["path"])
+            init_db()
+            with import_runs.record_run("api", mode, options.get("delta", False), [job["libro"]]) as run, \
+                    progress_listener(on_progress):
+                with _lock:
+                    job["run_id"] = run.run_id
+                total = import_data.import_workbook(job["libro"], **options)
+            analytics.export_snapshot()
+        # La API pasa a leer los datos nuevos sin esperar la próxima revisión
+        read_snapshot.refresh()
+        with _lock:
+            job["total_registros"] = total
+            job["estado"] = "completado"
+    except Exception as e:
+        traceback.print_exc()
+        with _lock:
+            job["estado"] = "error"
+            job["error"] = f"{type(e).__name__}: {e}"
+    finally:
+        if upload is not None and os.path.exists(upload):
+            os.remove(upload)
+        with _lock:
+            job["fin"] = time.time()
+
+
+def submit_import(key, filename=None, upload=None, **options):
+    """Encolar la importación de un libro de EXCEL_FILES y retornar el trabajo.
+
+    Con `upload` (ruta de un libro subido) el trabajo lo pone en lugar del
+    libro antes de importarlo.
+    """
+    job = _new_job(key, filename, options)
+    with _lock:
+        _jobs[job["id"]] = job
+        while len(_jobs) > MAX_JOBS:
+            _jobs.popitem(last=False)
+    _executor.submit(_run, job, upload)
+    return get_job(job["id"])
+
+
+def _snapshot(job):
+    """Copia del trabajo para responder sin exponer el registro compartido"""
+    snapshot = dict(job, hojas={table: dict(sheet, tiempos=dict(sheet["tiempos"]))
+                                for table, sheet in job["hojas"].items()})
+    end = job["fin"] or time.time()
+    snapshot["duracion"] = round(end - job["inicio"], 3) if job["inicio"] else None
+    return snapshot
+
+
+def get_job(job_id):
+    """Estado de un trabajo, o None si no existe"""
+    with _lock:
+        job = _jobs.get(job_id)
+        return _snapshot(job) if job else None
+
+
+def list_jobs():
+    """Estado de los trabajos conservados, del más reciente al más antiguo"""
+    with _lock:
+        return [_snapshot(job) for job in reversed(_jobs.values())]
@@ -0,0 +1,37 @@
+"""
+Eventos de progreso de la importación
+
+El importador avisa con notify() cada vez que lee, inserta o termina una
+hoja; quien necesite seguir la importación (trabajos de la API, registro
+de corridas en import_runs) se suscribe con progress_listener(). Los
+observadores se guardan en un ContextVar, así que solo reciben los
+eventos de las importaciones de su propio hilo.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Observadores activos en el contexto actual
+_progress_listeners = ContextVar("progress_listeners", default=())
+
+
+@contextmanager
+def progress_listener(callback):
+    """Recibir los eventos de progreso de las importaciones de este hilo.
+
+    callback(evento, tabla, **datos) se llama con los eventos "leida"
+    (registros, tiempos), "insertados" (registros acumulados), "completada"
+    (registros, tiempos, rechazados, invalidos y, en importación delta,
+    cambios: insertados/actualizados/eliminados/sin_cambios) y "error"
+    (error). Los observadores se pueden anidar; todos reciben los eventos.
+    """
+    token = _progress_listeners.set(_progress_listeners.get() + (callback,))
+    try:
+        yield
+    finally:
+        _progress_listeners.reset(token)
+
+
+def notify(event, table, **data):
+    """Avisar del progreso a los observadores activos"""
+    for callback in _progress_listeners.get():
+        callback(event, table, **data)
@@ -0,0 +1,186 @@
+"""
+Copia en memoria de la BD para las lecturas de la API
+
+Los datos de los tableros solo cambian cuando corre el importador, así
+que la API puede atender las lecturas desde una copia de la BD en memoria
+en lugar del archivo. La copia vive en el VFS memdb de SQLite con un
+nombre compartido ("file:/logistica-N?vfs=memdb"): todas las conexiones
+del pool de lectura la abren sin duplicarla, y se libera cuando se cierra
+la última.
+
+La copia se carga al arrancar la API y se reemplaza cuando termina una
+importación. La versión de los datos es el último id de import_runs (cada
+corrida del CLI, la API o el vigilante agrega sus filas al terminar): un
+hilo la revisa cada DB_SNAPSHOT_POLL_SECONDS y, si cambió, carga una copia
+nueva y cambia el pool a ella (ReadPool.switch). Las consultas en curso
+terminan sobre la copia anterior.
+
+Si la BD ocupa más de DB_MEMORY_BUDGET_MB (o el presupuesto es 0), el pool
+sigue leyendo del archivo.
+
+La versión servida (id y fecha de la última importación) la leen la caché
+de respuestas y los ETag en cada GET. Con la copia en memoria queda en
+memoria del proceso y cambia con la copia (carga, refresh al terminar un
+trabajo de importación de la API, revisión periódica). Leyendo del disco
+las importaciones del CLI o del vigilante se ven en cuanto se confirman,
+así que la versión se consulta en import_runs en cada GET (el último id
+sale del índice de la clave primaria).
+"""
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+from .config import DB_MEMORY_BUDGET_MB, DB_PATH, DB_SNAPSHOT_POLL_SECONDS
+from .database import get_db, get_read_db, get_read_pool
+
+# El VFS memdb limita cada BD a 1 GiB (SQLITE_MEMDB_DEFAULT_MAXSZ); una BD
+# mayor se lee del disco aunque el presupuesto lo permita
+MEMDB_MAX_MB = 1024
+
+_lock = threading.Lock()
+_stop = threading.Event()
+_thread = None
+_holder = None      # Conexión que mantiene viva la copia vigente
+_loads = 0
+_status = {"modo": None, "version": None, "tamano_mb": None, "cargada": None, "duracion_s": None, "motivo": None}
+_stamp = (0, None)  # (id, fecha UTC) de la última importación que ven las lecturas
+
+
+def data_stamp(conn):
+    """(id, fecha UTC) de la última fila de import_runs, o (0, None) si no hay importaciones"""
+    row = conn.execute("SELECT id, created_at FROM import_runs ORDER BY id DESC LIMIT 1").fetchone()
+    if row is None:
+        return 0, None
+    modified = datetime.strptime(row[1], "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc) if row[1] else None
+    return row[0], modified
+
+
+def data_version(conn):
+    """Versión de los datos: último id de import_runs (0 si no hay importaciones)"""
+    return conn.execute("SELECT COALESCE(MAX(id), 0) FROM import_runs").fetchone()[0]
+
+
+def served_stamp():
+    """(id, fecha UTC) de la última importación que ven las lecturas de la API.
+
+    Con la copia en memoria sale de la memoria del proceso: las lecturas no
+    ven una importación nueva hasta la recarga. Leyendo del disco (o sin
+    copia cargada: scripts, benchmarks) las lecturas la ven en cuanto se
+    confirma, así que se consulta import_runs en cada llamada.
+    """
+    if _status["modo"] != "memoria":
+        with get_read_db() as conn:
+            return data_stamp(conn)
+    return _stamp
+
+
+def data_version_served():
+    """Versión de los datos que ven ahora las lecturas de la API (copia en memoria o BD)"""
+    return served_stamp()[0]
+
+
+def database_size_mb(conn):
+    """Tamaño de los datos de la BD en MB (sin páginas libres)"""
+    pages = conn.execute("PRAGMA page_count").fetchone()[0] - conn.execute("PRAGMA freelist_count").fetchone()[0]
+    return pages * conn.execute("PRAGMA page_size").fetchone()[0] / (1024 * 1024)
+
+
+def _use_disk(stamp, size_mb, reason):
+    """Dejar el pool leyendo del archivo"""
+    global _holder, _stamp
+    announce = _status["modo"] != "disco" or _status["motivo"] != reason
+    if _status["modo"] != "disco":
+        get_read_pool().switch(DB_PATH)
+    if _holder is not None:
+        _holder.close()
+        _holder = None
+    _status.update(modo="disco", version=stamp[0], tamano_mb=round(size_mb, 1),
+                   cargada=datetime.now().isoformat(timespec="seconds"), duracion_s=None, motivo=reason)
+    _stamp = stamp
+    if announce:
+        print(f"💽 Lecturas desde el disco: {reason}")
+
+
+def load():
+    """Cargar una copia nueva de la BD en memoria y pasar el pool a ella.
+
+    La copia se hace con VACUUM INTO en una sola transacción de lectura,
+    así que es consistente aunque el importador esté escribiendo.
+    """
+    global _holder, _loads, _stamp
+    with _lock:
+        with get_db() as disk:
+            stamp = data_stamp(disk)
+            size_mb = database_size_mb(disk)
+            budget = min(DB_MEMORY_BUDGET_MB, MEMDB_MAX_MB)
+            if budget <= 0:
+                _use_disk(stamp, size_mb, "copia en memoria desactivada (DB_MEMORY_BUDGET_MB=0)")
+                return
+            if size_mb > budget:
+                _use_disk(stamp, size_mb, f"la BD ocupa {size_mb:.0f} MB y el presupuesto es {budget} MB")
+                return
+
+            start = time.perf_counter()
+            _loads += 1
+            uri = f"file:/logistica-{_loads}?vfs=memdb"
+            holder = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            try:
+                disk.execute("VACUUM INTO ?", (uri,))
+            except sqlite3.Error as e:
+                holder.close()
+                _use_disk(stamp, size_mb, f"no se pudo copiar a memoria ({e})")
+                return
+
+        get_read_pool().switch(uri, uri=True)
+        # La copia anterior se libera cuando se cierra su última conexión en uso
+        if _holder is not None:
+            _holder.close()
+        _holder = holder
+        seconds = time.perf_counter() - start
+        _status.update(modo="memoria", version=stamp[0], tamano_mb=round(size_mb, 1),
+                       cargada=datetime.now().isoformat(timespec="seconds"), duracion_s=round(seconds, 3), motivo=None)
+        _stamp = stamp
+        print(f"🧠 BD en memoria: {size_mb:.1f} MB en {seconds:.2f}s (versión {stamp[0]})")
+
+
+def refresh():
+    """Recargar la copia si hubo importaciones desde la última carga. Retorna True si recargó"""
+    if _status["modo"] is None:
+        return False
+    with get_db() as disk:
+        version = data_version(disk)
+    if version == _status["version"]:
+        return False
+    load()
+    return True
+
+
+def _poll():
+    while not _stop.wait(DB_SNAPSHOT_POLL_SECONDS):
+        try:
+            refresh()
+        except Exception as e:
+            print(f"⚠️ No se pudo recargar la BD en memoria: {e}")
+
+
+def start():
+    """Cargar la copia y revisar en segundo plano si hay datos nuevos (al arrancar la API)"""
+    global _thread
+    load()
+    # También en modo disco: la BD puede volver a caber en el presupuesto
+    _stop.clear()
+    _thread = threading.Thread(target=_poll, name="read-snapshot", daemon=True)
+    _thread.start()
+
+
+def stop():
+    """Detener la revisión en segundo plano (al apagar la API)"""
+    _stop.set()
+    if _thread is not None:
+        _thread.join(timeout=5)
+
+
+def status():
+    """Modo de lectura (memoria o disco), versión de datos y tamaño de la copia vigente"""
+    return dict(_status)
@@ -0,0 +1,170 @@
+"""
+Caché de respuestas de los endpoints de KPIs, gráficos y filtros
+
+Los datos solo cambian cuando corre el importador, así que una misma
+consulta devuelve lo mismo a todos los usuarios hasta la próxima
+importación. @cached guarda el resultado de un endpoint con la clave
+(ruta, parámetros normalizados, versión de datos):
+
+- Parámetros: las listas IN ("a,b") se ordenan, las fechas se llevan a
+  YYYY-MM-DD y los textos vacíos cuentan como ausentes. El endpoint se
+  ejecuta con esos mismos valores, así que dos formas de pedir lo mismo
+  comparten entrada.
+- Versión de datos: la versión servida de read_snapshot (último id de
+  import_runs: en memoria del proceso con la copia en memoria, consultado
+  en cada llamada leyendo del disco) más la instantánea analítica
+  vigente. Cuando cambia, la caché se vacía.
+
+Las entradas se descartan por LRU cuando su tamaño (JSON) supera
+RESPONSE_CACHE_MB; con 0 la caché está desactivada. stats() entrega los
+aciertos, fallos y descartes.
+"""
+import functools
+import inspect
+import json
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+from pydantic import BaseModel
+
+from . import analytics, read_snapshot
+from .config import RESPONSE_CACHE_MB
+
+# Parámetros con fechas (GET y FilterRequest de compras)
+DATE_PARAMS = {"fecha_inicio", "fecha_fin", "dateStart", "dateEnd"}
+DATE_FORMATS = ["%Y-%m-%d", "%Y/%m/%d", "%d/%m/%Y"]
+
+_lock = threading.Lock()
+_entries = OrderedDict()    # clave -> (resultado, bytes)
+_version = None
+_stats = {"aciertos": 0, "fallos": 0, "descartes": 0, "invalidaciones": 0, "bytes": 0}
+
+
+def canonical_date(value):
+    """Fecha en YYYY-MM-DD si se reconoce el formato; si no, el texto tal cual"""
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format).strftime("%Y-%m-%d")
+        except ValueError:
+            continue
+    return value
+
+
+def normalize(name, value):
+    """Valor normalizado de un parámetro (ver docstring del módulo)"""
+    value = getattr(value, "default", value)  # Query(...) sin valor en una llamada directa
+    if isinstance(value, str):
+        value = value.strip()
+        if not value:
+            return None
+        if name in DATE_PARAMS:
+            return canonical_date(value)
+        if "," in value:
+            return ",".join(sorted({item.strip() for item in value.split(",") if item.strip()}))
+        return value
+    if isinstance(value, list):
+        return sorted(value, key=str) or None
+    if isinstance(value, BaseModel):
+        return type(value)(**{field: normalize(field, item) for field, item in value.model_dump().items()})
+    return value
+
+
+def _key_part(value):
+    """Parte hashable de la clave para un parámetro normalizado"""
+    if isinstance(value, BaseModel):
+        return json.dumps(value.model_dump(), sort_keys=True, default=str)
+    if isinstance(value, (list, tuple)):
+        return tuple(_key_part(item) for item in value)
+    if isinstance(value, dict):
+        return json.dumps(value, sort_keys=True, default=str)
+    try:
+        hash(value)
+    except TypeError:
+        return repr(value)
+    return value
+
+
+def data_version():
+    """Versión de los datos que ve la API (BD o copia en memoria, y la instantánea analítica)"""
+    return read_snapshot.data_version_served(), analytics.snapshot_id()
+
+
+def _get(key, version):
+    global _version
+    with _lock:
+        if version != _version:
+            if _entries:
+                _stats["invalidaciones"] += 1
+            _entries.clear()
+            _stats["bytes"] = 0
+            _version = version
+        entry = _entries.get(key)
+        if entry is None:
+            _stats["fallos"] += 1
+            return None
+        _entries.move_to_end(key)
+        _stats["aciertos"] += 1
+        return entry
+
+
+def _put(key, version, result):
+    size = len(json.dumps(result, default=str))
+    limit = RESPONSE_CACHE_MB * 1024 * 1024
+    if size > limit:
+        return
+    with _lock:
+        if version != _version or key in _entries:
+            return
+        _entries[key] = (result, size)
+        _stats["bytes"] += size
+        while _stats["bytes"] > limit:
+            _, (_, evicted) = _entries.popitem(last=False)
+            _stats["bytes"] -= evicted
+            _stats["descartes"] += 1
+
+
+def cached(endpoint):
+    """Decorador de un endpoint: responde desde la caché si ya se calculó con los mismos datos.
+
+    El resultado guardado se entrega tal cual a cada petición: los
+    endpoints no deben modificarlo después de retornarlo.
+    """
+    signature = inspect.signature(endpoint)
+    route = f"{endpoint.__module__}.{endpoint.__name__}"
+
+    @functools.wraps(endpoint)
+    def wrapper(*args, **kwargs):
+        if RESPONSE_CACHE_MB <= 0:
+            return endpoint(*args, **kwargs)
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        params = {name: normalize(name, value) for name, value in bound.arguments.items()}
+        key = (route,) + tuple((name, _key_part(value)) for name, value in params.items())
+        version = data_version()
+        entry = _get(key, version)
+        if entry is not None:
+            return entry[0]
+        result = endpoint(**params)
+        _put(key, version, result)
+        return result
+
+    return wrapper
+
+
+def clear():
+    """Vaciar la caché"""
+    with _lock:
+        _entries.clear()
+        _stats["bytes"] = 0
+
+
+def stats():
+    """Aciertos, fallos, descartes por LRU, entradas y memoria usada"""
+    with _lock:
+        result = dict(_stats, entradas=len(_entries))
+    requests = result["aciertos"] + result["fallos"]
+    result["tasa_aciertos"] = round(result["aciertos"] / requests, 3) if requests else 0.0
+    result["mb"] = round(result.pop("bytes") / (1024 * 1024), 2)
+    result["limite_mb"] = RESPONSE_CACHE_MB
+    return result
@@ -0,0 +1,200 @@
+"""
+Enrutador de consultas hacia las tablas de agregados (rollups)
+
+El importador mantiene, para cada tabla de ROLLUPS (schema.py), totales
+por día y por mes, globales y por cada dimensión. source() decide si una
+consulta de los tableros se puede responder desde esos agregados o si
+debe ir a la tabla original:
+
+- los filtros IN y la columna agrupada usan a lo sumo una dimensión;
+- con la granularidad mensual, el rango de fechas cubre meses completos
+  (si no, se usa la diaria).
+
+Las rutas arman la misma consulta para ambos orígenes con las
+expresiones de Source (COUNT(*) pasa a ser SUM(registros), etc.). Sin
+agregados se consulta la tabla física: las columnas con diccionario se
+filtran, agrupan y cuentan por su clave entera (Source.key) y su texto
+se lee solo para las filas del resultado (Source.label). Los valores de
+los filtros se traducen antes a claves, así el WHERE lleva una lista
+literal (con `IN (SELECT ...)` SQLite no sabe cuántas filas filtra y
+suele elegir peor índice).
+"""
+import re
+from datetime import date, timedelta
+from typing import NamedTuple
+
+from .config import USE_ROLLUPS
+from .schema import (ROLLUPS, TABLES, date_part_column, dimension_table_name, label_sql, rollup_table_name,
+                     storage_column)
+
+ISO_DATE = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+
+class Source(NamedTuple):
+    table: str        # Tabla a consultar (agregados u original)
+    where: str
+    params: list
+    count: str        # Equivalente a COUNT(*)
+    day: str          # Fecha (día) de cada fila
+    month: str        # Mes 'YYYY-MM' de cada fila
+    rollup: bool
+    origin: str       # Tabla del registro (schema.TABLES)
+
+    def key(self, column):
+        """Expresión para agrupar o contar distintos por una columna"""
+        return column if self.rollup else storage_column(TABLES[self.origin], column)
+
+    def label(self, column):
+        """Valor de una columna en una consulta agrupada por key(column)"""
+        return column if self.rollup else label_sql(TABLES[self.origin], column)
+
+
+def parse_filters(filters):
+    """{columna: "a,b"} -> {columna: ["a", "b"]}, sin los filtros vacíos"""
+    return {column: values.split(",") for column, values in (filters or {}).items() if values}
+
+
+def month_range(fecha_inicio, fecha_fin):
+    """(mes inicial, mes final) si el rango cubre meses completos, o None"""
+    bounds = []
+    for value, first_day in ((fecha_inicio, True), (fecha_fin, False)):
+        if not value:
+            bounds.append(None)
+            continue
+        if not ISO_DATE.fullmatch(value):
+            return None
+        try:
+            day = date.fromisoformat(value)
+        except ValueError:
+            return None
+        if (day.day != 1) if first_day else ((day + timedelta(days=1)).day != 1):
+            return None
+        bounds.append(value[:7])
+    return tuple(bounds)
+
+
+def dictionary_keys(conn, schema, column, values):
+    """Claves de diccionario de unos valores (los que no existen no tienen clave)"""
+    dictionary = next(c.dictionary for c in schema.columns if c.name == column)
+    cursor = conn.execute(
+        f"SELECT id FROM {dimension_table_name(dictionary)} WHERE valor IN ({','.join('?' for _ in values)})",
+        values
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def raw_source(conn, table, fecha_inicio=None, fecha_fin=None, filters=None):
+    """Consulta sobre la tabla física (mismas filas que los filtros sobre la vista)"""
+    schema = TABLES[table]
+    date_column = ROLLUPS[table].date_column if table in ROLLUPS else "fecha"
+    where_clause = "WHERE 1=1"
+    params = []
+    if fecha_inicio:
+        where_clause += f" AND {date_column} >= ?"
+        params.append(fecha_inicio)
+    if fecha_fin:
+        where_clause += f" AND {date_column} <= ?"
+        params.append(fecha_fin)
+    for column, values in parse_filters(filters).items():
+        key = storage_column(schema, column)
+        if key != column:
+            values = dictionary_keys(conn, schema, column, values)
+        # Sin claves queda `IN (NULL)`, que no devuelve filas (en SQLite y en DuckDB)
+        where_clause += f" AND {key} IN ({','.join('?' for _ in values) or 'NULL'})"
+        params.extend(values)
+    return Source(schema.storage, where_clause, params, "COUNT(*)", date_column,
+                  date_part_column(date_column, "mes"), False, table)
+
+
+def source(conn, table, fecha_inicio=None, fecha_fin=None, filters=None, dimension=None, by_day=False):
+    """Origen para una consulta de gráfico o KPI.
+
+    conn: conexión de la consulta (para traducir los filtros a claves)
+    filters: {columna: "valores,separados,por,coma"} (filtros IN)
+    dimension: columna por la que se agrupa o se cuentan distintos
+    by_day: la consulta necesita la fecha de cada día (agrupa por día, MIN/MAX)
+    """
+    rollup = ROLLUPS.get(table)
+    parsed = parse_filters(filters)
+    dimensions = set(parsed) | ({dimension} if dimension else set())
+    if not USE_ROLLUPS or rollup is None or len(dimensions) > 1 or not dimensions <= set(rollup.dimensions):
+        return raw_source(conn, table, fecha_inicio, fecha_fin, filters)
+
+    months = None if by_day else month_range(fecha_inicio, fecha_fin)
+    grain = "mes" if months else "dia"
+    dimension = next(iter(dimensions), "")
+    where_clause = "WHERE grano = ? AND dimension = ?"
+    params = [grain, dimension]
+    start, end = months or (fecha_inicio, fecha_fin)
+    if start:
+        where_clause += " AND periodo >= ?"
+        params.append(start)
+    if end:
+        where_clause += " AND periodo <= ?"
+        params.append(end)
+    for column, values in parsed.items():
+        where_clause += f" AND {column} IN ({','.join('?' for _ in values)})"
+        params.extend(values)
+    # substr y no strftime: la misma expresión sirve en SQLite y en DuckDB (analytics.py)
+    month = "periodo" if grain == "mes" else "substr(periodo, 1, 7)"
+    return Source(rollup_table_name(table), where_clause, params, "SUM(registros)", "periodo", month, True, table)
+
+
+def grouping_sets(conn, table, fecha_inicio=None, fecha_fin=None, filters=None, measures=(), by_day=False):
+    """Totales, serie por período y totales por dimensión en una consulta sobre los agregados.
+
+    Equivale a analytics.grouping_sets sobre la tabla física con una
+    columna por período (mes, o día con by_day) y una por dimensión, y los
+    agregados SUM(medida) ("registros" es COUNT(*)). Una sola pasada por
+    las filas del rango en la tabla de agregados: el GROUP BY separa las
+    filas de totales (dimension = '', por período) de las de cada dimensión
+    (por su valor) y los totales generales se suman en Python. Con filtros IN los totales por las demás dimensiones no
+    están en los agregados: retorna None y se consulta la tabla física.
+
+    Retorna lo mismo que analytics.grouping_sets: {"": (sumas totales),
+    "mes" (o "dia"): [(período, *sumas)], dimensión: [(valor, *sumas)]}
+    """
+    rollup = ROLLUPS.get(table)
+    if not USE_ROLLUPS or rollup is None or parse_filters(filters):
+        return None
+
+    # Misma granularidad que source(): mensual si el rango cubre meses completos
+    months = month_range(fecha_inicio, fecha_fin)
+    grain = "mes" if months else "dia"
+    # Las filas de totales van por día si se pide la serie diaria
+    if by_day and grain == "mes":
+        branches = [("dia", "dimension = ''"), ("mes", "dimension <> ''")]
+    else:
+        branches = [(grain, None)]
+    conditions, params = [], []
+    for branch_grain, dimension in branches:
+        start, end = months if branch_grain == "mes" else (fecha_inicio, fecha_fin)
+        clause = "grano = ?" + (f" AND {dimension}" if dimension else "")
+        params.append(branch_grain)
+        if start:
+            clause += " AND periodo >= ?"
+            params.append(start)
+        if end:
+            clause += " AND periodo <= ?"
+            params.append(end)
+        conditions.append(f"({clause})")
+
+    # Valor de cada fila: el período en las de totales (el mes sale del día
+    # si la granularidad es diaria), el de su columna en las de una dimensión
+    period = "periodo" if by_day or months else "substr(periodo, 1, 7)"
+    labels = " ".join(f"WHEN '{dimension}' THEN {dimension}" for dimension in rollup.dimensions)
+    sums = ", ".join(f"SUM({measure})" for measure in measures)
+    sql = (f"SELECT dimension, CASE dimension WHEN '' THEN {period} {labels} END AS valor, {sums} "
+           f"FROM {rollup_table_name(table)} WHERE {' OR '.join(conditions)} GROUP BY dimension, valor")
+
+    series = "dia" if by_day else "mes"
+    result = {"": (), series: [], **{dimension: [] for dimension in rollup.dimensions}}
+    for row in conn.execute(sql, params).fetchall():
+        result[row[0] or series].append(tuple(row[1:]))
+    # COUNT sobre ninguna fila es 0; SUM es NULL
+    totals = [0 if measure == "registros" else None for measure in measures]
+    for row in result[series]:
+        totals = [total if value is None else value if total is None else total + value
+                  for total, value in zip(totals, row[1:])]
+    result[""] = tuple(totals)
+    return result
@@ -5,10 +5,16 @@ Columnas reales según la BD:
 - oc_descuentos: estado, tercero_nombre, fecha, total_dcto, porcentaje_descuento, etc.
 - base_oc_generadas: estado, tercero_nombre, fecha, documento_tipo, total, etc.
 """
-from fastapi import APIRouter, Query
-from typing import Optional, Dict, Any
+import time
+
+from fastapi import APIRouter, HTTPException, Query
+from typing import Optional, Dict, Any, List
 from pydantic import BaseModel
-from ..database import get_db
+from ..analytics import get_analytics_db, sort_rows
+from ..database import get_read_db
+from ..response_cache import cached
+from ..schema import TABLES, distinct_values_sql
+from .. import rollups
 
 router = APIRouter(prefix="/api/compras", tags=["Compras"])
 
@@ -24,9 +30,9 @@ class FilterRequest(BaseModel):
 
 # ==================== ENDPOINTS PRINCIPALES ====================
 @router.get("/load")
-async def load_data():
+def load_data():
     """Verificar datos cargados en las 3 tablas de compras"""
-    with get_db() as conn:
+    with get_read_db() as conn:
         cursor = conn.cursor()
         counts = {}
         for table in ["traza_req_oc", "oc_descuentos", "base_oc_generadas"]:
@@ -39,9 +45,10 @@ async def load_data():
 
 
 @router.get("/filters")
-async def get_filters():
+@cached
+def get_filters():
     """Obtener todas las opciones de filtros para el dashboard"""
-    with get_db() as conn:
+    with get_read_db() as conn:
         cursor = conn.cursor()
         filters = {}
         
@@ -54,17 +61,17 @@ async def get_filters():
         filters["terceros_traza"] = [row[0] for row in cursor.fetchall()]
         
         # Filtros de OC DESCUENTOS
-        cursor.execute("SELECT DISTINCT tercero_nombre FROM oc_descuentos WHERE tercero_nombre IS NOT NULL ORDER BY tercero_nombre LIMIT 500")
+        cursor.execute(distinct_values_sql(TABLES["oc_descuentos"], "tercero_nombre", limit=500))
         filters["terceros_descuentos"] = [row[0] for row in cursor.fetchall()]
-        cursor.execute("SELECT DISTINCT estado FROM oc_descuentos WHERE estado IS NOT NULL ORDER BY estado")
+        cursor.execute(distinct_values_sql(TABLES["oc_descuentos"], "estado"))
         filters["estados_descuentos"] = [row[0] for row in cursor.fetchall()]
         
         # Filtros de BASE OC GENERADAS
-        cursor.execute("SELECT DISTINCT tercero_nombre FROM base_oc_generadas WHERE tercero_nombre IS NOT NULL ORDER BY tercero_nombre LIMIT 500")
+        cursor.execute(distinct_values_sql(TABLES["base_oc_generadas"], "tercero_nombre", limit=500))
         filters["terceros_base"] = [row[0] for row in cursor.fetchall()]
         cursor.execute("SELECT DISTINCT documento_tipo FROM base_oc_generadas WHERE documento_tipo IS NOT NULL ORDER BY documento_tipo")
         filters["tipos_doc"] = [row[0] for row in cursor.fetchall()]
-        cursor.execute("SELECT DISTINCT estado FROM base_oc_generadas WHERE estado IS NOT NULL ORDER BY estado")
+        cursor.execute(distinct_values_sql(TABLES["base_oc_generadas"], "estado"))
         filters["estados_base"] = [row[0] for row in cursor.fetchall()]
         
         return {"success": True, "filters": filters}
@@ -96,12 +103,12 @@ def build_traza_where(fecha_inicio, fecha_fin, estados_req, estados_oc, terceros
 
 
 @router.get("/traza/datos")
-async def get_traza_datos(
+def get_traza_datos(
     fecha_inicio: Optional[str] = None, fecha_fin: Optional[str] = None,
     estados_req: Optional[str] = None, estados_oc: Optional[str] = None, terceros: Optional[str] = None,
     limit: int = Query(default=100000, le=150000)
 ):
-    with get_db() as conn:
+    with get_read_db() as conn:
         cursor = conn.cursor()
         where_clause, params = build_traza_where(fecha_inicio, fecha_fin, estados_req, estados_oc, terceros)
         cursor.execute(f"SELECT * FROM traza_req_oc {where_clause} LIMIT {limit}", params)
@@ -110,8 +117,9 @@ async def get_traza_datos(
 
 
 @router.get("/traza/filtros")
-async def get_traza_filtros():
-    with get_db() as conn:
+@cached
+def get_traza_filtros():
+    with get_read_db() as conn:
         cursor = conn.cursor()
         cursor.execute("SELECT DISTINCT req_estado FROM traza_req_oc WHERE req_estado IS NOT NULL ORDER BY req_estado")
         estados_req = [row[0] for row in cursor.fetchall()]
@@ -125,11 +133,12 @@ async def get_traza_filtros():
 
 
 @router.get("/traza/kpis")
-async def get_traza_kpis(
+@cached
+def get_traza_kpis(
     fecha_inicio: Optional[str] = None, fecha_fin: Optional[str] = None,
     estados_req: Optional[str] = None, estados_oc: Optional[str] = None, terceros: Optional[str] = None
 ):
-    with get_db() as conn:
+    with get_analytics_db() as conn:
         cursor = conn.cursor()
         where_clause, params = build_traza_where(fecha_inicio, fecha_fin, estados_req, estados_oc, terceros)
         cursor.execute(f'''SELECT COUNT(*), COUNT(DISTINCT req_numero), COUNT(DISTINCT oc_numero),
@@ -146,65 +155,56 @@ async def get_traza_kpis(
 
 
 # ==================== OC DESCUENTOS ====================
-def build_descuentos_where(fecha_inicio, fecha_fin, terceros, estados):
-    where_clause = "WHERE 1=1"
-    params = []
-    if fecha_inicio:
-        where_clause += " AND fecha >= ?"
-        params.append(fecha_inicio)
-    if fecha_fin:
-        where_clause += " AND fecha <= ?"
-        params.append(fecha_fin)
-    if terceros:
-        lista = terceros.split(",")
-        where_clause += f" AND tercero_nombre IN ({','.join(['?' for _ in lista])})"
-        params.extend(lista)
-    if estados:
-        lista = estados.split(",")
-        where_clause += f" AND estado IN ({','.join(['?' for _ in lista])})"
-        params.extend(lista)
-    return where_clause, params
+def descuentos_source(conn, fecha_inicio=None, fecha_fin=None, terceros=None, estados=None, dimension=None):
+    """Agregados o tabla física de oc_descuentos según los filtros (ver rollups.py)"""
+    filters = {"tercero_nombre": terceros, "estado": estados}
+    return rollups.source(conn, "oc_descuentos", fecha_inicio, fecha_fin, filters, dimension)
 
 
 @router.get("/descuentos/datos")
-async def get_descuentos_datos(
+def get_descuentos_datos(
     fecha_inicio: Optional[str] = None, fecha_fin: Optional[str] = None,
     terceros: Optional[str] = None, estados: Optional[str] = None,
     limit: int = Query(default=100000, le=150000)
 ):
-    with get_db() as conn:
+    with get_read_db() as conn:
         cursor = conn.cursor()
-        where_clause, params = build_descuentos_where(fecha_inicio, fecha_fin, terceros, estados)
-        cursor.execute(f"SELECT * FROM oc_descuentos {where_clause} LIMIT {limit}", params)
+        src = rollups.raw_source(conn, "oc_descuentos", fecha_inicio, fecha_fin,
+                                 {"tercero_nombre": terceros, "estado": estados})
+        cursor.execute(f"SELECT * FROM oc_descuentos WHERE id IN "
+                       f"(SELECT id FROM {src.table} {src.where} LIMIT {limit})", src.params)
         rows = cursor.fetchall()
         return {"data": [dict(row) for row in rows], "total": len(rows)}
 
 
 @router.get("/descuentos/filtros")
-async def get_descuentos_filtros():
-    with get_db() as conn:
+@cached
+def get_descuentos_filtros():
+    with get_read_db() as conn:
         cursor = conn.cursor()
-        cursor.execute("SELECT DISTINCT tercero_nombre FROM oc_descuentos WHERE tercero_nombre IS NOT NULL ORDER BY tercero_nombre LIMIT 500")
+        cursor.execute(distinct_values_sql(TABLES["oc_descuentos"], "tercero_nombre", limit=500))
         terceros = [row[0] for row in cursor.fetchall()]
-        cursor.execute("SELECT DISTINCT estado FROM oc_descuentos WHERE estado IS NOT NULL ORDER BY estado")
+        cursor.execute(distinct_values_sql(TABLES["oc_descuentos"], "estado"))
         estados = [row[0] for row in cursor.fetchall()]
-        cursor.execute("SELECT MIN(fecha), MAX(fecha) FROM oc_descuentos")
+        cursor.execute(f"SELECT MIN(fecha), MAX(fecha) FROM {TABLES['oc_descuentos'].storage}")
         fecha_min, fecha_max = cursor.fetchone()
         return {"terceros": terceros, "estados": estados, "fecha_min": fecha_min, "fecha_max": fecha_max}
 
 
 @router.get("/descuentos/kpis")
-async def get_descuentos_kpis(
+@cached
+def get_descuentos_kpis(
     fecha_inicio: Optional[str] = None, fecha_fin: Optional[str] = None,
     terceros: Optional[str] = None, estados: Optional[str] = None
 ):
-    with get_db() as conn:
+    with get_analytics_db() as conn:
         cursor = conn.cursor()
-        where_clause, params = build_descuentos_where(fecha_inicio, fecha_fin, terceros, estados)
+        src = rollups.raw_source(conn, "oc_descuentos", fecha_inicio, fecha_fin,
+                                 {"tercero_nombre": terceros, "estado": estados})
         cursor.execute(f'''SELECT COUNT(*), SUM(COALESCE(total_dcto, 0)), SUM(COALESCE(total, 0)),
-            COUNT(DISTINCT documento_num), COUNT(DISTINCT tercero_nombre),
+            COUNT(DISTINCT documento_num), COUNT(DISTINCT {src.key('tercero_nombre')}),
             AVG(COALESCE(porcentaje_descuento, 0))
-            FROM oc_descuentos {where_clause}''', params)
+            FROM {src.table} {src.where}''', src.params)
         row = cursor.fetchone()
         return {
             "total_registros": row[0], 
@@ -217,70 +217,57 @@ async def get_descuentos_kpis(
 
 
 # ==================== BASE OC GENERADAS ====================
-def build_base_where(fecha_inicio, fecha_fin, terceros, tipos, estados):
-    where_clause = "WHERE 1=1"
-    params = []
-    if fecha_inicio:
-        where_clause += " AND fecha >= ?"
-        params.append(fecha_inicio)
-    if fecha_fin:
-        where_clause += " AND fecha <= ?"
-        params.append(fecha_fin)
-    if terceros:
-        lista = terceros.split(",")
-        where_clause += f" AND tercero_nombre IN ({','.join(['?' for _ in lista])})"
-        params.extend(lista)
-    if tipos:
-        lista = tipos.split(",")
-        where_clause += f" AND documento_tipo IN ({','.join(['?' for _ in lista])})"
-        params.extend(lista)
-    if estados:
-        lista = estados.split(",")
-        where_clause += f" AND estado IN ({','.join(['?' for _ in lista])})"
-        params.extend(lista)
-    return where_clause, params
+def base_source(conn, fecha_inicio, fecha_fin, terceros, tipos, estados, dimension=None):
+    """Agregados o tabla física de base_oc_generadas según los filtros (ver rollups.py)"""
+    filters = {"tercero_nombre": terceros, "documento_tipo": tipos, "estado": estados}
+    return rollups.source(conn, "base_oc_generadas", fecha_inicio, fecha_fin, filters, dimension)
 
 
 @router.get("/base/datos")
-async def get_base_datos(
+def get_base_datos(
     fecha_inicio: Optional[str] = None, fecha_fin: Optional[str] = None,
     terceros: Optional[str] = None, tipos: Optional[str] = None, estados: Optional[str] = None,
     limit: int = Query(default=100000, le=150000)
 ):
-    with get_db() as conn:
+    with get_read_db() as conn:
         cursor = conn.cursor()
-        where_clause, params = build_base_where(fecha_inicio, fecha_fin, terceros, tipos, estados)
-        cursor.execute(f"SELECT * FROM base_oc_generadas {where_clause} LIMIT {limit}", params)
+        src = rollups.raw_source(conn, "base_oc_generadas", fecha_inicio, fecha_fin,
+                                 {"tercero_nombre": terceros, "documento_tipo": tipos, "estado": estados})
+        cursor.execute(f"SELECT * FROM base_oc_generadas WHERE id IN "
+                       f"(SELECT id FROM {src.table} {src.where} LIMIT {limit})", src.params)
         rows = cursor.fetchall()
         return {"data": [dict(row) for row in rows], "total": len(rows)}
 
 
 @router.get("/base/filtros")
-async def get_base_filtros():
-    with get_db() as conn:
+@cached
+def get_base_filtros():
+    with get_read_db() as conn:
         cursor = conn.cursor()
-        cursor.execute("SELECT DISTINCT tercero_nombre FROM base_oc_generadas WHERE tercero_nombre IS NOT NULL ORDER BY tercero_nombre LIMIT 500")
+        cursor.execute(distinct_values_sql(TABLES["base_oc_generadas"], "tercero_nombre", limit=500))
         terceros = [row[0] for row in cursor.fetchall()]
         cursor.execute("SELECT DISTINCT documento_tipo FROM base_oc_generadas WHERE documento_tipo IS NOT NULL ORDER BY documento_tipo")
         tipos = [row[0] for row in cursor.fetchall()]
-        cursor.execute("SELECT DISTINCT estado FROM base_oc_generadas WHERE estado IS NOT NULL ORDER BY estado")
+        cursor.execute(distinct_values_sql(TABLES["base_oc_generadas"], "estado"))
         estados = [row[0] for row in cursor.fetchall()]
-        cursor.execute("SELECT MIN(fecha), MAX(fecha) FROM base_oc_generadas")
+        cursor.execute(f"SELECT MIN(fecha), MAX(fecha) FROM {TABLES['base_oc_generadas'].storage}")
         fecha_min, fecha_max = cursor.fetchone()
         return {"terceros": terceros, "tipos": tipos, "estados": estados, "fecha_min": fecha_min, "fecha_max": fecha_max}
 
 
 @router.get("/base/kpis")
-async def get_base_kpis(
+@cached
+def get_base_kpis(
     fecha_inicio: Optional[str] = None, fecha_fin: Optional[str] = None,
     terceros: Optional[str] = None, tipos: Optional[str] = None, estados: Optional[str] = None
 ):
-    with get_db() as conn:
+    with get_analytics_db() as conn:
         cursor = conn.cursor()
-        where_clause, params = build_base_where(fecha_inicio, fecha_fin, terceros, tipos, estados)
+        src = rollups.raw_source(conn, "base_oc_generadas", fecha_inicio, fecha_fin,
+                                 {"tercero_nombre": terceros, "documento_tipo": tipos, "estado": estados})
         cursor.execute(f'''SELECT COUNT(*), COUNT(DISTINCT documento_num), 
-            SUM(COALESCE(total, 0)), COUNT(DISTINCT tercero_nombre), COUNT(DISTINCT documento_tipo)
-            FROM base_oc_generadas {where_clause}''', params)
+            SUM(COALESCE(total, 0)), COUNT(DISTINCT {src.key('tercero_nombre')}), COUNT(DISTINCT documento_tipo)
+            FROM {src.table} {src.where}''', src.params)
         row = cursor.fetchone()
         return {
             "total_registros": row[0], 
@@ -293,91 +280,153 @@ async def get_base_kpis(
 
 # ==================== GRÁFICOS COMBINADOS ====================
 @router.get("/grafico/por-mes")
-async def get_compras_por_mes(
+@cached
+def get_compras_por_mes(
     fecha_inicio: Optional[str] = None, fecha_fin: Optional[str] = None,
     terceros: Optional[str] = None, tipos: Optional[str] = None, estados: Optional[str] = None
 ):
-    with get_db() as conn:
+    with get_analytics_db() as conn:
         cursor = conn.cursor()
-        where_clause, params = build_base_where(fecha_inicio, fecha_fin, terceros, tipos, estados)
+        src = base_source(conn, fecha_inicio, fecha_fin, terceros, tipos, estados)
         cursor.execute(f'''
-            SELECT strftime('%Y-%m', fecha) as mes, COUNT(*), SUM(COALESCE(total, 0))
-            FROM base_oc_generadas {where_clause}
+            SELECT {src.month} as mes, {src.count}, SUM(COALESCE(total, 0))
+            FROM {src.table} {src.where}
             GROUP BY mes ORDER BY mes
-        ''', params)
+        ''', src.params)
         return [{"mes": row[0], "cantidad": row[1], "valor": row[2] or 0} for row in cursor.fetchall()]
 
 
 @router.get("/grafico/por-tercero")
-async def get_compras_por_tercero(
+@cached
+def get_compras_por_tercero(
     fecha_inicio: Optional[str] = None, fecha_fin: Optional[str] = None,
     terceros: Optional[str] = None, tipos: Optional[str] = None, estados: Optional[str] = None,
     limit: int = 15
 ):
-    with get_db() as conn:
+    with get_analytics_db() as conn:
         cursor = conn.cursor()
-        where_clause, params = build_base_where(fecha_inicio, fecha_fin, terceros, tipos, estados)
+        src = base_source(conn, fecha_inicio, fecha_fin, terceros, tipos, estados, dimension="tercero_nombre")
         cursor.execute(f'''
-            SELECT tercero_nombre, COUNT(*), SUM(COALESCE(total, 0))
-            FROM base_oc_generadas {where_clause}
-            GROUP BY tercero_nombre ORDER BY SUM(COALESCE(total, 0)) DESC LIMIT {limit}
-        ''', params)
+            SELECT {src.label('tercero_nombre')}, {src.count}, SUM(COALESCE(total, 0))
+            FROM {src.table} {src.where}
+            GROUP BY {src.key('tercero_nombre')} ORDER BY SUM(COALESCE(total, 0)) DESC LIMIT {limit}
+        ''', src.params)
         return [{"tercero": row[0], "cantidad": row[1], "valor": row[2] or 0} for row in cursor.fetchall()]
 
 
 @router.get("/grafico/por-tipo")
-async def get_compras_por_tipo(
+@cached
+def get_compras_por_tipo(
     fecha_inicio: Optional[str] = None, fecha_fin: Optional[str] = None,
     terceros: Optional[str] = None, tipos: Optional[str] = None, estados: Optional[str] = None
 ):
-    with get_db() as conn:
+    with get_analytics_db() as conn:
         cursor = conn.cursor()
-        where_clause, params = build_base_where(fecha_inicio, fecha_fin, terceros, tipos, estados)
+        src = base_source(conn, fecha_inicio, fecha_fin, terceros, tipos, estados, dimension="documento_tipo")
         cursor.execute(f'''
-            SELECT documento_tipo, COUNT(*) FROM base_oc_generadas {where_clause}
-            GROUP BY documento_tipo ORDER BY COUNT(*) DESC
-        ''', params)
+            SELECT documento_tipo, {src.count} FROM {src.table} {src.where}
+            GROUP BY documento_tipo ORDER BY {src.count} DESC
+        ''', src.params)
         return [{"tipo": row[0], "cantidad": row[1]} for row in cursor.fetchall()]
 
 
 @router.get("/grafico/por-estado")
-async def get_compras_por_estado(
+@cached
+def get_compras_por_estado(
     fecha_inicio: Optional[str] = None, fecha_fin: Optional[str] = None,
     terceros: Optional[str] = None, tipos: Optional[str] = None, estados: Optional[str] = None
 ):
-    with get_db() as conn:
+    with get_analytics_db() as conn:
         cursor = conn.cursor()
-        where_clause, params = build_base_where(fecha_inicio, fecha_fin, terceros, tipos, estados)
+        src = base_source(conn, fecha_inicio, fecha_fin, terceros, tipos, estados, dimension="estado")
         cursor.execute(f'''
-            SELECT estado, COUNT(*) FROM base_oc_generadas {where_clause}
-            GROUP BY estado ORDER BY COUNT(*) DESC
-        ''', params)
+            SELECT {src.label('estado')}, {src.count} FROM {src.table} {src.where}
+            GROUP BY {src.key('estado')} ORDER BY {src.count} DESC
+        ''', src.params)
         return [{"estado": row[0], "cantidad": row[1]} for row in cursor.fetchall()]
 
 
 @router.get("/grafico/descuentos-por-tercero")
-async def get_descuentos_por_tercero(
+@cached
+def get_descuentos_por_tercero(
     fecha_inicio: Optional[str] = None, fecha_fin: Optional[str] = None,
     terceros: Optional[str] = None, estados: Optional[str] = None,
     limit: int = 15
 ):
-    with get_db() as conn:
+    with get_analytics_db() as conn:
         cursor = conn.cursor()
-        where_clause, params = build_descuentos_where(fecha_inicio, fecha_fin, terceros, estados)
+        src = descuentos_source(conn, fecha_inicio, fecha_fin, terceros, estados, dimension="tercero_nombre")
         cursor.execute(f'''
-            SELECT tercero_nombre, SUM(COALESCE(total_dcto, 0)), COUNT(*)
-            FROM oc_descuentos {where_clause}
-            GROUP BY tercero_nombre ORDER BY SUM(COALESCE(total_dcto, 0)) DESC LIMIT {limit}
-        ''', params)
+            SELECT {src.label('tercero_nombre')}, SUM(COALESCE(total_dcto, 0)), {src.count}
+            FROM {src.table} {src.where}
+            GROUP BY {src.key('tercero_nombre')} ORDER BY SUM(COALESCE(total_dcto, 0)) DESC LIMIT {limit}
+        ''', src.params)
         return [{"tercero": row[0], "descuento": row[1] or 0, "cantidad": row[2]} for row in cursor.fetchall()]
 
 
 # ==================== ENDPOINTS POST PARA DASHBOARD ====================
 
+# Consultas de los gráficos de /charts que también calcula /dashboard
+def avg_days_by_user(conn, user_column, days_column, label):
+    """Top 10 usuarios por días promedio de una etapa de traza_req_oc"""
+    cursor = conn.cursor()
+    cursor.execute(f'''
+        SELECT {user_column}, AVG(COALESCE({days_column}, 0)) as promedio
+        FROM traza_req_oc
+        WHERE {user_column} IS NOT NULL AND {days_column} IS NOT NULL
+        GROUP BY {user_column} ORDER BY promedio DESC NULLS LAST, 1 NULLS FIRST LIMIT 10
+    ''')
+    rows = cursor.fetchall()
+    return {label: [r[0] for r in rows], "promedios": [round(r[1] or 0, 1) for r in rows]}
+
+
+def pending_by_user(conn, state_column, user_column):
+    """Top 10 usuarios por registros pendientes de aprobar"""
+    cursor = conn.cursor()
+    cursor.execute(f'''
+        SELECT {user_column}, COUNT(*) as cantidad
+        FROM traza_req_oc
+        WHERE ({state_column} = 'PENDIENTE' OR {state_column} LIKE '%PEND%')
+        AND {user_column} IS NOT NULL
+        GROUP BY {user_column} ORDER BY cantidad DESC NULLS LAST, 1 NULLS FIRST LIMIT 10
+    ''')
+    rows = cursor.fetchall()
+    return {"aprobadores": [r[0] for r in rows], "cantidades": [r[1] for r in rows]}
+
+
+def oc_by_state(conn):
+    """OC por estado"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT oc_estado, COUNT(*) FROM traza_req_oc
+        WHERE oc_estado IS NOT NULL
+        GROUP BY oc_estado ORDER BY COUNT(*) DESC NULLS LAST, 1 NULLS FIRST
+    ''')
+    rows = cursor.fetchall()
+    return {"states": [r[0] for r in rows], "counts": [r[1] for r in rows]}
+
+
+def trend_oc(conn):
+    """OC distintas por mes (últimos 12 meses con datos)"""
+    cursor = conn.cursor()
+    # Mes guardado en la tabla física (la vista solo expone las columnas del
+    # Excel). Se agrupa por la columna y no por un alias "mes": traza_req_oc
+    # tiene su propia columna mes, que el GROUP BY tomaría en su lugar.
+    cursor.execute(f'''
+        SELECT oc_fecha_mes, COUNT(DISTINCT oc_numero)
+        FROM {TABLES["traza_req_oc"].storage}
+        WHERE oc_fecha_mes IS NOT NULL
+        GROUP BY oc_fecha_mes ORDER BY oc_fecha_mes DESC LIMIT 12
+    ''')
+    rows = cursor.fetchall()
+    return {"months": [r[0] for r in reversed(rows)], "counts": [r[1] for r in reversed(rows)]}
+
+
 @router.post("/kpis")
-async def get_kpis_post(filters: FilterRequest):
+@cached
+def get_kpis_post(filters: FilterRequest):
     """KPIs combinados para el dashboard"""
-    with get_db() as conn:
+    with get_analytics_db() as conn:
         cursor = conn.cursor()
         
         # KPIs de traza_req_oc
@@ -423,15 +472,17 @@ async def get_kpis_post(filters: FilterRequest):
 
 
 @router.post("/charts/oc-vs-items-by-process")
-async def chart_oc_vs_items(filters: FilterRequest):
+@cached
+def chart_oc_vs_items(filters: FilterRequest):
     """Gráfico OC vs Items por proceso"""
-    with get_db() as conn:
+    with get_analytics_db() as conn:
         cursor = conn.cursor()
-        cursor.execute('''
-            SELECT proceso, COUNT(DISTINCT documento_num) as total_oc, COUNT(*) as total_items
-            FROM oc_descuentos
-            WHERE proceso IS NOT NULL
-            GROUP BY proceso ORDER BY total_items DESC LIMIT 10
+        src = rollups.raw_source(conn, "oc_descuentos")
+        cursor.execute(f'''
+            SELECT {src.label('proceso')}, COUNT(DISTINCT documento_num) as total_oc, COUNT(*) as total_items
+            FROM {src.table}
+            WHERE {src.key('proceso')} IS NOT NULL
+            GROUP BY {src.key('proceso')} ORDER BY total_items DESC NULLS LAST, 1 NULLS FIRST LIMIT 10
         ''')
         rows = cursor.fetchall()
         procesos = [r[0] or 'Sin Proceso' for r in rows]
@@ -450,15 +501,17 @@ async def chart_oc_vs_items(filters: FilterRequest):
 
 
 @router.post("/charts/percent-discounts-by-process")
-async def chart_percent_discounts(filters: FilterRequest):
+@cached
+def chart_percent_discounts(filters: FilterRequest):
     """Gráfico porcentaje descuentos por proceso"""
-    with get_db() as conn:
+    with get_analytics_db() as conn:
         cursor = conn.cursor()
-        cursor.execute('''
-            SELECT proceso, AVG(COALESCE(porcentaje_descuento, 0)) as avg_pct
-            FROM oc_descuentos
-            WHERE proceso IS NOT NULL
-            GROUP BY proceso ORDER BY avg_pct DESC LIMIT 10
+        src = rollups.raw_source(conn, "oc_descuentos")
+        cursor.execute(f'''
+            SELECT {src.label('proceso')}, AVG(COALESCE(porcentaje_descuento, 0)) as avg_pct
+            FROM {src.table}
+            WHERE {src.key('proceso')} IS NOT NULL
+            GROUP BY {src.key('proceso')} ORDER BY avg_pct DESC NULLS LAST, 1 NULLS FIRST LIMIT 10
         ''')
         rows = cursor.fetchall()
         
@@ -477,20 +530,23 @@ async def chart_percent_discounts(filters: FilterRequest):
 
 
 @router.post("/charts/top-suppliers-discounts")
-async def chart_top_suppliers_discounts(filters: FilterRequest):
+@cached
+def chart_top_suppliers_discounts(filters: FilterRequest):
     """Top proveedores por descuentos"""
-    with get_db() as conn:
+    with get_analytics_db() as conn:
         cursor = conn.cursor()
         # Obtener total de descuentos para calcular porcentaje
-        cursor.execute('SELECT SUM(COALESCE(total_dcto, 0)) FROM oc_descuentos')
+        src = descuentos_source(conn)
+        cursor.execute(f'SELECT SUM(COALESCE(total_dcto, 0)) FROM {src.table} {src.where}', src.params)
         total_general = cursor.fetchone()[0] or 1
         
-        cursor.execute('''
-            SELECT tercero_nombre, SUM(COALESCE(total_dcto, 0)) as total_desc
-            FROM oc_descuentos
-            WHERE tercero_nombre IS NOT NULL
-            GROUP BY tercero_nombre ORDER BY total_desc DESC LIMIT 10
-        ''')
+        src = descuentos_source(conn, dimension="tercero_nombre")
+        cursor.execute(f'''
+            SELECT {src.label('tercero_nombre')}, SUM(COALESCE(total_dcto, 0)) as total_desc
+            FROM {src.table} {src.where}
+            AND {src.key('tercero_nombre')} IS NOT NULL
+            GROUP BY {src.key('tercero_nombre')} ORDER BY total_desc DESC NULLS LAST, 1 NULLS FIRST LIMIT 10
+        ''', src.params)
         rows = cursor.fetchall()
         
         proveedores = [r[0] for r in rows]
@@ -508,215 +564,95 @@ async def chart_top_suppliers_discounts(filters: FilterRequest):
 
 
 @router.post("/charts/avg-approval-days")
-async def chart_avg_approval_days(filters: FilterRequest):
+@cached
+def chart_avg_approval_days(filters: FilterRequest):
     """Días promedio aprobación RQ por aprobador"""
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT req_usuario_autorizador, AVG(COALESCE(dias_aprobar_rq, 0)) as promedio
-            FROM traza_req_oc
-            WHERE req_usuario_autorizador IS NOT NULL AND dias_aprobar_rq IS NOT NULL
-            GROUP BY req_usuario_autorizador ORDER BY promedio DESC LIMIT 10
-        ''')
-        rows = cursor.fetchall()
-        
-        return {
-            "success": True,
-            "data": {
-                "aprobadores": [r[0] for r in rows],
-                "promedios": [round(r[1] or 0, 1) for r in rows]
-            }
-        }
+    with get_analytics_db() as conn:
+        data = avg_days_by_user(conn, "req_usuario_autorizador", "dias_aprobar_rq", "aprobadores")
+        return {"success": True, "data": data}
 
 
 @router.post("/charts/avg-generation-days")
-async def chart_avg_generation_days(filters: FilterRequest):
+@cached
+def chart_avg_generation_days(filters: FilterRequest):
     """Días promedio generación OC por comprador"""
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT oc_usuario, AVG(COALESCE(dias_generar_oc, 0)) as promedio
-            FROM traza_req_oc
-            WHERE oc_usuario IS NOT NULL AND dias_generar_oc IS NOT NULL
-            GROUP BY oc_usuario ORDER BY promedio DESC LIMIT 10
-        ''')
-        rows = cursor.fetchall()
-        
-        return {
-            "success": True,
-            "data": {
-                "aprobadores": [r[0] for r in rows],
-                "promedios": [round(r[1] or 0, 1) for r in rows]
-            }
-        }
+    with get_analytics_db() as conn:
+        data = avg_days_by_user(conn, "oc_usuario", "dias_generar_oc", "aprobadores")
+        return {"success": True, "data": data}
 
 
 @router.post("/charts/avg-approval-management-days")
-async def chart_avg_approval_management(filters: FilterRequest):
+@cached
+def chart_avg_approval_management(filters: FilterRequest):
     """Días promedio aprobación gerencial OC por aprobador"""
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT oc_usuario_autorizacion, AVG(COALESCE(dias_aprobacion_oc, 0)) as promedio
-            FROM traza_req_oc
-            WHERE oc_usuario_autorizacion IS NOT NULL AND dias_aprobacion_oc IS NOT NULL
-            GROUP BY oc_usuario_autorizacion ORDER BY promedio DESC LIMIT 10
-        ''')
-        rows = cursor.fetchall()
-        
-        return {
-            "success": True,
-            "data": {
-                "aprobadores": [r[0] for r in rows],
-                "promedios": [round(r[1] or 0, 1) for r in rows]
-            }
-        }
+    with get_analytics_db() as conn:
+        data = avg_days_by_user(conn, "oc_usuario_autorizacion", "dias_aprobacion_oc", "aprobadores")
+        return {"success": True, "data": data}
 
 
 @router.post("/charts/avg-reception-service-days")
-async def chart_avg_reception_service(filters: FilterRequest):
+@cached
+def chart_avg_reception_service(filters: FilterRequest):
     """Días promedio recepción servicio por usuario"""
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT entrega_servicio_usuario, AVG(COALESCE(dias_recepcion_servicio, 0)) as promedio
-            FROM traza_req_oc
-            WHERE entrega_servicio_usuario IS NOT NULL AND dias_recepcion_servicio IS NOT NULL
-            GROUP BY entrega_servicio_usuario ORDER BY promedio DESC LIMIT 10
-        ''')
-        rows = cursor.fetchall()
-        
-        return {
-            "success": True,
-            "data": {
-                "usuarios": [r[0] for r in rows],
-                "promedios": [round(r[1] or 0, 1) for r in rows]
-            }
-        }
+    with get_analytics_db() as conn:
+        data = avg_days_by_user(conn, "entrega_servicio_usuario", "dias_recepcion_servicio", "usuarios")
+        return {"success": True, "data": data}
 
 
 @router.post("/charts/avg-warehouse-entry-days")
-async def chart_avg_warehouse_entry(filters: FilterRequest):
+@cached
+def chart_avg_warehouse_entry(filters: FilterRequest):
     """Días promedio entrada almacén por usuario"""
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT entrega_almacen_usuario, AVG(COALESCE(dias_entrada_almacen, 0)) as promedio
-            FROM traza_req_oc
-            WHERE entrega_almacen_usuario IS NOT NULL AND dias_entrada_almacen IS NOT NULL
-            GROUP BY entrega_almacen_usuario ORDER BY promedio DESC LIMIT 10
-        ''')
-        rows = cursor.fetchall()
-        
-        return {
-            "success": True,
-            "data": {
-                "usuarios": [r[0] for r in rows],
-                "promedios": [round(r[1] or 0, 1) for r in rows]
-            }
-        }
+    with get_analytics_db() as conn:
+        data = avg_days_by_user(conn, "entrega_almacen_usuario", "dias_entrada_almacen", "usuarios")
+        return {"success": True, "data": data}
 
 
 @router.post("/charts/pending-approve-rq")
-async def chart_pending_rq(filters: FilterRequest):
+@cached
+def chart_pending_rq(filters: FilterRequest):
     """Pendientes por aprobar RQ por aprobador"""
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT req_usuario_autorizador, COUNT(*) as cantidad
-            FROM traza_req_oc
-            WHERE (req_estado = 'PENDIENTE' OR req_estado LIKE '%PEND%') 
-            AND req_usuario_autorizador IS NOT NULL
-            GROUP BY req_usuario_autorizador ORDER BY cantidad DESC LIMIT 10
-        ''')
-        rows = cursor.fetchall()
-        
-        return {
-            "success": True,
-            "data": {
-                "aprobadores": [r[0] for r in rows],
-                "cantidades": [r[1] for r in rows]
-            }
-        }
+    with get_analytics_db() as conn:
+        return {"success": True, "data": pending_by_user(conn, "req_estado", "req_usuario_autorizador")}
 
 
 @router.post("/charts/pending-approve-oc")
-async def chart_pending_oc(filters: FilterRequest):
+@cached
+def chart_pending_oc(filters: FilterRequest):
     """Pendientes por aprobar OC por aprobador"""
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT oc_usuario_autorizacion, COUNT(*) as cantidad
-            FROM traza_req_oc
-            WHERE (oc_estado = 'PENDIENTE' OR oc_estado LIKE '%PEND%') 
-            AND oc_usuario_autorizacion IS NOT NULL
-            GROUP BY oc_usuario_autorizacion ORDER BY cantidad DESC LIMIT 10
-        ''')
-        rows = cursor.fetchall()
-        
-        return {
-            "success": True,
-            "data": {
-                "aprobadores": [r[0] for r in rows],
-                "cantidades": [r[1] for r in rows]
-            }
-        }
+    with get_analytics_db() as conn:
+        return {"success": True, "data": pending_by_user(conn, "oc_estado", "oc_usuario_autorizacion")}
 
 
 @router.post("/charts/oc-by-state")
-async def chart_oc_by_state(filters: FilterRequest):
+@cached
+def chart_oc_by_state(filters: FilterRequest):
     """OC por estado"""
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT oc_estado, COUNT(*) FROM traza_req_oc
-            WHERE oc_estado IS NOT NULL
-            GROUP BY oc_estado ORDER BY COUNT(*) DESC
-        ''')
-        rows = cursor.fetchall()
-        
-        return {
-            "success": True,
-            "data": {
-                "states": [r[0] for r in rows],
-                "counts": [r[1] for r in rows]
-            }
-        }
+    with get_analytics_db() as conn:
+        return {"success": True, "data": oc_by_state(conn)}
 
 
 @router.post("/charts/trend-oc")
-async def chart_trend_oc(filters: FilterRequest):
+@cached
+def chart_trend_oc(filters: FilterRequest):
     """Tendencia OC por mes"""
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT strftime('%Y-%m', oc_fecha) as mes, COUNT(DISTINCT oc_numero)
-            FROM traza_req_oc
-            WHERE oc_fecha IS NOT NULL
-            GROUP BY mes ORDER BY mes DESC LIMIT 12
-        ''')
-        rows = cursor.fetchall()
-        
-        return {
-            "success": True,
-            "data": {
-                "months": [r[0] for r in reversed(rows)],
-                "counts": [r[1] for r in reversed(rows)]
-            }
-        }
+    with get_analytics_db() as conn:
+        return {"success": True, "data": trend_oc(conn)}
 
 
 @router.post("/charts/discounts-by-process")
-async def chart_discounts_by_process(filters: FilterRequest):
+@cached
+def chart_discounts_by_process(filters: FilterRequest):
     """Descuentos por proceso"""
-    with get_db() as conn:
+    with get_analytics_db() as conn:
         cursor = conn.cursor()
-        cursor.execute('''
-            SELECT proceso, SUM(COALESCE(total_dcto, 0))
-            FROM oc_descuentos
-            WHERE proceso IS NOT NULL
-            GROUP BY proceso ORDER BY SUM(total_dcto) DESC LIMIT 10
-        ''')
+        src = descuentos_source(conn, dimension="proceso")
+        cursor.execute(f'''
+            SELECT {src.label('proceso')}, SUM(COALESCE(total_dcto, 0)) as total_desc
+            FROM {src.table} {src.where}
+            AND {src.key('proceso')} IS NOT NULL
+            GROUP BY {src.key('proceso')} ORDER BY total_desc DESC NULLS LAST, 1 NULLS FIRST LIMIT 10
+        ''', src.params)
         rows = cursor.fetchall()
         
         return {
@@ -729,16 +665,18 @@ async def chart_discounts_by_process(filters: FilterRequest):
 
 
 @router.post("/charts/top-suppliers")
-async def chart_top_suppliers(filters: FilterRequest):
+@cached
+def chart_top_suppliers(filters: FilterRequest):
     """Top proveedores por monto"""
-    with get_db() as conn:
+    with get_analytics_db() as conn:
         cursor = conn.cursor()
-        cursor.execute('''
-            SELECT tercero_nombre, SUM(COALESCE(total, 0))
-            FROM oc_descuentos
-            WHERE tercero_nombre IS NOT NULL
-            GROUP BY tercero_nombre ORDER BY SUM(total) DESC LIMIT 10
-        ''')
+        src = descuentos_source(conn, dimension="tercero_nombre")
+        cursor.execute(f'''
+            SELECT {src.label('tercero_nombre')}, SUM(COALESCE(total, 0)) as total_monto
+            FROM {src.table} {src.where}
+            AND {src.key('tercero_nombre')} IS NOT NULL
+            GROUP BY {src.key('tercero_nombre')} ORDER BY total_monto DESC NULLS LAST, 1 NULLS FIRST LIMIT 10
+        ''', src.params)
         rows = cursor.fetchall()
         
         return {
@@ -751,9 +689,10 @@ async def chart_top_suppliers(filters: FilterRequest):
 
 
 @router.post("/charts/days-by-stage")
-async def chart_days_by_stage(filters: FilterRequest):
+@cached
+def chart_days_by_stage(filters: FilterRequest):
     """Días promedio por etapa"""
-    with get_db() as conn:
+    with get_analytics_db() as conn:
         cursor = conn.cursor()
         cursor.execute('''
             SELECT 
@@ -776,16 +715,18 @@ async def chart_days_by_stage(filters: FilterRequest):
 
 
 @router.post("/charts/spend-by-process")
-async def chart_spend_by_process(filters: FilterRequest):
+@cached
+def chart_spend_by_process(filters: FilterRequest):
     """Gasto por proceso"""
-    with get_db() as conn:
+    with get_analytics_db() as conn:
         cursor = conn.cursor()
-        cursor.execute('''
-            SELECT proceso, SUM(COALESCE(total, 0))
-            FROM oc_descuentos
-            WHERE proceso IS NOT NULL
-            GROUP BY proceso ORDER BY SUM(total) DESC LIMIT 10
-        ''')
+        src = descuentos_source(conn, dimension="proceso")
+        cursor.execute(f'''
+            SELECT {src.label('proceso')}, SUM(COALESCE(total, 0)) as total_monto
+            FROM {src.table} {src.where}
+            AND {src.key('proceso')} IS NOT NULL
+            GROUP BY {src.key('proceso')} ORDER BY total_monto DESC NULLS LAST, 1 NULLS FIRST LIMIT 10
+        ''', src.params)
         rows = cursor.fetchall()
         
         return {
@@ -795,3 +736,223 @@ async def chart_spend_by_process(filters: FilterRequest):
                 "amounts": [r[1] or 0 for r in rows]
             }
         }
+
+
+# ==================== DASHBOARD EN UNA PETICIÓN ====================
+# /dashboard calcula en una sola conexión los widgets que pide la página
+# (los mismos datos de /kpis y de cada /charts/*). Los widgets que salen
+# de los mismos totales o del mismo GROUP BY comparten una consulta: p. ej.
+# /kpis y days-by-stage leen los promedios de la misma pasada por
+# traza_req_oc, y los cuatro gráficos por proceso salen de una pasada por
+# el índice de cobertura de oc_descuentos por proceso.
+
+class DashboardRequest(FilterRequest):
+    widgets: Optional[List[str]] = None  # None = todos (ver DASHBOARD_WIDGETS)
+
+
+def scan_traza_totals(conn):
+    """Totales, promedios por etapa y pendientes de traza_req_oc"""
+    cursor = conn.cursor()
+    cursor.execute('''SELECT COUNT(*), COUNT(DISTINCT req_numero), COUNT(DISTINCT oc_numero),
+        AVG(COALESCE(dias_aprobar_rq, 0)), AVG(COALESCE(dias_generar_oc, 0)),
+        AVG(COALESCE(dias_aprobacion_oc, 0)), AVG(COALESCE(dias_recepcion_servicio, 0)),
+        AVG(COALESCE(dias_entrada_almacen, 0)),
+        SUM(CASE WHEN req_estado = 'PENDIENTE' OR req_estado LIKE '%PEND%' THEN 1 ELSE 0 END),
+        SUM(CASE WHEN oc_estado = 'PENDIENTE' OR oc_estado LIKE '%PEND%' THEN 1 ELSE 0 END)
+        FROM traza_req_oc''')
+    return cursor.fetchone()
+
+
+def scan_descuentos_totals(conn):
+    """Totales de oc_descuentos"""
+    cursor = conn.cursor()
+    cursor.execute('''SELECT COUNT(*), SUM(COALESCE(total_dcto, 0)), SUM(COALESCE(total, 0)),
+        COUNT(DISTINCT documento_num), AVG(COALESCE(porcentaje_descuento, 0))
+        FROM oc_descuentos''')
+    return cursor.fetchone()
+
+
+def scan_descuentos_by_proceso(conn):
+    """Por proceso: OC distintas, items, % descuento promedio, descuentos y total"""
+    cursor = conn.cursor()
+    src = rollups.raw_source(conn, "oc_descuentos")
+    cursor.execute(f'''
+        SELECT {src.label('proceso')}, COUNT(DISTINCT documento_num), COUNT(*),
+            AVG(COALESCE(porcentaje_descuento, 0)), SUM(COALESCE(total_dcto, 0)), SUM(COALESCE(total, 0))
+        FROM {src.table}
+        WHERE {src.key('proceso')} IS NOT NULL
+        GROUP BY {src.key('proceso')}
+    ''')
+    return cursor.fetchall()
+
+
+def scan_descuentos_by_tercero(conn):
+    """Por proveedor: descuentos y total"""
+    cursor = conn.cursor()
+    src = descuentos_source(conn, dimension="tercero_nombre")
+    cursor.execute(f'''
+        SELECT {src.label('tercero_nombre')}, SUM(COALESCE(total_dcto, 0)), SUM(COALESCE(total, 0))
+        FROM {src.table} {src.where}
+        AND {src.key('tercero_nombre')} IS NOT NULL
+        GROUP BY {src.key('tercero_nombre')}
+    ''', src.params)
+    return cursor.fetchall()
+
+
+DASHBOARD_SCANS = {
+    "traza_totales": scan_traza_totals,
+    "descuentos_totales": scan_descuentos_totals,
+    "descuentos_por_proceso": scan_descuentos_by_proceso,
+    "descuentos_por_tercero": scan_descuentos_by_tercero,
+}
+
+
+def top(rows, column, limit=10):
+    """Las `limit` filas con mayor valor en `column`, en el orden del ORDER BY
+    de los /charts (valor DESC NULLS LAST y, en empate, la etiqueta)"""
+    return sort_rows(rows, (column, True), (0, False))[:limit]
+
+
+def widget_kpis(conn, scans):
+    traza, desc = scans["traza_totales"], scans["descuentos_totales"]
+    return {
+        "totalRQ": traza[1] or 0,
+        "totalOC": traza[2] or 0,
+        "totalItems": traza[0] or 0,
+        "totalSpend": desc[2] or 0,
+        "percentDispatched": round(desc[4] or 0, 2),
+        "diasPromedioAprobarRQ": round(traza[3] or 0, 1),
+        "diasPromedioGenerarOC": round(traza[4] or 0, 1),
+        "diasPromedioAprobacionOC": round(traza[5] or 0, 1),
+        "diasPromedioRecepcionServicio": round(traza[6] or 0, 1),
+        "diasPromedioEntradaAlmacen": round(traza[7] or 0, 1),
+        "totalDescuentos": desc[1] or 0,
+        "pendientesAprobarRQ": traza[8] or 0,
+        "pendientesAprobarOC": traza[9] or 0
+    }
+
+
+def widget_oc_vs_items(conn, scans):
+    rows = top(scans["descuentos_por_proceso"], 2)
+    total_items = [r[2] for r in rows]
+    return {
+        "procesos": [r[0] or 'Sin Proceso' for r in rows],
+        "totalOC": [r[1] for r in rows],
+        "totalItems": total_items,
+        "total": sum(total_items)
+    }
+
+
+def widget_percent_discounts(conn, scans):
+    rows = top(scans["descuentos_por_proceso"], 3)
+    return {
+        "procesos": [r[0] or 'Sin Proceso' for r in rows],
+        "percentages": [round(r[3] or 0, 2) for r in rows],
+        "average": round(scans["descuentos_totales"][4] or 0, 2)
+    }
+
+
+def widget_top_suppliers_discounts(conn, scans):
+    total_general = scans["descuentos_totales"][1] or 1
+    rows = top(scans["descuentos_por_tercero"], 1)
+    montos = [r[1] or 0 for r in rows]
+    return {
+        "proveedores": [r[0] for r in rows],
+        "montos": montos,
+        "percentages": [(m / total_general * 100) if total_general > 0 else 0 for m in montos]
+    }
+
+
+def widget_discounts_by_process(conn, scans):
+    rows = top(scans["descuentos_por_proceso"], 4)
+    return {"processes": [r[0] for r in rows], "discounts": [r[4] or 0 for r in rows]}
+
+
+def widget_top_suppliers(conn, scans):
+    rows = top(scans["descuentos_por_tercero"], 2)
+    return {"suppliers": [r[0] for r in rows], "amounts": [r[2] or 0 for r in rows]}
+
+
+def widget_days_by_stage(conn, scans):
+    traza = scans["traza_totales"]
+    return {
+        "stages": ["Aprobar RQ", "Generar OC", "Aprobación OC", "Recepción Servicio", "Entrada Almacén"],
+        "days": [round(traza[i] or 0, 1) for i in range(3, 8)]
+    }
+
+
+def widget_spend_by_process(conn, scans):
+    rows = top(scans["descuentos_por_proceso"], 5)
+    return {"processes": [r[0] for r in rows], "amounts": [r[5] or 0 for r in rows]}
+
+
+# Widget (ruta de /charts o "kpis") -> (consultas compartidas que usa, función)
+DASHBOARD_WIDGETS = {
+    "kpis": (("traza_totales", "descuentos_totales"), widget_kpis),
+    "oc-vs-items-by-process": (("descuentos_por_proceso",), widget_oc_vs_items),
+    "percent-discounts-by-process": (("descuentos_por_proceso", "descuentos_totales"), widget_percent_discounts),
+    "top-suppliers-discounts": (("descuentos_por_tercero", "descuentos_totales"), widget_top_suppliers_discounts),
+    "avg-approval-days": ((), lambda conn, scans: avg_days_by_user(
+        conn, "req_usuario_autorizador", "dias_aprobar_rq", "aprobadores")),
+    "avg-generation-days": ((), lambda conn, scans: avg_days_by_user(
+        conn, "oc_usuario", "dias_generar_oc", "aprobadores")),
+    "avg-approval-management-days": ((), lambda conn, scans: avg_days_by_user(
+        conn, "oc_usuario_autorizacion", "dias_aprobacion_oc", "aprobadores")),
+    "avg-reception-service-days": ((), lambda conn, scans: avg_days_by_user(
+        conn, "entrega_servicio_usuario", "dias_recepcion_servicio", "usuarios")),
+    "avg-warehouse-entry-days": ((), lambda conn, scans: avg_days_by_user(
+        conn, "entrega_almacen_usuario", "dias_entrada_almacen", "usuarios")),
+    "pending-approve-rq": ((), lambda conn, scans: pending_by_user(conn, "req_estado", "req_usuario_autorizador")),
+    "pending-approve-oc": ((), lambda conn, scans: pending_by_user(conn, "oc_estado", "oc_usuario_autorizacion")),
+    "oc-by-state": ((), lambda conn, scans: oc_by_state(conn)),
+    "trend-oc": ((), lambda conn, scans: trend_oc(conn)),
+    "discounts-by-process": (("descuentos_por_proceso",), widget_discounts_by_process),
+    "top-suppliers": (("descuentos_por_tercero",), widget_top_suppliers),
+    "days-by-stage": (("traza_totales",), widget_days_by_stage),
+    "spend-by-process": (("descuentos_por_proceso",), widget_spend_by_process),
+}
+
+
+@router.post("/dashboard")
+@cached
+def get_dashboard(filters: DashboardRequest):
+    """KPIs y gráficos del dashboard en una sola petición.
+
+    widgets: nombres de DASHBOARD_WIDGETS (por defecto todos). Cada widget
+    trae lo mismo que "kpis" o "data" de su endpoint. tiempos_ms reparte el
+    tiempo de cada consulta compartida entre los widgets que la usan (una
+    respuesta desde la caché trae los tiempos del cálculo que la generó).
+    """
+    names = filters.widgets or list(DASHBOARD_WIDGETS)
+    unknown = [name for name in names if name not in DASHBOARD_WIDGETS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Widgets desconocidos: {', '.join(map(str, unknown))}")
+
+    start = time.perf_counter()
+    users = {}
+    for name in names:
+        for scan in DASHBOARD_WIDGETS[name][0]:
+            users[scan] = users.get(scan, 0) + 1
+
+    with get_analytics_db() as conn:
+        scans, scan_ms = {}, {}
+        for scan in users:
+            scan_start = time.perf_counter()
+            scans[scan] = DASHBOARD_SCANS[scan](conn)
+            scan_ms[scan] = (time.perf_counter() - scan_start) * 1000
+
+        widgets, widget_ms = {}, {}
+        for name in names:
+            used, build = DASHBOARD_WIDGETS[name]
+            widget_start = time.perf_counter()
+            widgets[name] = build(conn, scans)
+            elapsed = (time.perf_counter() - widget_start) * 1000
+            widget_ms[name] = round(elapsed + sum(scan_ms[scan] / users[scan] for scan in used), 2)
+
+    return {
+        "success": True,
+        "widgets": widgets,
+        "tiempos_ms": widget_ms,
+        "consultas_ms": {scan: round(ms, 2) for scan, ms in scan_ms.items()},
+        "total_ms": round((time.perf_counter() - start) * 1000, 2)
+    }
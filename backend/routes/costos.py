@@ -3,43 +3,25 @@ Rutas API para Costos Mensuales
 """
 from fastapi import APIRouter, Query
 from typing import Optional
-from ..database import get_db
+from ..analytics import get_analytics_db
+from ..database import get_read_db
+from ..response_cache import cached
+from ..schema import TABLES, distinct_values_sql
+from .. import analytics, rollups
 
 router = APIRouter(prefix="/api/costos", tags=["Costos Mensuales"])
 
+TABLE = "costos_mensuales"
 
-def build_where_clause(fecha_inicio, fecha_fin, catalogos, ciudades, terceros):
-    """Construir cláusula WHERE y parámetros"""
-    where_clause = "WHERE 1=1"
-    params = []
-    
-    if fecha_inicio:
-        where_clause += " AND fecha >= ?"
-        params.append(fecha_inicio)
-    if fecha_fin:
-        where_clause += " AND fecha <= ?"
-        params.append(fecha_fin)
-    if catalogos:
-        catalogo_list = catalogos.split(",")
-        placeholders = ",".join(["?" for _ in catalogo_list])
-        where_clause += f" AND catalogo IN ({placeholders})"
-        params.extend(catalogo_list)
-    if ciudades:
-        ciudad_list = ciudades.split(",")
-        placeholders = ",".join(["?" for _ in ciudad_list])
-        where_clause += f" AND ciudad IN ({placeholders})"
-        params.extend(ciudad_list)
-    if terceros:
-        tercero_list = terceros.split(",")
-        placeholders = ",".join(["?" for _ in tercero_list])
-        where_clause += f" AND tercero IN ({placeholders})"
-        params.extend(tercero_list)
-    
-    return where_clause, params
+
+def source(conn, fecha_inicio, fecha_fin, catalogos, ciudades, terceros, dimension=None):
+    """Agregados o tabla física según los filtros (ver rollups.py)"""
+    filters = {"catalogo": catalogos, "ciudad": ciudades, "tercero": terceros}
+    return rollups.source(conn, TABLE, fecha_inicio, fecha_fin, filters, dimension)
 
 
 @router.get("/datos")
-async def get_datos(
+def get_datos(
     fecha_inicio: Optional[str] = None,
     fecha_fin: Optional[str] = None,
     catalogos: Optional[str] = None,
@@ -48,33 +30,38 @@ async def get_datos(
     limit: int = Query(default=50000, le=150000)
 ):
     """Obtener datos de costos mensuales con filtros"""
-    with get_db() as conn:
+    with get_read_db() as conn:
         cursor = conn.cursor()
-        where_clause, params = build_where_clause(fecha_inicio, fecha_fin, catalogos, ciudades, terceros)
-        query = f"SELECT * FROM costos_mensuales {where_clause} ORDER BY fecha DESC LIMIT {limit}"
-        cursor.execute(query, params)
+        # Filtro y orden sobre la tabla física; solo las filas elegidas pasan por la vista
+        src = rollups.raw_source(conn, TABLE, fecha_inicio, fecha_fin,
+                                 {"catalogo": catalogos, "ciudad": ciudades, "tercero": terceros})
+        query = (f"SELECT * FROM {TABLE} WHERE id IN "
+                 f"(SELECT id FROM {src.table} {src.where} ORDER BY fecha DESC LIMIT {limit}) ORDER BY fecha DESC")
+        cursor.execute(query, src.params)
         rows = cursor.fetchall()
         return {"data": [dict(row) for row in rows], "total": len(rows)}
 
 
 @router.get("/filtros")
-async def get_filtros():
+@cached
+def get_filtros():
     """Obtener opciones disponibles para filtros"""
-    with get_db() as conn:
+    with get_read_db() as conn:
         cursor = conn.cursor()
-        cursor.execute("SELECT DISTINCT catalogo FROM costos_mensuales WHERE catalogo IS NOT NULL ORDER BY catalogo")
+        cursor.execute(distinct_values_sql(TABLES[TABLE], "catalogo"))
         catalogos = [row[0] for row in cursor.fetchall()]
-        cursor.execute("SELECT DISTINCT ciudad FROM costos_mensuales WHERE ciudad IS NOT NULL ORDER BY ciudad")
+        cursor.execute(distinct_values_sql(TABLES[TABLE], "ciudad"))
         ciudades = [row[0] for row in cursor.fetchall()]
-        cursor.execute("SELECT DISTINCT tercero FROM costos_mensuales WHERE tercero IS NOT NULL ORDER BY tercero")
+        cursor.execute(distinct_values_sql(TABLES[TABLE], "tercero"))
         terceros = [row[0] for row in cursor.fetchall()]
-        cursor.execute("SELECT MIN(fecha), MAX(fecha) FROM costos_mensuales")
+        cursor.execute(f"SELECT MIN(fecha), MAX(fecha) FROM {TABLES[TABLE].storage}")
         fecha_min, fecha_max = cursor.fetchone()
         return {"catalogos": catalogos, "ciudades": ciudades, "terceros": terceros, "fecha_min": fecha_min, "fecha_max": fecha_max}
 
 
 @router.get("/kpis")
-async def get_kpis(
+@cached
+def get_kpis(
     fecha_inicio: Optional[str] = None,
     fecha_fin: Optional[str] = None,
     catalogos: Optional[str] = None,
@@ -82,18 +69,21 @@ async def get_kpis(
     terceros: Optional[str] = None
 ):
     """Obtener KPIs de costos mensuales"""
-    with get_db() as conn:
+    with get_analytics_db() as conn:
         cursor = conn.cursor()
-        where_clause, params = build_where_clause(fecha_inicio, fecha_fin, catalogos, ciudades, terceros)
+        filtros = (fecha_inicio, fecha_fin, catalogos, ciudades, terceros)
         
-        cursor.execute(f"SELECT SUM(neto), COUNT(*) FROM costos_mensuales {where_clause}", params)
+        src = source(conn, *filtros)
+        cursor.execute(f"SELECT SUM(neto), {src.count} FROM {src.table} {src.where}", src.params)
         costo_total, registros = cursor.fetchone()
-        cursor.execute(f"SELECT COUNT(DISTINCT tercero) FROM costos_mensuales {where_clause}", params)
+        cursor.execute(f"SELECT COUNT(DISTINCT {src.month}) FROM {src.table} {src.where}", src.params)
+        meses = cursor.fetchone()[0] or 1
+        src = source(conn, *filtros, dimension="tercero")
+        cursor.execute(f"SELECT COUNT(DISTINCT {src.key('tercero')}) FROM {src.table} {src.where}", src.params)
         terceros_unicos = cursor.fetchone()[0]
-        cursor.execute(f"SELECT COUNT(DISTINCT catalogo) FROM costos_mensuales {where_clause}", params)
+        src = source(conn, *filtros, dimension="catalogo")
+        cursor.execute(f"SELECT COUNT(DISTINCT {src.key('catalogo')}) FROM {src.table} {src.where}", src.params)
         catalogos_unicos = cursor.fetchone()[0]
-        cursor.execute(f"SELECT COUNT(DISTINCT strftime('%Y-%m', fecha)) FROM costos_mensuales {where_clause}", params)
-        meses = cursor.fetchone()[0] or 1
         
         return {
             "costo_total": costo_total or 0,
@@ -105,54 +95,127 @@ async def get_kpis(
 
 
 @router.get("/grafico/mensual")
-async def get_mensual(
+@cached
+def get_mensual(
     fecha_inicio: Optional[str] = None, fecha_fin: Optional[str] = None,
     catalogos: Optional[str] = None, ciudades: Optional[str] = None, terceros: Optional[str] = None
 ):
     """Datos para gráfico de costos mensuales"""
-    with get_db() as conn:
+    with get_analytics_db() as conn:
         cursor = conn.cursor()
-        where_clause, params = build_where_clause(fecha_inicio, fecha_fin, catalogos, ciudades, terceros)
-        cursor.execute(f"SELECT strftime('%Y-%m', fecha) as mes, SUM(neto) as total FROM costos_mensuales {where_clause} GROUP BY mes ORDER BY mes", params)
+        src = source(conn, fecha_inicio, fecha_fin, catalogos, ciudades, terceros)
+        cursor.execute(f"SELECT {src.month} as mes, SUM(neto) as total FROM {src.table} {src.where} GROUP BY mes ORDER BY mes NULLS FIRST", src.params)
         return [{"mes": row[0], "total": row[1]} for row in cursor.fetchall()]
 
 
 @router.get("/grafico/catalogo")
-async def get_por_catalogo(
+@cached
+def get_por_catalogo(
     fecha_inicio: Optional[str] = None, fecha_fin: Optional[str] = None,
     catalogos: Optional[str] = None, ciudades: Optional[str] = None, terceros: Optional[str] = None
 ):
     """Datos para gráfico por catálogo"""
-    with get_db() as conn:
+    with get_analytics_db() as conn:
         cursor = conn.cursor()
-        where_clause, params = build_where_clause(fecha_inicio, fecha_fin, catalogos, ciudades, terceros)
-        cursor.execute(f"SELECT catalogo, SUM(neto) as total FROM costos_mensuales {where_clause} GROUP BY catalogo ORDER BY total DESC", params)
+        src = source(conn, fecha_inicio, fecha_fin, catalogos, ciudades, terceros, dimension="catalogo")
+        cursor.execute(f"SELECT {src.label('catalogo')}, SUM(neto) as total FROM {src.table} {src.where} GROUP BY {src.key('catalogo')} ORDER BY total DESC NULLS LAST, 1 NULLS FIRST", src.params)
         return [{"catalogo": row[0], "total": row[1]} for row in cursor.fetchall()]
 
 
 @router.get("/grafico/ciudad")
-async def get_por_ciudad(
+@cached
+def get_por_ciudad(
     fecha_inicio: Optional[str] = None, fecha_fin: Optional[str] = None,
     catalogos: Optional[str] = None, ciudades: Optional[str] = None, terceros: Optional[str] = None,
     limit: int = 10
 ):
     """Datos para gráfico por ciudad (Top N)"""
-    with get_db() as conn:
+    with get_analytics_db() as conn:
         cursor = conn.cursor()
-        where_clause, params = build_where_clause(fecha_inicio, fecha_fin, catalogos, ciudades, terceros)
-        cursor.execute(f"SELECT ciudad, SUM(neto) as total FROM costos_mensuales {where_clause} GROUP BY ciudad ORDER BY total DESC LIMIT {limit}", params)
+        src = source(conn, fecha_inicio, fecha_fin, catalogos, ciudades, terceros, dimension="ciudad")
+        cursor.execute(f"SELECT {src.label('ciudad')}, SUM(neto) as total FROM {src.table} {src.where} GROUP BY {src.key('ciudad')} ORDER BY total DESC NULLS LAST, 1 NULLS FIRST LIMIT {limit}", src.params)
         return [{"ciudad": row[0], "total": row[1]} for row in cursor.fetchall()]
 
 
 @router.get("/grafico/tercero")
-async def get_por_tercero(
+@cached
+def get_por_tercero(
     fecha_inicio: Optional[str] = None, fecha_fin: Optional[str] = None,
     catalogos: Optional[str] = None, ciudades: Optional[str] = None, terceros: Optional[str] = None,
     limit: int = 10
 ):
     """Datos para gráfico por tercero (Top N)"""
-    with get_db() as conn:
+    with get_analytics_db() as conn:
         cursor = conn.cursor()
-        where_clause, params = build_where_clause(fecha_inicio, fecha_fin, catalogos, ciudades, terceros)
-        cursor.execute(f"SELECT tercero, SUM(neto) as total FROM costos_mensuales {where_clause} GROUP BY tercero ORDER BY total DESC LIMIT {limit}", params)
+        src = source(conn, fecha_inicio, fecha_fin, catalogos, ciudades, terceros, dimension="tercero")
+        cursor.execute(f"SELECT {src.label('tercero')}, SUM(neto) as total FROM {src.table} {src.where} GROUP BY {src.key('tercero')} ORDER BY total DESC NULLS LAST, 1 NULLS FIRST LIMIT {limit}", src.params)
         return [{"tercero": row[0], "total": row[1]} for row in cursor.fetchall()]
+
+
+def dashboard_one_pass(conn, filtros, limit):
+    """KPIs y gráficos en una pasada: por los agregados o, con DuckDB, por las filas filtradas.
+
+    Retorna None si hay que consultar la tabla física en SQLite (filtros
+    IN o sin agregados): ahí se usan las consultas de cada endpoint.
+    """
+    filters = {"catalogo": filtros[2], "ciudad": filtros[3], "tercero": filtros[4]}
+    groups = rollups.grouping_sets(conn, TABLE, filtros[0], filtros[1], filters, ["neto", "registros"])
+    if groups is None:
+        if not analytics.is_duckdb(conn):
+            return None
+        src = rollups.raw_source(conn, TABLE, filtros[0], filtros[1], filters)
+        columns = {"mes": (src.month, src.month)}
+        columns.update({column: (src.key(column), src.label(column)) for column in filters})
+        groups = analytics.grouping_sets(conn, src, columns, ["SUM(neto)", "COUNT(*)"])
+
+    def ranking(rows, limit=None):
+        # Mismo orden que las consultas de cada endpoint (ver analytics.sort_rows)
+        return analytics.sort_rows(rows, (1, True), (0, False))[:limit]
+
+    costo_total, registros = groups[""]
+    meses = sum(1 for row in groups["mes"] if row[0] is not None) or 1
+    return {
+        "kpis": {
+            "costo_total": costo_total or 0,
+            "registros": registros or 0,
+            "terceros_unicos": sum(1 for row in groups["tercero"] if row[0] is not None),
+            "catalogos_unicos": sum(1 for row in groups["catalogo"] if row[0] is not None),
+            "promedio_mensual": (costo_total or 0) / meses
+        },
+        "mensual": [{"mes": row[0], "total": row[1]}
+                    for row in analytics.sort_rows(groups["mes"], (0, False))],
+        "catalogo": [{"catalogo": row[0], "total": row[1]} for row in ranking(groups["catalogo"])],
+        "ciudad": [{"ciudad": row[0], "total": row[1]} for row in ranking(groups["ciudad"], limit)],
+        "tercero": [{"tercero": row[0], "total": row[1]} for row in ranking(groups["tercero"], limit)]
+    }
+
+
+@router.get("/dashboard")
+@cached
+def get_dashboard(
+    fecha_inicio: Optional[str] = None, fecha_fin: Optional[str] = None,
+    catalogos: Optional[str] = None, ciudades: Optional[str] = None, terceros: Optional[str] = None,
+    limit: int = 10
+):
+    """KPIs, filtros y los cuatro gráficos del tablero en una sola respuesta.
+
+    Los KPIs y gráficos salen de una sola consulta: sobre las tablas de
+    agregados si no hay filtros IN (rollups.grouping_sets), o con DuckDB
+    una pasada por las filas filtradas (GROUPING SETS). En SQLite sin
+    agregados cada parte tiene su índice de cobertura y una pasada por la
+    tabla física es mucho más lenta que consultarlas por separado (ver
+    benchmarks/dashboards.py): se usan las consultas de cada endpoint.
+    """
+    filtros = (fecha_inicio, fecha_fin, catalogos, ciudades, terceros)
+    with get_analytics_db() as conn:
+        result = dashboard_one_pass(conn, filtros, limit)
+    if result is None:
+        result = {
+            "kpis": get_kpis(*filtros),
+            "mensual": get_mensual(*filtros),
+            "catalogo": get_por_catalogo(*filtros),
+            "ciudad": get_por_ciudad(*filtros, limit=limit),
+            "tercero": get_por_tercero(*filtros, limit=limit)
+        }
+    result["filtros"] = get_filtros()
+    return result
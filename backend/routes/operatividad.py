@@ -3,43 +3,25 @@ Rutas API para Operatividad de Vehículos
 """
 from fastapi import APIRouter, Query
 from typing import Optional
-from ..database import get_db
+from ..analytics import get_analytics_db
+from ..database import get_read_db
+from ..response_cache import cached
+from ..schema import TABLES, distinct_values_sql
+from .. import analytics, rollups
 
 router = APIRouter(prefix="/api/operatividad", tags=["Operatividad Vehículos"])
 
+TABLE = "operatividad_vehiculos"
 
-def build_where_clause(fecha_inicio, fecha_fin, sedes, estados, placas):
-    """Construir cláusula WHERE y parámetros"""
-    where_clause = "WHERE 1=1"
-    params = []
-    
-    if fecha_inicio:
-        where_clause += " AND fecha_ejecucion >= ?"
-        params.append(fecha_inicio)
-    if fecha_fin:
-        where_clause += " AND fecha_ejecucion <= ?"
-        params.append(fecha_fin)
-    if sedes:
-        sede_list = sedes.split(",")
-        placeholders = ",".join(["?" for _ in sede_list])
-        where_clause += f" AND sede IN ({placeholders})"
-        params.extend(sede_list)
-    if estados:
-        estado_list = estados.split(",")
-        placeholders = ",".join(["?" for _ in estado_list])
-        where_clause += f" AND estado_vehiculo IN ({placeholders})"
-        params.extend(estado_list)
-    if placas:
-        placa_list = placas.split(",")
-        placeholders = ",".join(["?" for _ in placa_list])
-        where_clause += f" AND placa IN ({placeholders})"
-        params.extend(placa_list)
-    
-    return where_clause, params
+
+def source(conn, fecha_inicio, fecha_fin, sedes, estados, placas, dimension=None, by_day=False):
+    """Agregados o tabla física según los filtros (ver rollups.py)"""
+    filters = {"sede": sedes, "estado_vehiculo": estados, "placa": placas}
+    return rollups.source(conn, TABLE, fecha_inicio, fecha_fin, filters, dimension, by_day)
 
 
 @router.get("/datos")
-async def get_datos(
+def get_datos(
     fecha_inicio: Optional[str] = None,
     fecha_fin: Optional[str] = None,
     sedes: Optional[str] = None,
@@ -48,48 +30,59 @@ async def get_datos(
     limit: int = Query(default=100000, le=150000)
 ):
     """Obtener datos de operatividad con filtros"""
-    with get_db() as conn:
+    with get_read_db() as conn:
         cursor = conn.cursor()
-        where_clause, params = build_where_clause(fecha_inicio, fecha_fin, sedes, estados, placas)
-        query = f"SELECT * FROM operatividad_vehiculos {where_clause} ORDER BY fecha_ejecucion DESC LIMIT {limit}"
-        cursor.execute(query, params)
+        # Filtro y orden sobre la tabla física; solo las filas elegidas pasan por la vista
+        src = rollups.raw_source(conn, TABLE, fecha_inicio, fecha_fin,
+                                 {"sede": sedes, "estado_vehiculo": estados, "placa": placas})
+        query = (f"SELECT * FROM {TABLE} WHERE id IN (SELECT id FROM {src.table} {src.where} "
+                 f"ORDER BY fecha_ejecucion DESC LIMIT {limit}) ORDER BY fecha_ejecucion DESC")
+        cursor.execute(query, src.params)
         rows = cursor.fetchall()
         return {"data": [dict(row) for row in rows], "total": len(rows)}
 
 
 @router.get("/filtros")
-async def get_filtros():
+@cached
+def get_filtros():
     """Obtener opciones disponibles para filtros"""
-    with get_db() as conn:
+    with get_read_db() as conn:
         cursor = conn.cursor()
-        cursor.execute("SELECT DISTINCT sede FROM operatividad_vehiculos WHERE sede IS NOT NULL ORDER BY sede")
+        cursor.execute(distinct_values_sql(TABLES[TABLE], "sede"))
         sedes = [row[0] for row in cursor.fetchall()]
-        cursor.execute("SELECT DISTINCT estado_vehiculo FROM operatividad_vehiculos WHERE estado_vehiculo IS NOT NULL ORDER BY estado_vehiculo")
+        cursor.execute(distinct_values_sql(TABLES[TABLE], "estado_vehiculo"))
         estados = [row[0] for row in cursor.fetchall()]
-        cursor.execute("SELECT DISTINCT placa FROM operatividad_vehiculos WHERE placa IS NOT NULL ORDER BY placa")
+        cursor.execute(distinct_values_sql(TABLES[TABLE], "placa"))
         placas = [row[0] for row in cursor.fetchall()]
-        cursor.execute("SELECT MIN(fecha_ejecucion), MAX(fecha_ejecucion) FROM operatividad_vehiculos")
+        cursor.execute(f"SELECT MIN(fecha_ejecucion), MAX(fecha_ejecucion) FROM {TABLES[TABLE].storage}")
         fecha_min, fecha_max = cursor.fetchone()
         return {"sedes": sedes, "estados": estados, "placas": placas, "fecha_min": fecha_min, "fecha_max": fecha_max}
 
 
 @router.get("/kpis")
-async def get_kpis(
+@cached
+def get_kpis(
     fecha_inicio: Optional[str] = None, fecha_fin: Optional[str] = None,
     sedes: Optional[str] = None, estados: Optional[str] = None, placas: Optional[str] = None
 ):
     """Obtener KPIs de operatividad"""
-    with get_db() as conn:
+    with get_analytics_db() as conn:
         cursor = conn.cursor()
-        where_clause, params = build_where_clause(fecha_inicio, fecha_fin, sedes, estados, placas)
+        filtros = (fecha_inicio, fecha_fin, sedes, estados, placas)
         
+        src = source(conn, *filtros, by_day=True)
         cursor.execute(f'''
             SELECT SUM(vehiculos_programados), SUM(vehiculos_operativos), SUM(dias_en_taller),
-                   COUNT(DISTINCT placa), COUNT(DISTINCT estado_vehiculo),
-                   MIN(fecha_ejecucion), MAX(fecha_ejecucion)
-            FROM operatividad_vehiculos {where_clause}
-        ''', params)
+                   MIN({src.day}), MAX({src.day})
+            FROM {src.table} {src.where}
+        ''', src.params)
         row = cursor.fetchone()
+        src = source(conn, *filtros, dimension="placa")
+        cursor.execute(f"SELECT COUNT(DISTINCT {src.key('placa')}) FROM {src.table} {src.where}", src.params)
+        placas_unicas = cursor.fetchone()[0]
+        src = source(conn, *filtros, dimension="estado_vehiculo")
+        cursor.execute(f"SELECT COUNT(DISTINCT {src.key('estado_vehiculo')}) FROM {src.table} {src.where}", src.params)
+        estados_unicos = cursor.fetchone()[0]
         programados = row[0] or 0
         operativos = row[1] or 0
         pct_operacion = (operativos / programados * 100) if programados > 0 else 0
@@ -99,27 +92,28 @@ async def get_kpis(
             "vehiculos_programados": programados,
             "vehiculos_operativos": operativos,
             "dias_taller": row[2] or 0,
-            "placas_unicas": row[3] or 0,
-            "estados": row[4] or 0,
-            "fecha_min": row[5],
-            "fecha_max": row[6]
+            "placas_unicas": placas_unicas or 0,
+            "estados": estados_unicos or 0,
+            "fecha_min": row[3],
+            "fecha_max": row[4]
         }
 
 
 @router.get("/grafico/diario")
-async def get_diaria(
+@cached
+def get_diaria(
     fecha_inicio: Optional[str] = None, fecha_fin: Optional[str] = None,
     sedes: Optional[str] = None, estados: Optional[str] = None, placas: Optional[str] = None
 ):
     """Datos para gráfico de operación diaria"""
-    with get_db() as conn:
+    with get_analytics_db() as conn:
         cursor = conn.cursor()
-        where_clause, params = build_where_clause(fecha_inicio, fecha_fin, sedes, estados, placas)
+        src = source(conn, fecha_inicio, fecha_fin, sedes, estados, placas, by_day=True)
         cursor.execute(f'''
-            SELECT fecha_ejecucion, SUM(vehiculos_programados), SUM(vehiculos_operativos)
-            FROM operatividad_vehiculos {where_clause}
-            GROUP BY fecha_ejecucion ORDER BY fecha_ejecucion
-        ''', params)
+            SELECT {src.day}, SUM(vehiculos_programados), SUM(vehiculos_operativos)
+            FROM {src.table} {src.where}
+            GROUP BY {src.day} ORDER BY {src.day} NULLS FIRST
+        ''', src.params)
         results = []
         for row in cursor.fetchall():
             programados, operativos = row[1] or 0, row[2] or 0
@@ -129,19 +123,20 @@ async def get_diaria(
 
 
 @router.get("/grafico/sede")
-async def get_por_sede(
+@cached
+def get_por_sede(
     fecha_inicio: Optional[str] = None, fecha_fin: Optional[str] = None,
     sedes: Optional[str] = None, estados: Optional[str] = None, placas: Optional[str] = None
 ):
     """Datos para gráfico por sede"""
-    with get_db() as conn:
+    with get_analytics_db() as conn:
         cursor = conn.cursor()
-        where_clause, params = build_where_clause(fecha_inicio, fecha_fin, sedes, estados, placas)
+        src = source(conn, fecha_inicio, fecha_fin, sedes, estados, placas, dimension="sede")
         cursor.execute(f'''
-            SELECT sede, SUM(vehiculos_programados), SUM(vehiculos_operativos)
-            FROM operatividad_vehiculos {where_clause}
-            GROUP BY sede ORDER BY SUM(vehiculos_operativos) DESC
-        ''', params)
+            SELECT {src.label('sede')}, SUM(vehiculos_programados), SUM(vehiculos_operativos)
+            FROM {src.table} {src.where}
+            GROUP BY {src.key('sede')} ORDER BY SUM(vehiculos_operativos) DESC NULLS LAST, 1 NULLS FIRST
+        ''', src.params)
         results = []
         for row in cursor.fetchall():
             programados, operativos = row[1] or 0, row[2] or 0
@@ -151,32 +146,114 @@ async def get_por_sede(
 
 
 @router.get("/grafico/estado")
-async def get_por_estado(
+@cached
+def get_por_estado(
     fecha_inicio: Optional[str] = None, fecha_fin: Optional[str] = None,
     sedes: Optional[str] = None, estados: Optional[str] = None, placas: Optional[str] = None
 ):
     """Datos para gráfico por estado"""
-    with get_db() as conn:
+    with get_analytics_db() as conn:
         cursor = conn.cursor()
-        where_clause, params = build_where_clause(fecha_inicio, fecha_fin, sedes, estados, placas)
-        cursor.execute(f"SELECT estado_vehiculo, COUNT(*) FROM operatividad_vehiculos {where_clause} GROUP BY estado_vehiculo ORDER BY COUNT(*) DESC", params)
+        src = source(conn, fecha_inicio, fecha_fin, sedes, estados, placas, dimension="estado_vehiculo")
+        cursor.execute(f"SELECT {src.label('estado_vehiculo')}, {src.count} FROM {src.table} {src.where} GROUP BY {src.key('estado_vehiculo')} ORDER BY {src.count} DESC, 1 NULLS FIRST", src.params)
         return [{"estado": row[0], "cantidad": row[1]} for row in cursor.fetchall()]
 
 
 @router.get("/grafico/taller")
-async def get_top_dias_taller(
+@cached
+def get_top_dias_taller(
     fecha_inicio: Optional[str] = None, fecha_fin: Optional[str] = None,
     sedes: Optional[str] = None, estados: Optional[str] = None, placas: Optional[str] = None,
     limit: int = 10
 ):
     """Top placas por días en taller"""
-    with get_db() as conn:
+    with get_analytics_db() as conn:
         cursor = conn.cursor()
-        where_clause, params = build_where_clause(fecha_inicio, fecha_fin, sedes, estados, placas)
+        src = source(conn, fecha_inicio, fecha_fin, sedes, estados, placas, dimension="placa")
         cursor.execute(f'''
-            SELECT placa, SUM(dias_en_taller) as total_dias
-            FROM operatividad_vehiculos {where_clause}
-            GROUP BY placa HAVING total_dias > 0
-            ORDER BY total_dias DESC LIMIT {limit}
-        ''', params)
+            SELECT {src.label('placa')}, SUM(dias_en_taller) as total_dias
+            FROM {src.table} {src.where}
+            GROUP BY {src.key('placa')} HAVING total_dias > 0
+            ORDER BY total_dias DESC, 1 NULLS FIRST LIMIT {limit}
+        ''', src.params)
         return [{"placa": row[0], "dias": row[1]} for row in cursor.fetchall()]
+
+
+def dashboard_one_pass(conn, filtros, limit):
+    """KPIs y gráficos en una pasada: por los agregados o, con DuckDB, por las filas filtradas.
+
+    Retorna None si hay que consultar la tabla física en SQLite (filtros
+    IN o sin agregados): ahí se usan las consultas de cada endpoint.
+    """
+    filters = {"sede": filtros[2], "estado_vehiculo": filtros[3], "placa": filtros[4]}
+    groups = rollups.grouping_sets(conn, TABLE, filtros[0], filtros[1], filters,
+                                   ["vehiculos_programados", "vehiculos_operativos", "dias_en_taller", "registros"],
+                                   by_day=True)
+    if groups is None:
+        if not analytics.is_duckdb(conn):
+            return None
+        src = rollups.raw_source(conn, TABLE, filtros[0], filtros[1], filters)
+        columns = {"dia": (src.day, src.day)}
+        columns.update({column: (src.key(column), src.label(column)) for column in filters})
+        groups = analytics.grouping_sets(conn, src, columns, [
+            "SUM(vehiculos_programados)", "SUM(vehiculos_operativos)", "SUM(dias_en_taller)", "COUNT(*)"])
+
+    def operacion(key, row):
+        programados, operativos = row[1] or 0, row[2] or 0
+        pct = (operativos / programados * 100) if programados > 0 else 0
+        return {key: row[0], "programados": programados, "operativos": operativos, "pct_operacion": round(pct, 1)}
+
+    programados, operativos, dias_taller, _ = groups[""]
+    programados, operativos = programados or 0, operativos or 0
+    dias = sorted((row for row in groups["dia"] if row[0] is not None), key=lambda row: row[0])
+    taller = [row for row in groups["placa"] if (row[3] or 0) > 0]
+    return {
+        "kpis": {
+            "pct_operacion": round((operativos / programados * 100) if programados > 0 else 0, 1),
+            "vehiculos_programados": programados,
+            "vehiculos_operativos": operativos,
+            "dias_taller": dias_taller or 0,
+            "placas_unicas": sum(1 for row in groups["placa"] if row[0] is not None),
+            "estados": sum(1 for row in groups["estado_vehiculo"] if row[0] is not None),
+            "fecha_min": dias[0][0] if dias else None,
+            "fecha_max": dias[-1][0] if dias else None
+        },
+        # Mismo orden que las consultas de cada endpoint (ver analytics.sort_rows)
+        "diario": [operacion("fecha", row) for row in analytics.sort_rows(groups["dia"], (0, False))],
+        "sede": [operacion("sede", row) for row in analytics.sort_rows(groups["sede"], (2, True), (0, False))],
+        "estado": [{"estado": row[0], "cantidad": row[4]}
+                   for row in analytics.sort_rows(groups["estado_vehiculo"], (4, True), (0, False))],
+        "taller": [{"placa": row[0], "dias": row[3]}
+                   for row in analytics.sort_rows(taller, (3, True), (0, False))[:limit]]
+    }
+
+
+@router.get("/dashboard")
+@cached
+def get_dashboard(
+    fecha_inicio: Optional[str] = None, fecha_fin: Optional[str] = None,
+    sedes: Optional[str] = None, estados: Optional[str] = None, placas: Optional[str] = None,
+    limit: int = 10
+):
+    """KPIs, filtros y los cuatro gráficos del tablero en una sola respuesta.
+
+    Los KPIs y gráficos salen de una sola consulta: sobre las tablas de
+    agregados si no hay filtros IN (rollups.grouping_sets), o con DuckDB
+    una pasada por las filas filtradas (GROUPING SETS). En SQLite sin
+    agregados cada parte tiene su índice de cobertura y una pasada por la
+    tabla física es mucho más lenta que consultarlas por separado (ver
+    benchmarks/dashboards.py): se usan las consultas de cada endpoint.
+    """
+    filtros = (fecha_inicio, fecha_fin, sedes, estados, placas)
+    with get_analytics_db() as conn:
+        result = dashboard_one_pass(conn, filtros, limit)
+    if result is None:
+        result = {
+            "kpis": get_kpis(*filtros),
+            "diario": get_diaria(*filtros),
+            "sede": get_por_sede(*filtros),
+            "estado": get_por_estado(*filtros),
+            "taller": get_top_dias_taller(*filtros, limit=limit)
+        }
+    result["filtros"] = get_filtros()
+    return result
@@ -0,0 +1,506 @@
+"""
+Registro de esquema de las tablas importadas desde Excel
+
+Cada tabla declara una sola vez sus columnas (encabezado en el Excel,
+columna en la BD, tipo SQL y conversor), su clave natural y sus índices.
+De aquí salen el DDL de init_db(), los INSERT del importador y las
+conversiones por columna que import_data compila al cargar el módulo.
+
+Los índices siguen la forma de las consultas de la API: compuestos que
+empiezan por la columna filtrada o agrupada e incluyen las columnas
+sumadas, para que la consulta se resuelva solo con el índice. Cambiar
+un índice en una BD existente requiere una migración (ver MIGRATIONS en
+database.py); `python -m backend.benchmarks.query_plans` verifica que
+cada endpoint los use.
+
+Columnas con diccionario (Column.dictionary): los textos muy repetidos
+(tercero, placa, sede, estado...) se guardan una sola vez en una tabla
+dim_<nombre> (id, valor) y la fila guarda solo la clave entera
+(<columna>_id). Las tablas con alguna columna así se guardan como
+<tabla>_datos, y una vista con el nombre original expone las columnas
+de texto, así que las consultas que no necesitan las claves no cambian.
+
+Partes de fecha (Table.date_parts): para las columnas de fecha por las
+que se agrupa, la tabla física guarda también el mes (<columna>_mes,
+'YYYY-MM') y la semana ISO (<columna>_semana, 'YYYY-Www'), indexables.
+Las calculan los mismos INSERT/UPDATE del importador a partir del
+parámetro de la fecha, así que se llenan con cualquier modo de
+importación. (No son columnas GENERATED: SQLite no usa un índice como
+de cobertura para ellas.) Igual que con los diccionarios, la tabla
+física pasa a ser <tabla>_datos y la vista expone solo las columnas
+originales.
+
+Conversores:
+- "valor": textos con corrección de codificación; fechas/horas a texto
+- "fecha": fechas truncadas a YYYY-MM-DD
+- "monto": textos con "$", comas o espacios convertidos a número
+"""
+from typing import NamedTuple
+
+
+class Column(NamedTuple):
+    source: str              # Encabezado en el Excel
+    name: str                # Columna en la BD
+    sql_type: str = "TEXT"
+    converter: str = "valor"
+    dictionary: str = None   # Dimensión (dim_<nombre>) donde se guardan sus valores
+
+    @property
+    def storage(self):
+        """Columna física: la clave entera si la columna tiene diccionario"""
+        return f"{self.name}_id" if self.dictionary else self.name
+
+
+class Rollup(NamedTuple):
+    table: str               # Tabla original
+    date_column: str
+    dimensions: tuple        # Columnas con totales propios por período
+    measures: tuple          # Columnas sumadas
+
+
+class Table(NamedTuple):
+    name: str
+    columns: tuple           # Columnas importadas, en orden
+    natural_key: tuple       # Identifica una fila en la importación delta
+    indexes: tuple = ()      # (nombre, columnas)
+    null_values: tuple = ()  # Textos que se importan como NULL en cualquier columna
+    date_parts: tuple = ()   # Columnas de fecha con mes y semana guardados (ver DATE_PARTS)
+
+    @property
+    def storage(self):
+        """Tabla física: <tabla>_datos si tiene columnas con diccionario o partes de fecha"""
+        if self.date_parts or any(column.dictionary for column in self.columns):
+            return f"{self.name}_datos"
+        return self.name
+
+
+# Columnas que toda tabla importada agrega a las del Excel
+ID_COLUMN = "id INTEGER PRIMARY KEY AUTOINCREMENT"
+EXTRA_COLUMNS = (
+    ("row_hash", "INTEGER"),  # Huella de contenido de la fila (importación delta)
+    ("created_at", "TIMESTAMP DEFAULT CURRENT_TIMESTAMP"),
+)
+
+# Columnas internas de la tabla física que la vista (y con ella la API) no expone
+STORAGE_ONLY_COLUMNS = ("row_hash",)
+
+# Partes guardadas de las columnas de Table.date_parts: sufijo -> expresión.
+# La semana ISO es la del jueves de la semana (lunes a domingo) de la fecha;
+# strftime('%V') no existe en todas las versiones de SQLite. Las fechas que
+# SQLite no reconoce quedan con NULL, igual que con strftime sobre la fila.
+DATE_PARTS = {
+    "mes": "strftime('%Y-%m', {column})",
+    "semana": "strftime('%Y', {column}, '-3 days', 'weekday 4') || '-W' || "
+              "printf('%02d', (strftime('%j', {column}, '-3 days', 'weekday 4') + 6) / 7)",
+}
+
+
+_TABLES = (
+    # Costos Mensuales
+    Table(
+        name="costos_mensuales",
+        columns=(
+            Column("Fecha", "fecha", "TEXT", "fecha"),
+            Column("Catalogo", "catalogo", "TEXT", dictionary="catalogo"),
+            Column("Neto", "neto", "REAL"),
+            Column("Ciudad|Descripción", "ciudad", "TEXT", dictionary="ciudad"),
+            Column("Proyecto|Nombre", "proyecto", "TEXT"),
+            Column("Tercero|Nombre", "tercero", "TEXT", dictionary="tercero"),
+            Column("Descripción", "descripcion", "TEXT"),
+        ),
+        natural_key=("fecha", "catalogo", "tercero"),
+        indexes=(
+            # Filtro por rango de fechas con las demás columnas de filtro y la suma
+            ("idx_costos_fecha_cobertura", "fecha, catalogo, ciudad, tercero, neto, fecha_mes"),
+            # Totales y meses distintos sin filtro de fechas, ya en orden de mes
+            ("idx_costos_mes_cobertura", "fecha_mes, catalogo, ciudad, tercero, neto"),
+            # GROUP BY de los gráficos (y filtro IN) sin leer la tabla
+            ("idx_costos_catalogo_cobertura", "catalogo, fecha, neto"),
+            ("idx_costos_ciudad_cobertura", "ciudad, fecha, neto"),
+            ("idx_costos_tercero_cobertura", "tercero, fecha, neto"),
+        ),
+        date_parts=("fecha",),
+    ),
+
+    # Operatividad Vehículos
+    Table(
+        name="operatividad_vehiculos",
+        columns=(
+            Column("Fecha ejecucion", "fecha_ejecucion", "TEXT", "fecha"),
+            Column("placa", "placa", "TEXT", dictionary="placa"),
+            Column("Tipo vehiculo", "tipo_vehiculo", "TEXT"),
+            Column("Sede", "sede", "TEXT", dictionary="sede"),
+            Column("Estado Vehiculo", "estado_vehiculo", "TEXT", dictionary="estado"),
+            Column("Brigada", "brigada", "TEXT"),
+            Column("Conductor", "conductor", "TEXT"),
+            Column("Contrato", "contrato", "TEXT"),
+            Column("GPS", "gps", "TEXT"),
+            Column("justificacion no salida", "justificacion_no_salida", "TEXT"),
+            Column("Tipo de Daño", "tipo_dano", "TEXT"),
+            Column("Daño inoperatividad", "dano_inoperatividad", "TEXT"),
+            Column("Motivo de inoperatividad", "motivo_inoperatividad", "TEXT"),
+            Column("Observacion inoperatividad", "observacion_inoperatividad", "TEXT"),
+            Column("Tipo Mantenimiento", "tipo_mantenimiento", "TEXT"),
+            Column("Km mantenimiento", "km_mantenimiento", "REAL"),
+            Column("Vehiculos programados", "vehiculos_programados", "REAL"),
+            Column("Vehiculos operativos", "vehiculos_operativos", "REAL"),
+            Column("Dias en taller", "dias_en_taller", "REAL"),
+            Column("Propietario", "propietario", "TEXT"),
+            Column("Indicador", "indicador", "REAL"),
+        ),
+        natural_key=("fecha_ejecucion", "placa"),
+        indexes=(
+            ("idx_operatividad_fecha_cobertura",
+             "fecha_ejecucion, sede, placa, estado_vehiculo, "
+             "vehiculos_programados, vehiculos_operativos, dias_en_taller"),
+            ("idx_operatividad_sede_cobertura",
+             "sede, fecha_ejecucion, vehiculos_programados, vehiculos_operativos"),
+            ("idx_operatividad_estado_fecha", "estado_vehiculo, fecha_ejecucion"),
+            ("idx_operatividad_placa_cobertura", "placa, fecha_ejecucion, dias_en_taller"),
+        ),
+        date_parts=("fecha_ejecucion",),
+    ),
+
+    # ========== TABLAS PARA COMPRAS ==========
+
+    # TRAZA REQ OC (Trazabilidad Requisición a OC)
+    Table(
+        name="traza_req_oc",
+        columns=(
+            Column("Requisición|Fecha Entrega", "req_fecha_entrega", "TEXT", "fecha"),
+            Column("Requisición|Fecha", "req_fecha", "TEXT", "fecha"),
+            Column("Requisición|Usuario", "req_usuario", "TEXT"),
+            Column("Requisición|Fecha Autorizada", "req_fecha_autorizada", "TEXT", "fecha"),
+            Column("Requisición|Usuario Autorizador", "req_usuario_autorizador", "TEXT"),
+            Column("Requisición|Emp", "req_emp", "INTEGER"),
+            Column("Requisición|Suc", "req_suc", "INTEGER"),
+            Column("Requisición| Descripción Tipo Doc", "req_descripcion_tipo_doc", "TEXT"),
+            Column("Requisición|Tipo", "req_tipo", "TEXT"),
+            Column("Requisición|Numero", "req_numero", "INTEGER"),
+            Column("Requisición|Estado", "req_estado", "TEXT"),
+            Column("Item|Codigo", "item_codigo", "INTEGER"),
+            Column("Item|Descripción", "item_descripcion", "TEXT"),
+            Column("Cotización|Tipo", "cotizacion_tipo", "TEXT"),
+            Column("Cotización|Numero", "cotizacion_numero", "INTEGER"),
+            Column("Orden Compra|Fecha", "oc_fecha", "TEXT", "fecha"),
+            Column("Orden Compra|Usuario ", "oc_usuario", "TEXT"),
+            Column("Orden Compra|Fecha Autorizacion", "oc_fecha_autorizacion", "TEXT", "fecha"),
+            Column("Orden Compra|Usuario Autorizacion", "oc_usuario_autorizacion", "TEXT"),
+            Column("Orden Compra|Tipo", "oc_tipo", "TEXT"),
+            Column("Orden Compra|Numero", "oc_numero", "INTEGER"),
+            Column("Orden Compra|Estado", "oc_estado", "TEXT"),
+            Column("Orden Compra|Tercero|Identificación", "oc_tercero_id", "TEXT"),
+            Column("Orden Compra|Tercero|Suc", "oc_tercero_suc", "INTEGER"),
+            Column("Orden Compra|Tercero|Nombre", "oc_tercero_nombre", "TEXT"),
+            Column("Entrega de Servicio|Fecha", "entrega_servicio_fecha", "TEXT", "fecha"),
+            Column("Entrega de Servicio|Usuario", "entrega_servicio_usuario", "TEXT"),
+            Column("Entrega de Servicio|Tipo", "entrega_servicio_tipo", "TEXT"),
+            Column("Entrega de Servicio|Numero", "entrega_servicio_numero", "REAL"),
+            Column("Entrega de Almacen|Fecha", "entrega_almacen_fecha", "TEXT", "fecha"),
+            Column("Entrega de Almacen|Usuario", "entrega_almacen_usuario", "TEXT"),
+            Column("Entrega de Almacen|Tipo", "entrega_almacen_tipo", "TEXT"),
+            Column("Entrega de Almacen|Numero", "entrega_almacen_numero", "REAL"),
+            Column("Factura de Compra|Fecha", "factura_compra_fecha", "TEXT", "fecha"),
+            Column("Factura de Compra|Tipo", "factura_compra_tipo", "TEXT"),
+            Column("Factura de Compra|Numero", "factura_compra_numero", "REAL"),
+            Column("Devolucion de Compra|Fecha", "devolucion_compra_fecha", "TEXT", "fecha"),
+            Column("Devolucion de Compra|Tipo", "devolucion_compra_tipo", "TEXT"),
+            Column("Devolucion de Compra|Numero", "devolucion_compra_numero", "REAL"),
+            Column("DÍAS APROBAR RQ", "dias_aprobar_rq", "INTEGER"),
+            Column("DÍAS GENERAR OC", "dias_generar_oc", "INTEGER"),
+            Column("DÍAS APROBACIÓN OC", "dias_aprobacion_oc", "INTEGER"),
+            Column("DÍAS RECEPCIÓN SERVICIO", "dias_recepcion_servicio", "REAL"),
+            Column("DÍAS ENTRADA ALMACEN", "dias_entrada_almacen", "REAL"),
+            Column("mes", "mes", "REAL"),
+            Column("SUMARQ", "suma_rq", "INTEGER"),
+        ),
+        natural_key=("req_numero", "item_codigo"),
+        indexes=(
+            # Tendencia de OC por mes (los últimos meses, recorriendo el índice al revés)
+            ("idx_traza_oc_mes", "oc_fecha_mes, oc_numero"),
+            ("idx_traza_req_fecha_cobertura",
+             "req_fecha, req_estado, oc_estado, oc_tercero_nombre, "
+             "req_numero, oc_numero, dias_aprobar_rq, dias_generar_oc"),
+            # Pendientes por aprobador (también filtro IN por estado)
+            ("idx_traza_req_estado_autorizador", "req_estado, req_usuario_autorizador"),
+            ("idx_traza_oc_estado_autorizacion", "oc_estado, oc_usuario_autorizacion"),
+        ),
+        null_values=("31/12/1899",),  # Fechas inválidas
+        date_parts=("oc_fecha",),
+    ),
+
+    # OC DESCUENTOS
+    Table(
+        name="oc_descuentos",
+        columns=(
+            Column("Fecha|Fecha", "fecha", "TEXT", "fecha"),
+            Column("Fecha|Fecha Entrega", "fecha_entrega", "TEXT", "fecha"),
+            Column("Fecha|Dias Entrega", "dias_entrega", "INTEGER"),
+            Column("Documento|Emp", "documento_emp", "TEXT"),
+            Column("Documento|Suc", "documento_suc", "INTEGER"),
+            Column("Documento|Tipo", "documento_tipo", "TEXT"),
+            Column("Documento|Núm", "documento_num", "INTEGER"),
+            Column("Item|Código", "item_codigo", "INTEGER"),
+            Column("Item|Descripción", "item_descripcion", "TEXT"),
+            Column("Item|Bodega", "item_bodega", "REAL"),
+            Column("Item|Cantidad", "item_cantidad", "REAL"),
+            Column("Talla", "talla", "TEXT"),
+            Column("Item|Unidad", "item_unidad", "TEXT"),
+            Column("Item|Proyecto", "item_proyecto", "INTEGER"),
+            Column("Item|Solicitante", "item_solicitante", "TEXT"),
+            Column("Item|Fecha Requ.", "item_fecha_requ", "TEXT", "fecha"),
+            Column("Tercero|Identificación", "tercero_id", "TEXT"),
+            Column("Tercero|Nombre", "tercero_nombre", "TEXT", dictionary="tercero"),
+            Column("Costo Unitario", "costo_unitario", "REAL", "monto"),
+            Column("Total Item", "total_item", "REAL", "monto"),
+            Column("Tasa Dcto", "tasa_dcto", "REAL"),
+            Column("Total Dcto", "total_dcto", "REAL"),
+            Column("Subtotal", "subtotal", "REAL"),
+            Column("Tasa IVA", "tasa_iva", "REAL"),
+            Column("Total IVA", "total_iva", "REAL", "monto"),
+            Column("Total", "total", "REAL", "monto"),
+            Column("Estado", "estado", "TEXT", dictionary="estado"),
+            Column("Moneda", "moneda", "TEXT"),
+            Column("Observaciones", "observaciones", "TEXT"),
+            Column("Proceso", "proceso", "TEXT", dictionary="proceso"),
+            Column("Concatenado", "concatenado", "TEXT"),
+            Column("%Descuento", "porcentaje_descuento", "REAL"),
+        ),
+        natural_key=("documento_tipo", "documento_num", "item_codigo"),
+        indexes=(
+            ("idx_oc_desc_fecha", "fecha"),
+            ("idx_oc_desc_proceso_cobertura",
+             "proceso, total_dcto, total, documento_num, porcentaje_descuento"),
+            ("idx_oc_desc_tercero_cobertura", "tercero_nombre, total, total_dcto"),
+        ),
+        date_parts=("fecha",),
+    ),
+
+    # BASE OC GENERADAS
+    Table(
+        name="base_oc_generadas",
+        columns=(
+            Column("Fecha|Fecha", "fecha", "TEXT", "fecha"),
+            Column("Fecha|Fecha Entrega", "fecha_entrega", "TEXT", "fecha"),
+            Column("Fecha|Dias Entrega", "dias_entrega", "INTEGER"),
+            Column("Documento|Emp", "documento_emp", "INTEGER"),
+            Column("Documento|Suc", "documento_suc", "INTEGER"),
+            Column("Documento|Tipo", "documento_tipo", "TEXT"),
+            Column("Documento|Núm", "documento_num", "INTEGER"),
+            Column("Item|Código", "item_codigo", "INTEGER"),
+            Column("Item|Descripción", "item_descripcion", "TEXT"),
+            Column("Item|Bodega", "item_bodega", "REAL"),
+            Column("Item|Cantidad", "item_cantidad", "REAL", "monto"),
+            Column("Talla", "talla", "TEXT"),
+            Column("Item|Unidad", "item_unidad", "TEXT"),
+            Column("Item|Proyecto", "item_proyecto", "INTEGER"),
+            Column("Item|Solicitante", "item_solicitante", "TEXT"),
+            Column("Item|Fecha Requ.", "item_fecha_requ", "TEXT", "fecha"),
+            Column("Tercero|Identificación", "tercero_id", "TEXT"),
+            Column("Tercero|Nombre", "tercero_nombre", "TEXT", dictionary="tercero"),
+            Column("Costo Unitario", "costo_unitario", "REAL", "monto"),
+            Column("Total Item", "total_item", "REAL", "monto"),
+            Column("Tasa Dcto", "tasa_dcto", "REAL"),
+            Column("Total Dcto", "total_dcto", "REAL"),
+            Column("Subtotal", "subtotal", "REAL"),
+            Column("Tasa IVA", "tasa_iva", "REAL"),
+            Column("Total IVA", "total_iva", "REAL", "monto"),
+            Column("Total", "total", "REAL", "monto"),
+            Column("Estado", "estado", "TEXT", dictionary="estado"),
+            Column("Moneda", "moneda", "TEXT"),
+            Column("Observaciones", "observaciones", "TEXT"),
+        ),
+        natural_key=("documento_tipo", "documento_num", "item_codigo"),
+        indexes=(
+            ("idx_base_oc_fecha_cobertura", "fecha, tercero_nombre, documento_tipo, estado, total, fecha_mes"),
+            ("idx_base_oc_mes_cobertura", "fecha_mes, tercero_nombre, documento_tipo, estado, total"),
+            ("idx_base_oc_estado_fecha", "estado, fecha"),
+        ),
+        date_parts=("fecha",),
+    ),
+)
+
+# Tablas por nombre, en el orden de creación
+TABLES = {table.name: table for table in _TABLES}
+
+# Dimensiones de las columnas con diccionario (una tabla dim_<nombre> cada una)
+DIMENSIONS = sorted({column.dictionary for table in _TABLES for column in table.columns if column.dictionary})
+
+
+def date_part_column(column, part):
+    """Columna guardada con una parte (DATE_PARTS) de una columna de fecha"""
+    return f"{column}_{part}"
+
+
+def storage_column(table, name):
+    """Columna física de una columna del registro (las demás, p. ej. id, no cambian)"""
+    for column in table.columns:
+        if column.name == name:
+            return column.storage
+    return name
+
+
+def storage_columns(table, columns):
+    """Lista "a, b, c" de columnas del registro con sus nombres físicos"""
+    return ", ".join(storage_column(table, name.strip()) for name in columns.split(","))
+
+
+# Índices secundarios de todas las tablas: (nombre, tabla física, columnas físicas)
+INDEXES = [(name, table.storage, storage_columns(table, columns))
+           for table in _TABLES for name, columns in table.indexes]
+
+
+# Agregados por día y por mes que el importador recalcula después de cada
+# carga (ver rollups.py). Cada tabla rollup_<tabla> guarda, por granularidad
+# ("dia" o "mes") y período, una fila de totales (dimension = '') y una fila
+# por valor de cada dimensión, con la cantidad de registros y la suma de
+# cada medida.
+_ROLLUPS = (
+    Rollup("costos_mensuales", "fecha", ("catalogo", "ciudad", "tercero"), ("neto",)),
+    Rollup("operatividad_vehiculos", "fecha_ejecucion", ("sede", "placa", "estado_vehiculo"),
+           ("vehiculos_programados", "vehiculos_operativos", "dias_en_taller")),
+    Rollup("oc_descuentos", "fecha", ("proceso", "tercero_nombre", "estado"), ("total", "total_dcto")),
+    Rollup("base_oc_generadas", "fecha", ("tercero_nombre", "documento_tipo", "estado"), ("total",)),
+)
+
+ROLLUPS = {rollup.table: rollup for rollup in _ROLLUPS}
+
+# Granularidad -> período a partir de la columna de fecha (el mes ya está
+# guardado, ver DATE_PARTS)
+ROLLUP_GRAINS = {
+    "dia": "{column}",
+    "mes": "{column}_mes",
+}
+
+
+def column_mapping(table):
+    """Encabezado de Excel -> columna de la BD"""
+    return {column.source: column.name for column in table.columns}
+
+
+def insert_columns(table):
+    """Columnas físicas que escribe el importador: las del Excel más row_hash"""
+    return [column.storage for column in table.columns] + ["row_hash"]
+
+
+def create_table_sql(table, name=None):
+    """CREATE TABLE de la tabla física (con otro nombre, p. ej. la staging)"""
+    definitions = [ID_COLUMN]
+    definitions += [f"{column.storage} {'INTEGER' if column.dictionary else column.sql_type}"
+                    for column in table.columns]
+    definitions += [f"{column_name} {sql_type}" for column_name, sql_type in EXTRA_COLUMNS]
+    definitions += [f"{column} TEXT" for column, _ in date_part_values(table)]
+    body = ",\n    ".join(definitions)
+    return f"CREATE TABLE IF NOT EXISTS {name or table.storage} (\n    {body}\n)"
+
+
+def date_part_values(table, source=None):
+    """(columna, expresión) de cada parte de fecha de la tabla.
+
+    source: columna de fecha -> expresión de la que se calcula (por defecto,
+    su parámetro numerado en los INSERT/UPDATE de insert_columns()).
+    """
+    columns = insert_columns(table)
+    source = source or {column: f"?{columns.index(column) + 1}" for column in table.date_parts}
+    return [(date_part_column(column, part), expression.format(column=source[column]))
+            for column in table.date_parts for part, expression in DATE_PARTS.items()]
+
+
+def insert_sql(table, name=None):
+    """INSERT con un parámetro por cada columna de insert_columns() (más las partes de fecha)"""
+    columns = insert_columns(table)
+    parts = date_part_values(table)
+    targets = columns + [column for column, _ in parts]
+    values = [f"?{i}" for i in range(1, len(columns) + 1)] + [expression for _, expression in parts]
+    return f"INSERT INTO {name or table.storage} ({', '.join(targets)}) VALUES ({', '.join(values)})"
+
+
+def update_sql(table):
+    """UPDATE por id con los parámetros de insert_sql() seguidos del id"""
+    columns = insert_columns(table)
+    assignments = [f"{column} = ?{i}" for i, column in enumerate(columns, 1)]
+    assignments += [f"{column} = {expression}" for column, expression in date_part_values(table)]
+    return f"UPDATE {table.storage} SET {', '.join(assignments)} WHERE id = ?{len(columns) + 1}"
+
+
+def dimension_table_name(dictionary):
+    """Tabla de una dimensión"""
+    return f"dim_{dictionary}"
+
+
+def dimension_table_sql(dictionary):
+    """CREATE TABLE de una dimensión: cada valor una sola vez, con su clave"""
+    return (f"CREATE TABLE IF NOT EXISTS {dimension_table_name(dictionary)} "
+            f"(id INTEGER PRIMARY KEY, valor TEXT NOT NULL UNIQUE)")
+
+
+def label_sql(table, name):
+    """Expresión con el valor (texto) de una columna, leído desde la tabla física"""
+    for column in table.columns:
+        if column.name == name and column.dictionary:
+            return f"(SELECT valor FROM {dimension_table_name(column.dictionary)} WHERE id = {column.storage})"
+    return name
+
+
+def distinct_values_sql(table, name, limit=None):
+    """Valores distintos no nulos de una columna, ordenados (leídos de la dimensión si tiene diccionario)"""
+    suffix = f" LIMIT {limit}" if limit else ""
+    for column in table.columns:
+        if column.name == name and column.dictionary:
+            return (f"SELECT valor FROM {dimension_table_name(column.dictionary)} "
+                    f"WHERE id IN (SELECT DISTINCT {column.storage} FROM {table.storage}) ORDER BY valor{suffix}")
+    return f"SELECT DISTINCT {name} FROM {table.storage} WHERE {name} IS NOT NULL ORDER BY {name}{suffix}"
+
+
+def create_view_sql(table):
+    """CREATE VIEW con el nombre y las columnas originales sobre la tabla física.
+
+    Las columnas con diccionario se leen con una subconsulta por fila, que
+    SQLite solo evalúa si la consulta usa esa columna.
+    """
+    definitions = ["id"]
+    definitions += [f"{label_sql(table, column.name)} AS {column.name}" if column.dictionary else column.name
+                    for column in table.columns]
+    definitions += [column_name for column_name, _ in EXTRA_COLUMNS if column_name not in STORAGE_ONLY_COLUMNS]
+    body = ",\n    ".join(definitions)
+    return f"CREATE VIEW IF NOT EXISTS {table.name} AS SELECT\n    {body}\nFROM {table.storage}"
+
+
+def rollup_table_name(table_name):
+    """Tabla de agregados de una tabla importada"""
+    return f"rollup_{table_name}"
+
+
+def rollup_table_sql(rollup):
+    """CREATE TABLE de la tabla de agregados"""
+    types = {column.name: column.sql_type for column in TABLES[rollup.table].columns}
+    definitions = ["grano TEXT", "dimension TEXT", "periodo TEXT"]
+    definitions += [f"{column} {types[column]}" for column in rollup.dimensions]
+    definitions += ["registros INTEGER"]
+    definitions += [f"{column} REAL" for column in rollup.measures]
+    body = ",\n    ".join(definitions)
+    return f"CREATE TABLE IF NOT EXISTS {rollup_table_name(rollup.table)} (\n    {body}\n)"
+
+
+def rollup_insert_sql(rollup):
+    """INSERT ... SELECT que llenan la tabla de agregados desde la tabla física.
+
+    Las dimensiones con diccionario se agrupan por su clave y se guardan con su valor.
+    """
+    table = TABLES[rollup.table]
+    statements = []
+    sums = ", ".join(f"SUM({column})" for column in rollup.measures)
+    measures = ", ".join(rollup.measures)
+    for grain, expression in ROLLUP_GRAINS.items():
+        period = expression.format(column=rollup.date_column)
+        for dimension in ("",) + rollup.dimensions:
+            target = f"{dimension}, " if dimension else ""
+            label = f"{label_sql(table, dimension)}, " if dimension else ""
+            group = f", {storage_column(table, dimension)}" if dimension else ""
+            statements.append(
+                f"INSERT INTO {rollup_table_name(rollup.table)} "
+                f"(grano, dimension, periodo, {target}registros, {measures}) "
+                f"SELECT '{grain}', '{dimension}', {period}, {label}COUNT(*), {sums} "
+                f"FROM {table.storage} GROUP BY {period}{group}"
+            )
+    return statements
@@ -0,0 +1,79 @@
+"""
+Caché en disco de hojas de Excel ya convertidas
+
+Leer un XLSX es el paso más lento de la importación. Cada hoja convertida
+(listas por columna, incluida la huella row_hash) se guarda en un archivo
+pickle cuya clave combina el hash SHA-256 del libro, el nombre de la hoja,
+las opciones de lectura y su declaración en el registro de esquema; si
+nada de eso cambió, la hoja se carga desde la caché sin abrir el Excel.
+El hash de un libro se calcula una vez por versión del archivo, no una
+vez por hoja.
+"""
+import hashlib
+import os
+import pickle
+
+from .config import SHEET_CACHE_DIR
+
+# Incrementar cuando cambie la lógica de conversión (invalida toda la caché)
+CACHE_FORMAT_VERSION = 4
+
+
+# Hash de cada libro ya calculado: ruta -> ((mtime, tamaño), hash)
+_digests = {}
+
+
+def file_digest(path, block_size=1 << 20):
+    """Hash SHA-256 del contenido de un archivo"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def workbook_digest(path):
+    """Hash del libro, reutilizado mientras el archivo no cambie (mismo mtime y tamaño)"""
+    stat = os.stat(path)
+    signature = (stat.st_mtime_ns, stat.st_size)
+    cached = _digests.get(str(path))
+    if cached is None or cached[0] != signature:
+        cached = _digests[str(path)] = (signature, file_digest(path))
+    return cached[1]
+
+
+def cache_key(table, path, sheet_name, spec, options=None):
+    """Clave de caché de una hoja: tabla + contenido del libro + hoja y opciones de lectura + esquema"""
+    spec_digest = hashlib.sha256(repr((CACHE_FORMAT_VERSION, sheet_name, sorted((options or {}).items()),
+                                       spec)).encode()).hexdigest()
+    return f"{table}-{workbook_digest(path)[:20]}-{spec_digest[:12]}"
+
+
+def _cache_path(key):
+    return SHEET_CACHE_DIR / f"{key}.pkl"
+
+
+def load(key):
+    """(columnas, rechazados por columna, filas rechazadas) guardados para la clave, o None si no hay caché"""
+    try:
+        with open(_cache_path(key), "rb") as f:
+            return pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"⚠️ Caché ilegible {key}: {e}")
+        return None
+
+
+def save(key, columns, rejected=None, invalid=None):
+    """Guardar columnas convertidas (y sus rechazos) y eliminar versiones anteriores de la misma tabla"""
+    SHEET_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    table = key.split("-", 1)[0]
+    for old in SHEET_CACHE_DIR.glob(f"{table}-*.pkl"):
+        if old.stem != key:
+            old.unlink(missing_ok=True)
+
+    tmp_path = _cache_path(key).with_suffix(".tmp")
+    with open(tmp_path, "wb") as f:
+        pickle.dump((columns, rejected or {}, invalid or []), f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, _cache_path(key))
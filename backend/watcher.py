@@ -0,0 +1,103 @@
+"""
+Vigilante de los libros de Excel
+
+Revisa periódicamente los archivos de EXCEL_FILES (por ejemplo el volumen
+sincronizado desde SharePoint) y, cuando uno cambia, importa solo ese libro.
+Si la versión del libro ya se importó (la subió la API, o el CLI la
+importó antes) no se repite la importación: import_runs guarda la firma de
+cada libro importado.
+
+Uso:
+    python backend/watcher.py [--delta] [--streaming] [--initial]
+"""
+import argparse
+import sys
+import time
+import zipfile
+from pathlib import Path
+
+# Agregar el directorio padre al path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from backend.config import EXCEL_FILES, WATCH_POLL_SECONDS, WATCH_SETTLE_SECONDS
+from backend.database import import_lock, init_db
+from backend import analytics, import_data, import_runs
+from backend.import_runs import file_signature
+
+
+def is_complete(path):
+    """Un XLSX a medio copiar todavía no es un zip válido"""
+    try:
+        return zipfile.is_zipfile(path)
+    except OSError:
+        return False
+
+
+def watch(run_import, poll_seconds=WATCH_POLL_SECONDS, settle_seconds=WATCH_SETTLE_SECONDS, initial=False):
+    """Ciclo principal: detectar cambios, esperar a que se estabilicen e importar.
+
+    Un libro se importa cuando su (mtime, tamaño) no cambió durante
+    settle_seconds y el archivo está completo; una ráfaga de escrituras
+    sobre el mismo libro produce una sola importación.
+    """
+    known = {key: (None if initial else file_signature(config["path"])) for key, config in EXCEL_FILES.items()}
+    pending = {}  # libro -> (firma, momento del último cambio)
+
+    print(f"👀 Vigilando {len(EXCEL_FILES)} libros cada {poll_seconds:g}s (espera {settle_seconds:g}s)")
+    while True:
+        now = time.monotonic()
+        for key, config in EXCEL_FILES.items():
+            signature = file_signature(config["path"])
+            if signature is None or signature == known[key]:
+                pending.pop(key, None)
+                continue
+
+            if key not in pending or pending[key][0] != signature:
+                if key not in pending:
+                    print(f"📝 Cambio detectado en {config['path'].name}")
+                pending[key] = (signature, now)
+                continue
+
+            if now - pending[key][1] >= settle_seconds and is_complete(config["path"]):
+                del pending[key]
+                known[key] = signature
+                run_import(key)
+
+        time.sleep(poll_seconds)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Importar automáticamente los libros de Excel que cambien")
+    parser.add_argument("--delta", action="store_true", help="Importar en modo delta")
+    parser.add_argument("--streaming", action="store_true", help="Leer los libros por bloques de filas")
+    parser.add_argument("--initial", action="store_true", help="Importar todos los libros al iniciar")
+    args = parser.parse_args(argv)
+
+    with import_lock():
+        init_db()
+
+    def run_import(key):
+        print(f"🚀 Importando {key}...")
+        start = time.perf_counter()
+        try:
+            mode = "streaming" if args.streaming else "clasico"
+            # Una carga desde la API puede estar importando el mismo libro
+            with import_lock():
+                if import_runs.imported_signature(key) == file_signature(EXCEL_FILES[key]["path"]):
+                    print(f"⏭️ {key}: esta versión del libro ya está importada")
+                    return
+                with import_runs.record_run("vigilante", mode, args.delta, [key]):
+                    total = import_data.import_workbook(key, delta=args.delta, streaming=args.streaming)
+                analytics.export_snapshot()
+            print(f"✅ {key}: {total:,} registros en {time.perf_counter() - start:.1f}s")
+        except Exception as e:
+            print(f"❌ Error importando {key}: {e}")
+
+    try:
+        watch(run_import, initial=args.initial)
+    except KeyboardInterrupt:
+        print("👋 Vigilante detenido")
+
+
+if __name__ == "__main__":
+    main()
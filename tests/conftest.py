@@ -0,0 +1,121 @@
+"""
+Configuración de las pruebas
+
+La BD, los libros sintéticos y las cachés viven en un directorio temporal.
+config.py lee las rutas al importarse, así que se fijan en el entorno
+antes de importar backend.
+
+Uso (desde la raíz del repositorio):
+    python -m pytest -q
+"""
+import math
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+TMP_DIR = Path(tempfile.mkdtemp(prefix="logistica-pruebas-"))
+os.environ.update({
+    "DATA_DIR": str(TMP_DIR / "data"),
+    "DB_PATH": str(TMP_DIR / "logistica.db"),
+    "SHEET_CACHE_DIR": str(TMP_DIR / "cache"),
+    "ANALYTICS_DIR": str(TMP_DIR / "analytics"),
+    "ANALYTICS_ENGINE": "sqlite",
+    "DB_MEMORY_BUDGET_MB": "0",
+})
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pytest
+
+from backend import import_data, import_runs, read_snapshot, response_cache
+from backend.benchmarks import synthetic
+from backend.database import get_db, init_db
+
+# Filas por hoja de los libros sintéticos; libros que carga `imported`
+# (compras se importa solo en sus pruebas)
+ROWS = 300
+WORKBOOKS = ["costos_mensuales", "operatividad_vehiculos"]
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(TMP_DIR, ignore_errors=True)
+
+
+def _import_workbook(key, delta=False):
+    """Importar un libro como lo hace el CLI (queda registrado en import_runs)"""
+    with import_runs.record_run("pruebas", "clasico", delta, [key]):
+        return import_data.import_workbook(key, delta=delta, use_cache=False)
+
+
+@pytest.fixture(scope="session")
+def workbooks():
+    """Libros sintéticos (todos los de EXCEL_FILES): {libro: ruta}"""
+    init_db()
+    return synthetic.generate_data_dir(Path(os.environ["DATA_DIR"]), ROWS)
+
+
+@pytest.fixture
+def imported(workbooks):
+    """BD recién importada (carga completa) con los libros de costos y operatividad"""
+    for key in WORKBOOKS:
+        _import_workbook(key)
+    return workbooks
+
+
+@pytest.fixture
+def run_import():
+    """Función libro -> registros para importar un libro dentro de una prueba"""
+    return _import_workbook
+
+
+@pytest.fixture
+def served(imported, monkeypatch):
+    """Versión servida cargada como al arrancar la API (se restaura al terminar)"""
+    monkeypatch.setattr(read_snapshot, "_status", dict(read_snapshot._status))
+    monkeypatch.setattr(read_snapshot, "_stamp", read_snapshot._stamp)
+    read_snapshot.load()
+    return read_snapshot.served_stamp()
+
+
+def _add_import_run():
+    """Registrar una importación nueva sin tocar los datos"""
+    with get_db() as conn:
+        conn.execute("INSERT INTO import_runs (origen, tabla, estado) VALUES ('pruebas', 'costos_mensuales', 'ok')")
+        conn.commit()
+
+
+@pytest.fixture
+def add_import_run():
+    """Función que registra una importación nueva (cambia la versión de los datos)"""
+    return _add_import_run
+
+
+@pytest.fixture
+def no_response_cache(monkeypatch):
+    """Consultar siempre la BD, sin la caché de respuestas"""
+    monkeypatch.setattr(response_cache, "RESPONSE_CACHE_MB", 0)
+
+
+def _assert_close(actual, expected):
+    """Igualdad de resultados (mismo orden) con tolerancia en los decimales"""
+    if isinstance(expected, float) or isinstance(actual, float):
+        assert math.isclose(actual or 0, expected or 0, rel_tol=1e-9, abs_tol=1e-6)
+    elif isinstance(expected, dict):
+        assert actual.keys() == expected.keys()
+        for key in expected:
+            _assert_close(actual[key], expected[key])
+    elif isinstance(expected, list):
+        assert len(actual) == len(expected)
+        for item, expected_item in zip(actual, expected):
+            _assert_close(item, expected_item)
+    else:
+        assert actual == expected
+
+
+@pytest.fixture
+def assert_close():
+    """Comparar resultados de endpoints calculados de dos formas (sumas en otro orden)"""
+    return _assert_close
@@ -0,0 +1,65 @@
+"""
+/api/compras/dashboard contra los /charts y /kpis que reemplaza
+"""
+import pytest
+
+from backend import analytics
+from backend.database import build_rollups, get_db
+from backend.routes import compras
+from backend.schema import TABLES
+
+ENDPOINTS = {
+    "kpis": compras.get_kpis_post,
+    "oc-vs-items-by-process": compras.chart_oc_vs_items,
+    "percent-discounts-by-process": compras.chart_percent_discounts,
+    "top-suppliers-discounts": compras.chart_top_suppliers_discounts,
+    "avg-approval-days": compras.chart_avg_approval_days,
+    "pending-approve-rq": compras.chart_pending_rq,
+    "oc-by-state": compras.chart_oc_by_state,
+    "trend-oc": compras.chart_trend_oc,
+    "discounts-by-process": compras.chart_discounts_by_process,
+    "top-suppliers": compras.chart_top_suppliers,
+    "days-by-stage": compras.chart_days_by_stage,
+    "spend-by-process": compras.chart_spend_by_process,
+}
+
+
+@pytest.fixture
+def compras_data(workbooks, run_import):
+    """Libro de compras importado con montos NULL salvo los de un proceso (negativos).
+
+    Retorna (procesos, proceso negativo): los demás procesos empatan en 0,
+    y los proveedores sin filas de ese proceso también.
+    """
+    run_import("compras")
+    storage = TABLES["oc_descuentos"].storage
+    with get_db() as conn:
+        procesos = [row[0] for row in conn.execute("SELECT DISTINCT proceso FROM oc_descuentos "
+                                                   "WHERE proceso IS NOT NULL")]
+        conn.execute(f"UPDATE {storage} SET total_dcto = NULL, total = NULL")
+        conn.execute(f"UPDATE {storage} SET total_dcto = -50, total = -50 "
+                     f"WHERE id IN (SELECT id FROM oc_descuentos WHERE proceso = ?)", (procesos[-1],))
+        build_rollups(conn.cursor(), "oc_descuentos")
+        conn.commit()
+    return procesos, procesos[-1]
+
+
+@pytest.mark.parametrize("engine", ["sqlite", "duckdb"])
+def test_dashboard_matches_charts(compras_data, no_response_cache, monkeypatch, assert_close, engine):
+    if engine == "duckdb":
+        pytest.importorskip("duckdb")
+        monkeypatch.setattr(analytics, "ANALYTICS_ENGINE", "duckdb")
+        analytics.export_snapshot()
+    dashboard = compras.get_dashboard(compras.DashboardRequest(widgets=list(ENDPOINTS)))
+    for name, endpoint in ENDPOINTS.items():
+        expected = endpoint(compras.FilterRequest())
+        assert_close(dashboard["widgets"][name], expected["kpis"] if name == "kpis" else expected["data"])
+
+
+def test_tied_sums_ordered_by_label(compras_data, no_response_cache):
+    procesos, negative = compras_data
+    # Sumas sin montos (0) empatadas: por nombre, y antes que la negativa
+    expected = sorted(p for p in procesos if p != negative)[:10]
+    assert compras.chart_spend_by_process(compras.FilterRequest())["data"]["processes"] == expected
+    widget = compras.get_dashboard(compras.DashboardRequest(widgets=["spend-by-process"]))["widgets"]
+    assert widget["spend-by-process"]["processes"] == expected
@@ -0,0 +1,88 @@
+"""
+Versión de datos servida (read_snapshot) y ETag/304 (conditional.py)
+"""
+import asyncio
+
+import pytest
+from fastapi import Request
+from fastapi.responses import JSONResponse
+
+from backend import conditional, jobs, read_snapshot
+
+
+@pytest.fixture
+def in_memory(served, monkeypatch):
+    """Lecturas desde la copia en memoria; al terminar el pool vuelve al disco"""
+    monkeypatch.setattr(read_snapshot, "DB_MEMORY_BUDGET_MB", 64)
+    read_snapshot.load()
+    assert read_snapshot.status()["modo"] == "memoria"
+    yield read_snapshot.served_stamp()
+    monkeypatch.setattr(read_snapshot, "DB_MEMORY_BUDGET_MB", 0)
+    read_snapshot.load()
+
+
+def get(path, query="", headers=None):
+    """GET por el middleware de peticiones condicionales; retorna (respuesta, llamó al endpoint)"""
+    scope = {
+        "type": "http", "method": "GET", "path": path, "query_string": query.encode(),
+        "headers": [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()],
+    }
+    called = []
+
+    async def call_next(request):
+        called.append(request.url.path)
+        return JSONResponse({"ok": True})
+
+    response = asyncio.run(conditional.conditional_get(Request(scope), call_next))
+    return response, bool(called)
+
+
+def test_etag_and_304(served):
+    response, called = get("/api/costos/kpis", "catalogos=B,A")
+    assert called and response.status_code == 200
+    tag = response.headers["etag"]
+    assert response.headers["cache-control"] == "no-cache"
+    assert "last-modified" in response.headers
+
+    # Mismos parámetros en otro orden: mismo ETag
+    assert get("/api/costos/kpis", "catalogos=A,B")[0].headers["etag"] == tag
+    assert get("/api/costos/kpis", "catalogos=A")[0].headers["etag"] != tag
+
+    response, called = get("/api/costos/kpis", "catalogos=A,B", {"If-None-Match": f'W/{tag}, "otro"'})
+    assert response.status_code == 304 and not called
+    assert get("/api/health")[0].headers.get("etag") is None
+
+
+def test_disk_reads_see_a_new_import_at_once(served, add_import_run):
+    assert read_snapshot.status()["modo"] == "disco"
+    tag = get("/api/costos/kpis")[0].headers["etag"]
+    add_import_run()
+
+    # Leyendo del disco, la importación se ve sin esperar la revisión periódica
+    response, called = get("/api/costos/kpis", headers={"If-None-Match": tag})
+    assert response.status_code == 200 and called
+    assert response.headers["etag"] != tag
+
+
+def test_memory_copy_answers_304_until_reloaded(in_memory, add_import_run):
+    tag = get("/api/costos/kpis")[0].headers["etag"]
+    add_import_run()
+
+    # La copia en memoria todavía tiene los datos anteriores: el ETag no cambia
+    response, called = get("/api/costos/kpis", headers={"If-None-Match": tag})
+    assert response.status_code == 304 and not called
+
+    assert read_snapshot.refresh()
+    assert read_snapshot.served_stamp()[0] > in_memory[0]
+    response, called = get("/api/costos/kpis", headers={"If-None-Match": tag})
+    assert response.status_code == 200 and called
+    assert response.headers["etag"] != tag
+
+
+def test_import_job_invalidates_304(in_memory):
+    tag = get("/api/costos/grafico/mensual")[0].headers["etag"]
+    job = jobs._new_job("costos_mensuales", None, {})
+    jobs._run(job)
+    assert job["estado"] == "completado", job["error"]
+    # El trabajo recarga la copia al terminar
+    assert get("/api/costos/grafico/mensual", headers={"If-None-Match": tag})[0].status_code == 200
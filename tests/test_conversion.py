@@ -0,0 +1,57 @@
+"""
+Conversión de columnas Excel -> BD (import_data.convert_series y sus pasos)
+"""
+import math
+from datetime import datetime
+
+import pandas as pd
+
+from backend.import_data import (convert_series, format_date, format_temporal, parse_date, parse_money,
+                                 repair_encoding)
+
+
+def as_list(series):
+    """Valores de la serie con los nulos (NaN/None) como None"""
+    return series.astype(object).where(series.notna(), None).tolist()
+
+
+def test_parse_date_formats():
+    text = pd.Series(["2024-03-05", "2024/03/05 08:30", "05/03/2024", "05-03-2024", "05.03.2024T10:00",
+                      "basura", None])
+    assert as_list(parse_date(text)) == ["2024-03-05"] * 5 + [None, None]
+
+
+def test_parse_date_all_null():
+    assert as_list(parse_date(pd.Series([None, None], dtype=object))) == [None, None]
+
+
+def test_parse_money():
+    values = parse_money(pd.Series(["$ 1,234.50", "2000", "sin valor"])).tolist()
+    assert values[:2] == [1234.5, 2000.0]
+    assert math.isnan(values[2])
+
+
+def test_repair_encoding():
+    assert repair_encoding(pd.Series(["CamiÃ³n", "BogotÃ¡", "Normal"])).tolist() == ["Camión", "Bogotá", "Normal"]
+
+
+def test_convert_series_money_rejects_unreadable_amounts():
+    series = pd.Series(["$ 10.5", 20, None, "abc"], index=[2, 3, 4, 5])
+    values, rejected = convert_series(series, [repair_encoding, parse_money], format_temporal)
+    assert values == [10.5, 20, None, None]
+    # Solo "abc" se rechaza; el nulo original no cuenta
+    assert rejected.to_dict() == {5: "abc"}
+
+
+def test_convert_series_dates_with_serials_and_null_values():
+    series = pd.Series([datetime(2024, 1, 2, 15, 0), 45000, "31/12/1899", "03/01/2024", "ayer"])
+    values, rejected = convert_series(series, [repair_encoding, parse_date], format_date,
+                                      null_values=("31/12/1899",), convert_numbers=True)
+    assert values == ["2024-01-02", "2023-03-15", None, "2024-01-03", None]
+    assert rejected.tolist() == ["ayer"]
+
+
+def test_convert_series_empty_column():
+    values, rejected = convert_series(pd.Series([None, None]), [repair_encoding], format_temporal)
+    assert values == [None, None]
+    assert rejected.empty
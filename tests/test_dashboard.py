@@ -0,0 +1,96 @@
+"""
+Endpoints /dashboard de costos y operatividad contra los endpoints que reemplazan
+"""
+import pytest
+
+from backend import analytics, rollups
+from backend.analytics import get_analytics_db
+from backend.routes import costos, operatividad
+
+RANGO = {"fecha_inicio": "2023-03-01", "fecha_fin": "2023-12-31"}
+# Meses incompletos: los agregados diarios
+DIAS = {"fecha_inicio": "2023-03-10", "fecha_fin": "2023-11-20"}
+FILTROS = [{}, RANGO, DIAS]
+IDS = ["todo", "rango", "dias"]
+
+
+def separate_costos(filtros):
+    return {
+        "kpis": costos.get_kpis(**filtros), "mensual": costos.get_mensual(**filtros),
+        "catalogo": costos.get_por_catalogo(**filtros), "ciudad": costos.get_por_ciudad(**filtros),
+        "tercero": costos.get_por_tercero(**filtros), "filtros": costos.get_filtros(),
+    }
+
+
+def separate_operatividad(filtros):
+    return {
+        "kpis": operatividad.get_kpis(**filtros), "diario": operatividad.get_diaria(**filtros),
+        "sede": operatividad.get_por_sede(**filtros), "estado": operatividad.get_por_estado(**filtros),
+        "taller": operatividad.get_top_dias_taller(**filtros), "filtros": operatividad.get_filtros(),
+    }
+
+
+def first_values():
+    """Filtros IN con el primer valor de cada tablero"""
+    opciones_costos, opciones_operatividad = costos.get_filtros(), operatividad.get_filtros()
+    return ({"catalogos": opciones_costos["catalogos"][0]}, {"sedes": opciones_operatividad["sedes"][0]})
+
+
+@pytest.mark.parametrize("filtros", FILTROS, ids=IDS)
+def test_dashboard_sqlite(imported, no_response_cache, assert_close, filtros):
+    assert_close(costos.get_dashboard(**filtros), separate_costos(filtros))
+    assert_close(operatividad.get_dashboard(**filtros), separate_operatividad(filtros))
+
+
+@pytest.mark.parametrize("filtros", FILTROS, ids=IDS)
+def test_dashboard_one_query_on_rollups(imported, filtros):
+    statements = []
+    with get_analytics_db() as conn:
+        conn.set_trace_callback(statements.append)
+        assert costos.dashboard_one_pass(conn, (filtros.get("fecha_inicio"), filtros.get("fecha_fin"),
+                                                None, None, None), 10) is not None
+        assert operatividad.dashboard_one_pass(conn, (filtros.get("fecha_inicio"), filtros.get("fecha_fin"),
+                                                      None, None, None), 10) is not None
+    assert len(statements) == 2
+    assert all("FROM rollup_" in statement for statement in statements)
+
+
+def test_dashboard_in_filters_sqlite(imported, no_response_cache, assert_close):
+    # Con filtros IN los agregados no tienen las demás dimensiones: consultas de cada endpoint
+    filtros_costos, filtros_operatividad = first_values()
+    assert_close(costos.get_dashboard(**filtros_costos), separate_costos(filtros_costos))
+    assert_close(operatividad.get_dashboard(**filtros_operatividad), separate_operatividad(filtros_operatividad))
+
+
+@pytest.mark.parametrize("filtros", FILTROS, ids=IDS)
+def test_dashboard_duckdb_keeps_endpoint_order(imported, no_response_cache, monkeypatch, assert_close, filtros):
+    pytest.importorskip("duckdb")
+    expected_costos, expected_operatividad = separate_costos(filtros), separate_operatividad(filtros)
+
+    # Una pasada con GROUPING SETS y orden en Python: mismo orden (empates y NULL) que el SQL
+    monkeypatch.setattr(analytics, "ANALYTICS_ENGINE", "duckdb")
+    analytics.export_snapshot()
+    assert_close(costos.get_dashboard(**filtros), expected_costos)
+    assert_close(operatividad.get_dashboard(**filtros), expected_operatividad)
+
+
+def test_dashboard_duckdb_raw_pass(imported, no_response_cache, monkeypatch, assert_close):
+    pytest.importorskip("duckdb")
+    filtros_costos, filtros_operatividad = first_values()
+    expected = [separate_costos(filtros_costos), separate_operatividad(filtros_operatividad),
+                separate_costos({}), separate_operatividad({})]
+
+    # Filtros IN, o sin agregados: GROUPING SETS sobre la tabla física
+    monkeypatch.setattr(analytics, "ANALYTICS_ENGINE", "duckdb")
+    analytics.export_snapshot()
+    assert_close(costos.get_dashboard(**filtros_costos), expected[0])
+    assert_close(operatividad.get_dashboard(**filtros_operatividad), expected[1])
+    monkeypatch.setattr(rollups, "USE_ROLLUPS", False)
+    assert_close(costos.get_dashboard(), expected[2])
+    assert_close(operatividad.get_dashboard(), expected[3])
+
+
+def test_sort_rows_like_sql():
+    rows = [("b", 2), (None, 2), ("a", None), ("c", 5), ("a", 2)]
+    assert analytics.sort_rows(rows, (1, True), (0, False)) == [("c", 5), (None, 2), ("a", 2), ("b", 2), ("a", None)]
+    assert analytics.sort_rows(rows, (0, False))[0] == (None, 2)
@@ -0,0 +1,115 @@
+"""
+Importación delta (delta.py): huellas por fila e INSERT/UPDATE/DELETE de las diferencias
+"""
+import pytest
+
+from backend import import_data, rollups
+from backend.config import EXCEL_FILES
+from backend.database import get_db
+from backend.delta import DeltaImport, row_hashes
+from backend.routes import costos
+from backend.schema import TABLES
+
+TABLE = "costos_mensuales"
+
+
+def read_columns():
+    """Columnas convertidas de la hoja de costos (con row_hash)"""
+    config = EXCEL_FILES[TABLE]
+    columns, *_ = import_data.read_sheet_columns(TABLE, config["path"], config["sheet"], use_cache=False)
+    return columns
+
+
+def select_rows(table=TABLE):
+    """Filas de la vista (columnas del Excel) en un orden fijo"""
+    names = ", ".join(column.name for column in TABLES[table].columns)
+    with get_db() as conn:
+        return [tuple(row) for row in conn.execute(f"SELECT {names} FROM {table} ORDER BY {names}")]
+
+
+def take(columns, rows):
+    """Subconjunto de filas (por posición) de unas columnas, sin la huella"""
+    return {name: [values[i] for i in rows] for name, values in columns.items() if name != "row_hash"}
+
+
+def apply_delta(columns, chunk_size=100):
+    """Aplicar una importación delta en bloques, como el modo streaming; retorna los conteos"""
+    total = len(next(iter(columns.values())))
+    with get_db() as conn:
+        changes = DeltaImport(conn, TABLE)
+        for start in range(0, total, chunk_size):
+            changes.feed({name: values[start:start + chunk_size] for name, values in columns.items()})
+        return changes.finish()
+
+
+def test_row_hashes_ignore_int_float_and_keep_nulls_apart():
+    assert row_hashes({"a": [5, 1.5], "b": ["x", None]}) == row_hashes({"a": [5.0, 1.5], "b": ["x", None]})
+    assert row_hashes({"a": [None]}) != row_hashes({"a": ["None"]})
+    assert row_hashes({"a": [1, 2]}) != row_hashes({"a": [2, 1]})
+    assert row_hashes({"a": []}) == []
+
+
+def test_delta_without_changes(imported):
+    columns = read_columns()
+    before = select_rows()
+    counts = apply_delta(columns)
+    assert counts == {"insertados": 0, "actualizados": 0, "eliminados": 0, "sin_cambios": len(before)}
+    assert select_rows() == before
+
+
+def test_delta_insert_update_delete(imported, no_response_cache):
+    columns = read_columns()
+    total = len(columns["row_hash"])
+
+    # Se eliminan 5 filas, cambian 2 montos, se agrega una fila con clave
+    # nueva y se repite una fila existente
+    changed = take(columns, list(range(5, total)) + [20, 30])
+    changed["neto"][0] = (changed["neto"][0] or 0) + 1
+    changed["neto"][1] = (changed["neto"][1] or 0) + 1
+    changed["fecha"][-2] = "2030-01-01"
+    changed["row_hash"] = row_hashes(changed)
+
+    counts = apply_delta(changed)
+    assert counts == {"insertados": 2, "actualizados": 2, "eliminados": 5, "sin_cambios": total - 7}
+    after_delta = select_rows()
+
+    # Mismo contenido que una carga completa de los mismos datos
+    import_data.write_columns(TABLE, changed)
+    assert after_delta == select_rows()
+
+
+def test_delta_counts_in_import_runs(imported, run_import, monkeypatch):
+    columns = read_columns()
+    changed = take(columns, list(range(3, len(columns["row_hash"]))) + [40])
+    changed["neto"][0] = (changed["neto"][0] or 0) + 1
+    changed["fecha"][-1] = "2030-01-01"
+    changed["row_hash"] = row_hashes(changed)
+    monkeypatch.setattr(import_data, "read_sheet_columns", lambda *args, **kwargs: (changed, {}, {}, []))
+
+    # Se registran las filas cambiadas, no las leídas
+    assert run_import(TABLE, delta=True) == 1
+    with get_db() as conn:
+        row = conn.execute("SELECT registros, actualizados, eliminados FROM import_runs "
+                           "WHERE tabla = ? ORDER BY id DESC LIMIT 1", (TABLE,)).fetchone()
+    assert tuple(row) == (1, 1, 3)
+
+
+def test_delta_rebuilds_rollups(imported, no_response_cache, monkeypatch):
+    columns = read_columns()
+    changed = take(columns, range(10, len(columns["row_hash"])))
+    changed["neto"][0] = (changed["neto"][0] or 0) + 1_000_000
+    changed["row_hash"] = row_hashes(changed)
+    apply_delta(changed)
+
+    with_rollups = costos.get_kpis()
+    monkeypatch.setattr(rollups, "USE_ROLLUPS", False)
+    raw = costos.get_kpis()
+    assert with_rollups["registros"] == raw["registros"] == len(changed["neto"])
+    assert with_rollups["costo_total"] == pytest.approx(raw["costo_total"])
+
+
+def test_delta_import_from_workbook(imported, run_import, capsys):
+    before = select_rows()
+    run_import("costos_mensuales", delta=True)
+    assert "0 insertados, 0 actualizados, 0 eliminados" in capsys.readouterr().out
+    assert select_rows() == before
@@ -0,0 +1,28 @@
+"""
+Caché de respuestas por versión de datos (response_cache.py)
+"""
+import pytest
+
+from backend import read_snapshot, response_cache
+from backend.database import build_rollups, get_db
+from backend.routes import costos
+
+
+def test_response_cache_invalidated_on_version_change(served, add_import_run, monkeypatch):
+    monkeypatch.setattr(response_cache, "RESPONSE_CACHE_MB", 64)
+    response_cache.clear()
+    before = costos.get_kpis()
+    with get_db() as conn:
+        conn.execute("UPDATE costos_mensuales_datos SET neto = neto + 1000 "
+                     "WHERE id = (SELECT MIN(id) FROM costos_mensuales_datos)")
+        build_rollups(conn.cursor(), "costos_mensuales")
+        conn.commit()
+
+    # Misma versión: respuesta desde la caché
+    assert costos.get_kpis() == before
+    assert response_cache.stats()["aciertos"] >= 1
+
+    add_import_run()
+    read_snapshot.refresh()
+    after = costos.get_kpis()
+    assert after["costo_total"] == pytest.approx(before["costo_total"] + 1000)
@@ -0,0 +1,59 @@
+"""
+Consultas desde las tablas de agregados (rollups.py) contra las tablas físicas
+"""
+import pytest
+
+from backend import rollups
+from backend.database import get_read_db
+from backend.routes import costos, operatividad
+
+COSTOS_ENDPOINTS = [costos.get_kpis, costos.get_mensual, costos.get_por_catalogo, costos.get_por_ciudad,
+                    costos.get_por_tercero]
+OPERATIVIDAD_ENDPOINTS = [operatividad.get_kpis, operatividad.get_diaria, operatividad.get_por_sede,
+                          operatividad.get_por_estado, operatividad.get_top_dias_taller]
+
+
+def costos_cases():
+    filtros = costos.get_filtros()
+    return [
+        {},
+        {"fecha_inicio": "2023-03-01", "fecha_fin": "2023-08-31"},
+        {"fecha_inicio": "2023-03-10", "fecha_fin": "2023-08-20"},
+        {"catalogos": ",".join(filtros["catalogos"][:3])},
+        {"fecha_inicio": "2023-02-01", "ciudades": filtros["ciudades"][0]},
+    ]
+
+
+def operatividad_cases():
+    filtros = operatividad.get_filtros()
+    return [
+        {},
+        {"fecha_inicio": "2023-03-01", "fecha_fin": "2023-08-31"},
+        {"fecha_inicio": "2023-03-10", "fecha_fin": "2024-01-20"},
+        {"sedes": ",".join(filtros["sedes"][:3])},
+        {"fecha_fin": "2024-06-30", "estados": filtros["estados"][0]},
+    ]
+
+
+def results(endpoints, cases):
+    return [[endpoint(**case) for endpoint in endpoints] for case in cases]
+
+
+def test_rollups_are_used(imported):
+    with get_read_db() as conn:
+        assert rollups.source(conn, "costos_mensuales", None, None, {}, "catalogo").rollup
+        # Meses completos: grano mensual; otro rango: grano diario
+        assert rollups.source(conn, "costos_mensuales", "2023-03-01", "2023-08-31", {}).params[0] == "mes"
+        assert rollups.source(conn, "costos_mensuales", "2023-03-10", "2023-08-20", {}).params[0] == "dia"
+        # Dos dimensiones a la vez: tabla física
+        assert not rollups.source(conn, "costos_mensuales", None, None, {"ciudad": "X"}, "catalogo").rollup
+
+
+@pytest.mark.parametrize("endpoints, cases", [(COSTOS_ENDPOINTS, costos_cases),
+                                              (OPERATIVIDAD_ENDPOINTS, operatividad_cases)],
+                         ids=["costos", "operatividad"])
+def test_rollup_results_match_raw_tables(imported, no_response_cache, monkeypatch, assert_close, endpoints, cases):
+    filters = cases()
+    with_rollups = results(endpoints, filters)
+    monkeypatch.setattr(rollups, "USE_ROLLUPS", False)
+    assert_close(with_rollups, results(endpoints, filters))
@@ -0,0 +1,80 @@
+"""
+Carga de libros por la API (api.upload_workbook) y trabajos de importación (jobs.py)
+"""
+import asyncio
+import os
+import shutil
+
+import pytest
+from fastapi import HTTPException, Request
+
+from backend import api, import_runs, jobs
+from backend.config import EXCEL_FILES
+from backend.import_runs import file_signature
+
+KEY = "costos_mensuales"
+
+
+def upload(body, headers=None, chunk_size=64 * 1024):
+    """POST del libro por api.upload_workbook (sin el token: se prueba aparte)"""
+    chunks = [body[i:i + chunk_size] for i in range(0, len(body), chunk_size)] or [b""]
+    messages = [{"type": "http.request", "body": chunk, "more_body": i < len(chunks) - 1}
+                for i, chunk in enumerate(chunks)]
+
+    async def receive():
+        return messages.pop(0)
+
+    scope = {"type": "http", "method": "POST", "path": f"/api/admin/upload/{KEY}", "query_string": b"",
+             "headers": [(name.encode(), value.encode()) for name, value in (headers or {}).items()]}
+    return asyncio.run(api.upload_workbook(KEY, Request(scope, receive)))
+
+
+def leftovers():
+    """Archivos parciales de cargas que quedaron junto al libro"""
+    return list(EXCEL_FILES[KEY]["path"].parent.glob("*.upload"))
+
+
+def test_upload_token(monkeypatch):
+    monkeypatch.setattr(api, "UPLOAD_TOKEN", "")
+    with pytest.raises(HTTPException) as error:
+        api.require_upload_token("Bearer x")
+    assert error.value.status_code == 403
+
+    monkeypatch.setattr(api, "UPLOAD_TOKEN", "secreto")
+    for header in (None, "Bearer otro", "Basic secreto"):
+        with pytest.raises(HTTPException) as error:
+            api.require_upload_token(header)
+        assert error.value.status_code == 401
+    api.require_upload_token("Bearer secreto")
+
+
+def test_rejected_uploads_leave_no_files(workbooks, monkeypatch):
+    monkeypatch.setattr(api, "UPLOAD_MAX_MB", 1)
+    body = b"x" * (1024 * 1024 + 1)
+    # Tamaño declarado en Content-Length o detectado al leer el cuerpo
+    for headers in ({"content-length": str(len(body))}, {}):
+        with pytest.raises(HTTPException) as error:
+            upload(body, headers)
+        assert error.value.status_code == 413
+
+    with pytest.raises(HTTPException) as error:
+        upload(b"no es un libro")
+    assert error.value.status_code == 400
+    assert not leftovers()
+
+
+def test_uploaded_workbook_is_not_imported_twice(imported, tmp_path):
+    path = EXCEL_FILES[KEY]["path"]
+    uploaded = tmp_path / "subido.xlsx"
+    shutil.copyfile(path, uploaded)
+    os.utime(uploaded, ns=(path.stat().st_mtime_ns + 10**9,) * 2)
+    signature = file_signature(uploaded)
+
+    job = jobs._new_job(KEY, "subido.xlsx", {})
+    jobs._run(job, str(uploaded))
+    assert job["estado"] == "completado", job["error"]
+    assert not uploaded.exists()
+
+    # El libro subido quedó en su lugar con su firma registrada: el vigilante no lo reimporta
+    assert file_signature(path) == signature
+    assert import_runs.imported_signature(KEY) == signature